@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+##############################################################################
+'''
+@file benchmark_cp1252_fixups.py
+@author David BLACK  @bballdave025
+@since 2026-10-18
+
+Shows that the one-pass cp1252 fix-ups in
+handle_text_encoding_decoding.fix_cp1252_leftovers  (one regex for the
+runs of leftovers, each fixed up with a  str.translate ) give the same
+strings as the chain of  re.sub s they replaced (kept here as
+legacy_fix_cp1252_leftovers ), and how much faster they are.
+
+An example use from the command line
+
+  $ python3 benchmark_cp1252_fixups.py --n-chars 50000000
+
+'''
+##############################################################################
+
+##-------------------
+## IMPORT STATEMENTS
+##-------------------
+import sys
+import re
+import time
+import random
+import argparse
+
+# Intra-Package
+## For Python2
+# from __future__ import absolute_import
+import handle_text_encoding_decoding
+
+##-------------------
+## MODULE CONSTANTS
+##-------------------
+## The size of the text that's timed
+DEFAULT_N_CHARS = 10 * 1000 * 1000
+
+## The number of short, random strings compared
+DEFAULT_N_TRIALS = 20000
+
+## What the random strings are made of: spaces, letters, and every
+## character from U+0080 to U+009F, so the leftovers bump into each
+## other and into the spaces in every way
+EQUIVALENCE_ALPHABET = "  ab\n" + "".join(chr(i) for i in range(0x80, 0xa0))
+
+## The timed text is mostly ordinary; about one character in this many
+## is a leftover (the fewer there are, the bigger the speed-up)
+LEFTOVER_SPACING = 500
+
+
+def main(argv=None):
+  '''
+  Allows an entrance for running as a command-line script
+  
+  Checks the equivalence, then times both ways on the same text
+  
+  @param argv  The command-line arguments, without the program name
+               (None for  sys.argv[1:] )
+  @return      The exit status: 0, or 1 if any string came out different
+  '''
+  
+  arg_parser = argparse.ArgumentParser(
+      prog='benchmark_cp1252_fixups',
+      description="Compares the cp1252 fix-ups with the old chain " + \
+                  "of re.subs, for equivalence and speed.")
+  arg_parser.add_argument('--n-chars', type=int, default=DEFAULT_N_CHARS,
+                          help="the size of the timed text " + \
+                               "(default: %(default)s)")
+  arg_parser.add_argument('--n-trials', type=int, default=DEFAULT_N_TRIALS,
+                          help="the number of random strings compared " + \
+                               "(default: %(default)s)")
+  arg_parser.add_argument('--leftover-spacing', type=int,
+                          default=LEFTOVER_SPACING,
+                          help="about one character in this many of " + \
+                               "the timed text is a leftover " + \
+                               "(default: %(default)s)")
+  arg_parser.add_argument('--seed', type=int, default=0)
+  
+  try:
+    args = arg_parser.parse_args(argv)
+  except SystemExit as e_exit:
+    return e_exit.code  # after  --help , or a usage error
+  ##endof:  try/except SystemExit
+  
+  n_mismatches = check_equivalence(args.n_trials, args.seed)
+  sys.stdout.write("equivalence: " + str(args.n_trials - n_mismatches) + \
+                   " of " + str(args.n_trials) + " random strings match\n")
+  
+  sample_text = make_sample_text(args.n_chars, args.seed,
+                                 args.leftover_spacing)
+  is_same = handle_text_encoding_decoding.fix_cp1252_leftovers(
+                sample_text) == legacy_fix_cp1252_leftovers(sample_text)
+  sys.stdout.write("equivalence on the timed text: " + str(is_same) + "\n")
+  
+  legacy_seconds = time_fixups(legacy_fix_cp1252_leftovers, sample_text)
+  new_seconds = time_fixups(
+      handle_text_encoding_decoding.fix_cp1252_leftovers, sample_text)
+  
+  sys.stdout.write("re.sub chain:      " + \
+                   "{:.3f}".format(legacy_seconds) + " s\n")
+  sys.stdout.write("one pass:          " + \
+                   "{:.3f}".format(new_seconds) + " s\n")
+  sys.stdout.write("speed-up:          " + \
+                   "{:.1f}".format(legacy_seconds / new_seconds) + "x\n")
+  
+  return 1 if n_mismatches or not is_same else 0
+  
+##endof:  main(argv)
+
+
+def run():
+  '''
+  Easy-to-remember entrance
+  
+  Defaults to the `main` method, with its defaults
+  '''
+  
+  return main([])
+  
+##endof:  run()
+
+
+def check_equivalence(n_trials=DEFAULT_N_TRIALS, seed=0):
+  '''
+  Compares the two ways on random strings (see  EQUIVALENCE_ALPHABET )
+  
+  A string that comes out different is written to stderr.
+  
+  @param n_trials  The number of strings
+  @param seed      For  random , so a run can be repeated
+  @return          The number of strings that came out different
+  '''
+  
+  the_random = random.Random(seed)
+  n_mismatches = 0
+  
+  for i_trial in range(n_trials):
+    swear_string = "".join(the_random.choice(EQUIVALENCE_ALPHABET)
+                           for i_char in range(the_random.randint(0, 40)))
+    
+    expected = legacy_fix_cp1252_leftovers(swear_string)
+    got = handle_text_encoding_decoding.fix_cp1252_leftovers(swear_string)
+    
+    if not got == expected:
+      n_mismatches += 1
+      sys.stderr.write("mismatch for " + repr(swear_string) + ": " + \
+                       repr(got) + " instead of " + repr(expected) + "\n")
+    ##endof:  if not got == expected
+  ##endof:  for i_trial in range(n_trials)
+  
+  return n_mismatches
+  
+##endof:  check_equivalence(n_trials, seed)
+
+
+def make_sample_text(n_chars=DEFAULT_N_CHARS, seed=0,
+                     leftover_spacing=LEFTOVER_SPACING):
+  '''
+  Makes a text of words and spaces, with about one in
+  leftover_spacing  characters a leftover from U+0080 to U+009F
+  '''
+  
+  the_random = random.Random(seed)
+  ordinary_chars = "abcdefghijklmnopqrstuvwxyz     ,.\n"
+  leftover_chars = "".join(chr(i) for i in range(0x80, 0xa0))
+  
+  sample_chars = the_random.choices(ordinary_chars, k=n_chars)
+  for i_char in range(0, n_chars, leftover_spacing):
+    i_leftover = i_char + the_random.randrange(leftover_spacing)
+    if i_leftover < n_chars:
+      sample_chars[i_leftover] = the_random.choice(leftover_chars)
+    ##endof:  if i_leftover < n_chars
+  ##endof:  for i_char in range(0, n_chars, leftover_spacing)
+  
+  return "".join(sample_chars)
+  
+##endof:  make_sample_text(n_chars, seed, leftover_spacing)
+
+
+def time_fixups(fix_function, sample_text, n_repeats=3):
+  '''
+  The best of  n_repeats  wall-clock times, in seconds, for
+  fix_function(sample_text)
+  '''
+  
+  best_seconds = None
+  
+  for i_repeat in range(n_repeats):
+    start_time = time.perf_counter()
+    fix_function(sample_text)
+    seconds = time.perf_counter() - start_time
+    
+    if best_seconds is None or seconds < best_seconds:
+      best_seconds = seconds
+    ##endof:  if best_seconds is None or seconds < best_seconds
+  ##endof:  for i_repeat in range(n_repeats)
+  
+  return best_seconds
+  
+##endof:  time_fixups(fix_function, sample_text, n_repeats)
+
+
+def legacy_fix_cp1252_leftovers(swear_string):
+  '''
+  The cp1252 fix-ups as they were, a chain of  re.sub s over the whole
+  string, kept as the reference the new ones are checked against
+  '''
+  
+  less_swear_str = re.sub(r"\x85\x20", " ... ",
+                          swear_string)
+  less_swear_str = re.sub(r"\x85", " ... ",
+                          less_swear_str)
+  
+  less_swear_str = re.sub(r"\x92\x20", "' ",
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x92", "'",
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x20\x91", " '",
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x91", "'",
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x20\x93", ' " ',
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x93", ' " ',
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x94\x20", ' " ',
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x94", ' " ',
+                          less_swear_str)
+  
+  less_swear_str = re.sub(r"\x20\x80", " EUR ",
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x80\x20", " EUR ",
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x80", " EUR ",
+                          less_swear_str)
+  
+  less_swear_str = re.sub(r"\x20\x8a", " S",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x8a", "S",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x9a", "s",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  
+  less_swear_str = re.sub(r"\x20\x8b", " < ",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x8b", " < ",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x9b\x20", " > ",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x9b", " > ",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  
+  less_swear_str = re.sub(r"\x20\x8c", " OE",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x8c", "OE",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x9c", "oe",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  
+  less_swear_str = re.sub(r"\x20\x8e", " Z",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x8e", "Z",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x9e", "z",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  
+  less_swear_str = re.sub(r"\x20\x9f", " Y",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  less_swear_str = re.sub(r"\x9f", "Y",
+                          less_swear_str,
+                          flags=re.IGNORECASE)
+  
+  less_swear_str = re.sub(r"\x95", " . ",
+                          less_swear_str)
+  
+  less_swear_str = re.sub(r"\x96", " - ",
+                          less_swear_str)
+  less_swear_str = re.sub(r"\x97", " - ",
+                          less_swear_str)
+  
+  less_swear_str = re.sub(r"\x99", " TM ",
+                          less_swear_str)
+  
+  return less_swear_str
+  
+##endof:  legacy_fix_cp1252_leftovers(swear_string)
+
+
+if __name__ == "__main__":
+  '''
+  Gets executed if the file is run as a script
+  '''
+  
+  sys.exit(main())
+  
+##endof:  if __name__ == "__main__"
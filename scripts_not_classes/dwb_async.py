@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+##############################################################################
+'''
+@file dwb_async.py
+@author David BLACK  @bballdave025
+@since 2026-10-18
+
+asyncio  counterparts of the text tools, for calling them from an event
+loop (e.g. on a service's request paths) without blocking it:
+
+   await awc(filename)                    dwb_pywc.count_file
+   async for line in agrep(s, filename)   dwb_pygrep.grep_lines
+   await ahead(n_lines, filename)         dwb_pyhead.iter_head
+   await atail(n_lines, filename)         dwb_pyhead.iter_tail
+   async for lines in afollow(filenames)  dwb_pyhead.follow
+   async for block in acat(filenames)     dwb_pycat.iter_cat_blocks
+
+The file I/O runs in a thread pool of bounded size (see  get_executor ),
+so hundreds of requests at once mean hundreds of tasks waiting their
+turn, not hundreds of threads.
+
+The async generators hand over what their thread found in batches,
+through an  asyncio.Queue  with room for only a few of them: when the
+consumer is slow, the thread waits (backpressure), rather than reading
+the whole file into memory. When the consumer stops early, or its task
+is cancelled, the thread is told so (with a  threading.Event ) and
+stops, closing the files. To have that happen right away after a
+break , close the generator, e.g. with  contextlib.aclosing .
+
+An example use from an  async  function
+
+ >>> import dwb_async
+ >>> the_result = await dwb_async.awc('some.log')
+ >>> async for line in dwb_async.agrep('ERROR', 'some.log'):
+ ...   print(line, end='')
+
+'''
+##############################################################################
+
+##-------------------
+## IMPORT STATEMENTS
+##-------------------
+import os
+import sys
+import asyncio
+import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Intra-Package
+## For Python2
+# from __future__ import absolute_import
+import dwb_pycat
+import dwb_pygrep
+import dwb_pyhead
+import dwb_pywc
+
+##-------------------
+## MODULE CONSTANTS
+##-------------------
+## The size of the shared thread pool. The work is mostly waiting on the
+## disk, so more threads than cores.
+DEFAULT_MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+## How many batches an async generator's thread may get ahead of it
+DEFAULT_QUEUE_SIZE = 8
+
+## How many lines (or blocks) go into one batch. Handing each one over
+## by itself would cost more than finding it.
+DEFAULT_BATCH_SIZE = 256
+
+## How often (in seconds) a thread waiting for room in the queue checks
+## whether it was told to stop
+STOP_CHECK_INTERVAL = 0.1
+
+## The shared thread pool, made when it is first needed
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def main(*filenames):
+  '''
+  Allows an entrance for running as a command-line script
+  
+  Counts the files all at once, with  awc , and prints the counts the
+  way `wc` does
+  '''
+  
+  async def count_all():
+    return await asyncio.gather(*[awc(filename) for filename in filenames])
+  ##endof:  count_all()
+  
+  results = asyncio.run(count_all())
+  sys.stdout.write(dwb_pywc.format_wc_bash(results))
+  
+  return results
+  
+##endof:  main(*filenames)
+
+
+def run(filename):
+  '''
+  Easy-to-remember entrance
+  
+  Defaults to the `awc` method, run to completion
+  '''
+  
+  return asyncio.run(awc(filename))
+  
+##endof:  run(filename)
+
+
+def get_executor():
+  '''
+  The thread pool the file I/O runs in (unless another is passed in),
+  with  DEFAULT_MAX_WORKERS  threads
+  '''
+  
+  global _executor
+  
+  with _executor_lock:
+    if _executor is None:
+      _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS,
+                                     thread_name_prefix='dwb_async')
+    ##endof:  if _executor is None
+  ##endof:  with _executor_lock
+  
+  return _executor
+  
+##endof:  get_executor()
+
+
+async def awc(filename, do_max_line_length=False, executor=None):
+  '''
+  Counts one file (see  dwb_pywc.count_file ) in the thread pool
+  
+  If the awaiting task is cancelled, the count that is already running
+  is let finish, and its result is dropped.
+  
+  @param filename            A string representing the filename
+  @param do_max_line_length  If True, the longest line is found, too
+  @param executor            The executor to run in (default: the one
+                             from  get_executor )
+  @return                    A  dwb_pywc.WcResult
+  '''
+  
+  return await _run_in_executor(executor, dwb_pywc.count_file, filename,
+                                do_max_line_length=do_max_line_length)
+  
+##endof:  awc(filename, do_max_line_length, executor)
+
+
+async def ahead(n_lines, filename, n_bytes=None, executor=None):
+  '''
+  The first  n_lines  lines (or  n_bytes  bytes) of a file, read in the
+  thread pool (see  dwb_pyhead.iter_head )
+  
+  @return  The bytes, exactly as they are in the file
+  '''
+  
+  return await _run_in_executor(executor, _join_blocks,
+                                dwb_pyhead.iter_head, filename, n_lines,
+                                n_bytes)
+  
+##endof:  ahead(n_lines, filename, n_bytes, executor)
+
+
+async def atail(n_lines, filename, n_bytes=None, executor=None):
+  '''
+  The last  n_lines  lines (or  n_bytes  bytes) of a file, read backward
+  from its end in the thread pool (see  dwb_pyhead.iter_tail )
+  
+  @return  The bytes, exactly as they are in the file
+  '''
+  
+  return await _run_in_executor(executor, _join_blocks,
+                                dwb_pyhead.iter_tail, filename, n_lines,
+                                n_bytes)
+  
+##endof:  atail(n_lines, filename, n_bytes, executor)
+
+
+def agrep(string_to_find, filename, recursive=False,
+          executor=None,
+          queue_size=DEFAULT_QUEUE_SIZE,
+          batch_size=DEFAULT_BATCH_SIZE):
+  '''
+  Yields the lines  dwb_pygrep.grep  would find, as they are found
+  
+  @param string_to_find  The same as for  dwb_pygrep.grep
+  @param filename        The same as for  dwb_pygrep.grep
+  @param recursive       The same as for  dwb_pygrep.grep
+  @param executor        The executor to run in (default: the one from
+                         get_executor )
+  @param queue_size      How many batches of lines the thread may get
+                         ahead
+  @param batch_size      How many lines go into a batch
+  @return                An async generator of strings (see
+                         dwb_pygrep.grep_lines )
+  '''
+  
+  def make_iterator(stop_event):
+    return dwb_pygrep.grep_lines(string_to_find, filename, recursive)
+  ##endof:  make_iterator(stop_event)
+  
+  return _aiter_in_thread(make_iterator, executor, queue_size, batch_size)
+  
+##endof:  agrep(string_to_find, filename, recursive, executor, ...)
+
+
+def acat(filenames, recursive=False,
+         block_size=dwb_pycat.CAT_BLOCK_SIZE,
+         executor=None,
+         queue_size=DEFAULT_QUEUE_SIZE):
+  '''
+  Yields the contents of the files, one after the other, in blocks of
+  bytes (see  dwb_pycat.iter_cat_blocks ), e.g. to send on in a response
+  
+  Each block is handed over by itself (they are big already), so at
+  most  queue_size  blocks are in memory at a time.
+  
+  @return  An async generator of non-empty  bytes  objects
+  '''
+  
+  def make_iterator(stop_event):
+    return dwb_pycat.iter_cat_blocks(filenames, block_size, recursive)
+  ##endof:  make_iterator(stop_event)
+  
+  return _aiter_in_thread(make_iterator, executor, queue_size, 1)
+  
+##endof:  acat(filenames, recursive, block_size, executor, queue_size)
+
+
+async def afollow(filenames, n_lines=dwb_pyhead.DEFAULT_N_LINES,
+                  n_bytes=None,
+                  on_notice=None,
+                  queue_size=DEFAULT_QUEUE_SIZE):
+  '''
+  Follows files, like `tail -F` (see  dwb_pyhead.follow ), yielding
+  their new lines as they are appended, until the generator is closed
+  or its task is cancelled
+  
+  Since following never finishes, it gets a thread of its own, rather
+  than tying up one of the shared pool's. The  on_notice  callback is
+  called in that thread.
+  
+  @return  An async generator of  dwb_pyhead.FollowedLines
+  '''
+  
+  the_executor = ThreadPoolExecutor(max_workers=1,
+                                    thread_name_prefix='dwb_async follow')
+  
+  def make_iterator(stop_event):
+    return dwb_pyhead.follow(filenames, n_lines, n_bytes,
+                             poll_interval=STOP_CHECK_INTERVAL * 5,
+                             stop_event=stop_event,
+                             on_notice=on_notice)
+  ##endof:  make_iterator(stop_event)
+  
+  try:
+    async with contextlib.aclosing(
+        _aiter_in_thread(make_iterator, the_executor,
+                         queue_size, 1)) as the_batches:
+      async for followed_lines in the_batches:
+        yield followed_lines
+      ##endof:  async for followed_lines in the_batches
+    ##endof:  async with contextlib.aclosing(...) as the_batches
+  finally:
+    the_executor.shutdown(wait=False)
+  ##endof:  try/finally
+  
+##endof:  afollow(filenames, n_lines, n_bytes, on_notice, queue_size)
+
+
+async def _run_in_executor(executor, func, *args, **kwargs):
+  '''
+  Runs a blocking function in the executor (by default, the shared one)
+  '''
+  
+  if executor is None:
+    executor = get_executor()
+  ##endof:  if executor is None
+  
+  return await asyncio.get_running_loop().run_in_executor(
+      executor, functools.partial(func, *args, **kwargs))
+  
+##endof:  _run_in_executor(executor, func, *args, **kwargs)
+
+
+def _join_blocks(iter_blocks, filename, n_lines, n_bytes):
+  '''
+  Runs in the thread pool: all of what  iter_head  (or  iter_tail )
+  gives, as one  bytes
+  '''
+  
+  return b''.join(iter_blocks(filename, n_lines, n_bytes))
+  
+##endof:  _join_blocks(iter_blocks, filename, n_lines, n_bytes)
+
+
+async def _aiter_in_thread(make_iterator, executor, queue_size, batch_size):
+  '''
+  Runs a blocking iterator in the executor, yielding its items here
+  
+  The thread hands the items over in batches, through an  asyncio.Queue .
+  It may only get  queue_size  batches ahead: before each batch, it
+  takes one of that many slots (a  threading.Semaphore ), which the
+  consumer gives back as it takes the batch. When the consumer is done
+  early (or cancelled), the thread finds out from  stop_event  and stops.
+  
+  @param make_iterator  Called in the thread with the  stop_event ; gives
+                        the iterator (if it is a generator, it is closed
+                        when the thread stops)
+  @param executor       The executor to run in (default: the one from
+                        get_executor )
+  @param queue_size     How many batches the thread may get ahead
+  @param batch_size     How many items go into a batch
+  @return               An async generator of the items
+  '''
+  
+  if executor is None:
+    executor = get_executor()
+  ##endof:  if executor is None
+  
+  loop = asyncio.get_running_loop()
+  
+  ## One more place than there are slots, for the end (or error) marker
+  batch_queue = asyncio.Queue(maxsize=queue_size + 1)
+  free_slots = threading.Semaphore(queue_size)
+  stop_event = threading.Event()
+  
+  producer = loop.run_in_executor(executor, _produce_batches,
+                                  make_iterator, batch_size, loop,
+                                  batch_queue, free_slots, stop_event)
+  
+  try:
+    while True:
+      kind, payload = await batch_queue.get()
+      
+      if kind == 'end':
+        break
+      elif kind == 'error':
+        raise payload
+      ##endof:  if/elif kind ...
+      
+      free_slots.release()
+      for item in payload:
+        yield item
+      ##endof:  for item in payload
+    ##endof:  while True
+    
+    await producer
+  finally:
+    stop_event.set()
+  ##endof:  try/finally
+  
+##endof:  _aiter_in_thread(make_iterator, executor, queue_size, batch_size)
+
+
+def _produce_batches(make_iterator, batch_size, loop,
+                     batch_queue, free_slots, stop_event):
+  '''
+  Runs in the executor, for  _aiter_in_thread : batches up the items,
+  and puts each batch into the queue (from the event loop's thread) once
+  there's a free slot for it
+  
+  Whatever the iterator raises is handed over, too, to be raised in the
+  consumer. Nothing is raised here, so the future is never left with an
+  exception nobody looks at.
+  '''
+  
+  def hand_over(kind, payload):
+    try:
+      loop.call_soon_threadsafe(batch_queue.put_nowait, (kind, payload))
+    except RuntimeError:
+      stop_event.set()  # the event loop is closed; nobody's listening
+    ##endof:  try/except RuntimeError
+  ##endof:  hand_over(kind, payload)
+  
+  def wait_for_slot():
+    while not stop_event.is_set():
+      if free_slots.acquire(timeout=STOP_CHECK_INTERVAL):
+        return True
+      ##endof:  if free_slots.acquire(timeout=STOP_CHECK_INTERVAL)
+    ##endof:  while not stop_event.is_set()
+    return False
+  ##endof:  wait_for_slot()
+  
+  the_iterator = None
+  
+  try:
+    the_iterator = make_iterator(stop_event)
+    batch = []
+    
+    for item in the_iterator:
+      if stop_event.is_set():
+        return
+      ##endof:  if stop_event.is_set()
+      
+      batch.append(item)
+      if len(batch) < batch_size:
+        continue
+      ##endof:  if len(batch) < batch_size
+      
+      if not wait_for_slot():
+        return
+      ##endof:  if not wait_for_slot()
+      hand_over('batch', batch)
+      batch = []
+    ##endof:  for item in the_iterator
+    
+    if batch:
+      if not wait_for_slot():
+        return
+      ##endof:  if not wait_for_slot()
+      hand_over('batch', batch)
+    ##endof:  if batch
+  except BaseException as e_produce:
+    if not stop_event.is_set():
+      hand_over('error', e_produce)
+    ##endof:  if not stop_event.is_set()
+    return
+  finally:
+    if hasattr(the_iterator, 'close'):
+      the_iterator.close()
+    ##endof:  if hasattr(the_iterator, 'close')
+  ##endof:  try/except/finally
+  
+  hand_over('end', None)
+  
+##endof:  _produce_batches(make_iterator, batch_size, loop, ...)
+
+
+if __name__ == "__main__":
+  '''
+  Gets executed if the file is run as a script
+  '''
+  
+  main(*sys.argv[1:])
+  
+##endof:  if __name__ == "__main__"
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+##############################################################################
+'''
+@file dwb_compressed_input.py
+@author David BLACK  @bballdave025
+@since 2026-10-18
+
+Reads  .gz ,  .bz2 ,  .xz  and  .zst  files as if they weren't
+compressed, without unpacking them to disk first. The kind of
+compression is found from the file's first bytes (its "magic number"),
+not from its extension.
+
+The decompression happens in a separate thread, which stays a few
+chunks ahead of whoever is reading, so decompressing and (e.g.) matching
+overlap. The  zlib ,  bz2  and  lzma  decompressors let go of the GIL
+while they work, so the two really do run at the same time.
+
+For  .zst , either the  zstandard  package (`pip install zstandard`) or
+the standard library's  compression.zstd  (Python 3.14 and later) is
+needed.
+'''
+##############################################################################
+
+##-------------------
+## IMPORT STATEMENTS
+##-------------------
+import sys
+import gzip
+import bz2
+import lzma
+import queue
+import threading
+
+can_do_zstandard = True # innocent until proven guilty
+can_do_stdlib_zstd = True
+
+try:
+  import zstandard  # needs `pip install zstandard`
+except Exception as e_zstandard:
+  can_do_zstandard = False
+finally:
+  pass
+##endof:  try/except/finally zstandard
+
+try:
+  from compression import zstd as stdlib_zstd  # Python 3.14+
+except Exception as e_stdlib_zstd:
+  can_do_stdlib_zstd = False
+finally:
+  pass
+##endof:  try/except/finally stdlib_zstd
+
+# Intra-Package
+## For Python2
+# from __future__ import absolute_import
+
+##-------------------
+## MODULE CONSTANTS
+##-------------------
+## (magic number, compression name), checked in order
+COMPRESSION_MAGIC = ((b'\x1f\x8b', 'gzip'),
+                     (b'BZh', 'bzip2'),
+                     (b'\xfd7zXZ\x00', 'xz'),
+                     (b'\x28\xb5\x2f\xfd', 'zstd'))
+
+MAGIC_LENGTH = max(len(magic) for magic, name in COMPRESSION_MAGIC)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+## How many decompressed chunks the decompressing thread may get ahead
+DEFAULT_QUEUE_DEPTH = 4
+
+
+def main(*filenames):
+  '''
+  Allows an entrance for running as a command-line script
+  
+  Writes the decompressed contents of the files to stdout, like `zcat`
+  (files that aren't compressed are copied as they are)
+  '''
+  
+  sys.stdout.flush()
+  
+  for filename in filenames:
+    for chunk in iter_decompressed_chunks(filename):
+      sys.stdout.buffer.write(chunk)
+    ##endof:  for chunk in iter_decompressed_chunks(filename)
+  ##endof:  for filename in filenames
+  
+  sys.stdout.buffer.flush()
+  
+##endof:  main(*filenames)
+
+
+def run(filename):
+  '''
+  Easy-to-remember entrance
+  
+  Defaults to the `iter_decompressed_chunks` method
+  '''
+  
+  return iter_decompressed_chunks(filename)
+  
+##endof:  run(filename)
+
+
+def detect_compression(filename):
+  '''
+  Finds out, from its first bytes, how a file is compressed
+  
+  @param filename  A string representing the filename
+  @return          One of 'gzip', 'bzip2', 'xz', 'zstd', or None for a
+                   file that isn't compressed (in a way we know about)
+  '''
+  
+  with open(filename, 'rb') as f:
+    first_bytes = f.read(MAGIC_LENGTH)
+  ##endof:  with open ... f
+  
+  for magic, compression_name in COMPRESSION_MAGIC:
+    if first_bytes.startswith(magic):
+      return compression_name
+    ##endof:  if first_bytes.startswith(magic)
+  ##endof:  for magic, compression_name in COMPRESSION_MAGIC
+  
+  return None
+  
+##endof:  detect_compression(filename)
+
+
+def open_decompressed(filename, compression=None):
+  '''
+  Opens a file for reading its decompressed bytes
+  
+  @param filename     A string representing the filename
+  @param compression  What  detect_compression  gave (it is called if
+                      this is None)
+  @return             A binary, readable file object; a plain
+                      open(filename, 'rb')  if the file isn't compressed
+  '''
+  
+  if compression is None:
+    compression = detect_compression(filename)
+  ##endof:  if compression is None
+  
+  if compression == 'gzip':
+    return gzip.open(filename, 'rb')
+  elif compression == 'bzip2':
+    return bz2.open(filename, 'rb')
+  elif compression == 'xz':
+    return lzma.open(filename, 'rb')
+  elif compression == 'zstd':
+    if can_do_stdlib_zstd:
+      return stdlib_zstd.open(filename, 'rb')
+    elif can_do_zstandard:
+      return zstandard.open(filename, 'rb')
+    ##endof:  if/elif can_do_stdlib_zstd ... can_do_zstandard
+    
+    raise OSError("Can't read the zstd-compressed file\n  " + \
+                  str(filename) + "\nwithout the  zstandard  package " + \
+                  "(`pip install zstandard`) or Python 3.14+")
+  ##endof:  if/elif compression == ...
+  
+  return open(filename, 'rb')
+  
+##endof:  open_decompressed(filename, compression)
+
+
+def iter_decompressed_chunks(filename,
+                             chunk_size=DEFAULT_CHUNK_SIZE,
+                             queue_depth=DEFAULT_QUEUE_DEPTH,
+                             compression=None):
+  '''
+  Yields the decompressed bytes of a file in chunks, decompressing in a
+  separate thread that stays up to  queue_depth  chunks ahead
+  
+  A file that isn't compressed is read directly, with no thread.
+  
+  If the caller stops early (e.g. after enough matches), the thread is
+  told to stop and is waited for when the generator is closed.
+  
+  @param filename     A string representing the filename
+  @param chunk_size   The (maximum) number of decompressed bytes per chunk
+  @param queue_depth  How many chunks the thread may get ahead
+  @param compression  What  detect_compression  gave (it is called if
+                      this is None)
+  @return             A generator of non-empty  bytes  objects
+  '''
+  
+  if compression is None:
+    compression = detect_compression(filename)
+  ##endof:  if compression is None
+  
+  if compression is None:
+    with open(filename, 'rb') as f:
+      for chunk in iter(lambda: f.read(chunk_size), b''):
+        yield chunk
+      ##endof:  for chunk in iter(...)
+    ##endof:  with open ... f
+    return
+  ##endof:  if compression is None
+  
+  ## The reader is opened here, so a missing file or package shows up
+  ## right away, in the caller's thread
+  decompressed_fh = open_decompressed(filename, compression)
+  
+  chunk_queue = queue.Queue(maxsize=queue_depth)
+  stop_event = threading.Event()
+  end_marker = None
+  
+  the_thread = threading.Thread(target=_decompress_into_queue,
+                                args=(decompressed_fh, chunk_size,
+                                      chunk_queue, stop_event, end_marker),
+                                name="decompress " + str(filename),
+                                daemon=True)
+  the_thread.start()
+  
+  try:
+    while True:
+      chunk = chunk_queue.get()
+      
+      if chunk is end_marker:
+        break
+      elif isinstance(chunk, BaseException):
+        raise chunk
+      ##endof:  if/elif chunk ...
+      
+      yield chunk
+    ##endof:  while True
+  finally:
+    stop_event.set()
+    
+    ## Make room, in case the thread is blocked on a full queue
+    while the_thread.is_alive():
+      try:
+        chunk_queue.get(timeout=0.1)
+      except queue.Empty:
+        pass
+      ##endof:  try/except queue.Empty
+    ##endof:  while the_thread.is_alive()
+    
+    the_thread.join()
+  ##endof:  try/finally
+  
+##endof:  iter_decompressed_chunks(filename, ...)
+
+
+def _decompress_into_queue(decompressed_fh, chunk_size,
+                           chunk_queue, stop_event, end_marker):
+  '''
+  Runs in the decompressing thread: reads chunks into the queue until the
+  end of the file, an error (which is passed along), or  stop_event
+  '''
+  
+  try:
+    with decompressed_fh:
+      while not stop_event.is_set():
+        chunk = decompressed_fh.read(chunk_size)
+        if not chunk:
+          break
+        ##endof:  if not chunk
+        chunk_queue.put(chunk)
+      ##endof:  while not stop_event.is_set()
+    ##endof:  with decompressed_fh
+  except Exception as e_decompress:
+    chunk_queue.put(e_decompress)
+    return
+  ##endof:  try/except
+  
+  chunk_queue.put(end_marker)
+  
+##endof:  _decompress_into_queue(decompressed_fh, chunk_size, ...)
+
+
+if __name__ == "__main__":
+  '''
+  Gets executed if the file is run as a script
+  '''
+  
+  main(*sys.argv[1:])
+  
+##endof:  if __name__ == "__main__"
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+##############################################################################
+'''
+@file dwb_inotify.py
+@author David BLACK  @bballdave025
+@since 2026-10-18
+
+Linux's inotify, through  ctypes , for being woken up when files change
+instead of checking on them every so often (see  dwb_pyhead.follow ).
+
+The inotify file descriptor is an ordinary, selectable one, so it can
+go into a  selectors  (or  asyncio ) event loop along with anything
+else. Where there is no inotify (not Linux, or no libc to be found),
+can_do_inotify  is False and the callers poll instead.
+
+An example use from the interactive console
+
+ >>> import os, dwb_inotify
+ >>> inotify_fd = dwb_inotify.inotify_init()
+ >>> dwb_inotify.add_watch(inotify_fd, '/var/log', dwb_inotify.IN_MODIFY)
+ >>> dwb_inotify.read_events(inotify_fd)   # [] until something changes
+ >>> os.close(inotify_fd)
+
+'''
+##############################################################################
+
+##-------------------
+## IMPORT STATEMENTS
+##-------------------
+import os
+import sys
+import errno
+import struct
+import selectors
+from collections import namedtuple
+
+can_do_inotify = True # innocent until proven guilty
+try:
+  import ctypes
+  libc = ctypes.CDLL(None, use_errno=True)
+  libc.inotify_init1.argtypes = [ctypes.c_int]
+  libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                     ctypes.c_uint32]
+  libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+except Exception as e_inotify:
+  can_do_inotify = False
+finally:
+  pass
+##endof:  try/except/finally ctypes inotify
+
+# Intra-Package
+## For Python2
+# from __future__ import absolute_import
+
+##-------------------
+## MODULE CONSTANTS
+##-------------------
+## The events (from  <sys/inotify.h> )
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+## What a watched directory reports for the files in it being written
+## to, truncated, created, deleted, or moved (rotated) in or out
+IN_FILE_CHANGES = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | \
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+## The fixed part of a  struct inotify_event : wd, mask, cookie, len
+EVENT_HEADER = struct.Struct('iIII')
+
+## Enough for a good many events (each is at most 16 + NAME_MAX + 1)
+EVENT_BUFFER_SIZE = 64 * 1024
+
+## One event. The  name  (bytes) is that of the file in a watched
+## directory, or b'' for the watched path itself.
+InotifyEvent = namedtuple('InotifyEvent', ['wd', 'mask', 'cookie', 'name'])
+
+
+def main(*paths):
+  '''
+  Allows an entrance for running as a command-line script
+  
+  Watches the paths (files or directories) and prints each event as it
+  comes, like `inotifywait -m`, until interrupted
+  '''
+  
+  inotify_fd = inotify_init()
+  watched_paths = {add_watch(inotify_fd, path, IN_FILE_CHANGES): path
+                   for path in paths}
+  
+  try:
+    with selectors.DefaultSelector() as the_selector:
+      the_selector.register(inotify_fd, selectors.EVENT_READ)
+      while True:
+        the_selector.select()
+        for event in read_events(inotify_fd):
+          print(str(watched_paths.get(event.wd)) + " " + \
+                hex(event.mask) + " " + os.fsdecode(event.name))
+        ##endof:  for event in read_events(inotify_fd)
+      ##endof:  while True
+    ##endof:  with selectors.DefaultSelector() as the_selector
+  except KeyboardInterrupt:
+    pass
+  finally:
+    os.close(inotify_fd)
+  ##endof:  try/except/finally
+  
+##endof:  main(*paths)
+
+
+def run(path):
+  '''
+  Easy-to-remember entrance
+  
+  Defaults to the `main` method, for one path
+  '''
+  
+  return main(path)
+  
+##endof:  run(path)
+
+
+def inotify_init():
+  '''
+  Opens a new (non-blocking, close-on-exec) inotify instance
+  
+  @return  Its file descriptor, which the caller closes with  os.close
+  @raise   OSError  if there's no inotify (see  can_do_inotify ) or it
+           can't be opened (e.g. too many instances)
+  '''
+  
+  if not can_do_inotify:
+    raise OSError(errno.ENOSYS, "inotify isn't available here")
+  ##endof:  if not can_do_inotify
+  
+  inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+  if inotify_fd < 0:
+    the_errno = ctypes.get_errno()
+    raise OSError(the_errno, os.strerror(the_errno))
+  ##endof:  if inotify_fd < 0
+  
+  return inotify_fd
+  
+##endof:  inotify_init()
+
+
+def add_watch(inotify_fd, path, mask):
+  '''
+  Starts watching a file or directory (or changes what is watched for)
+  
+  @param inotify_fd  From  inotify_init
+  @param path        A string (or bytes) representing the path
+  @param mask        The events to watch for, e.g.  IN_FILE_CHANGES
+  @return            The watch descriptor, which comes back in the
+                     wd  of each of its  InotifyEvent s
+  '''
+  
+  wd = libc.inotify_add_watch(inotify_fd, os.fsencode(path), mask)
+  if wd < 0:
+    the_errno = ctypes.get_errno()
+    raise OSError(the_errno, os.strerror(the_errno), path)
+  ##endof:  if wd < 0
+  
+  return wd
+  
+##endof:  add_watch(inotify_fd, path, mask)
+
+
+def read_events(inotify_fd):
+  '''
+  Reads every event waiting on an inotify instance, without blocking
+  
+  @param inotify_fd  From  inotify_init
+  @return            A list of  InotifyEvent s (empty if there were none)
+  '''
+  
+  events = []
+  
+  while True:
+    try:
+      event_bytes = os.read(inotify_fd, EVENT_BUFFER_SIZE)
+    except BlockingIOError:
+      break
+    ##endof:  try/except BlockingIOError
+    
+    event_start = 0
+    while event_start < len(event_bytes):
+      wd, mask, cookie, name_length = \
+        EVENT_HEADER.unpack_from(event_bytes, event_start)
+      name_start = event_start + EVENT_HEADER.size
+      
+      ## The name is padded out with NULs
+      name = event_bytes[name_start:name_start + name_length].rstrip(b'\0')
+      events.append(InotifyEvent(wd, mask, cookie, name))
+      
+      event_start = name_start + name_length
+    ##endof:  while event_start < len(event_bytes)
+  ##endof:  while True
+  
+  return events
+  
+##endof:  read_events(inotify_fd)
+
+
+if __name__ == "__main__":
+  '''
+  Gets executed if the file is run as a script
+  '''
+  
+  main(*sys.argv[1:])
+  
+##endof:  if __name__ == "__main__"
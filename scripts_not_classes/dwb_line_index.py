@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+##############################################################################
+'''
+@file dwb_line_index.py
+@author David BLACK  @bballdave025
+@since 2026-10-18
+
+A sidecar index of the byte offsets at which the lines of a (big,
+append-only) file start, so that line numbers, the positions of the
+first or last N lines, and line counts can be looked up instead of
+rescanning the file each time.
+
+The index for  some.log  is kept in  some.log.lineidx . It is a small
+header followed by a flat array of little-endian unsigned 64-bit
+offsets (the same layout as  array('Q') ), which is mmap'ed, so a
+lookup only reads the pages of the offsets it needs. The
+offsets are  [0]  plus the offset just after each b'\\n' , meaning that
+the last entry is either the file size (when the file ends in a newline)
+or the start of a last, unfinished line.
+
+When the file has grown since the index was written, only the new bytes
+are scanned. If the file was replaced, truncated, or rewritten (the
+inode, the size, or a checksum of the indexed bytes at its start or end
+don't agree), the index is rebuilt from scratch.
+
+An example use from the interactive console
+
+ >>> import dwb_line_index
+ >>> the_index = dwb_line_index.get_line_index('some.log')
+ >>> dwb_line_index.count_lines(the_index)        # like `wc -l`
+ >>> dwb_line_index.line_number_of_offset(the_index, 123456)
+
+'''
+##############################################################################
+
+##-------------------
+## IMPORT STATEMENTS
+##-------------------
+import os
+import sys
+import mmap
+import struct
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+# Intra-Package
+## For Python2
+# from __future__ import absolute_import
+
+##-------------------
+## MODULE CONSTANTS
+##-------------------
+SIDECAR_EXTENSION = '.lineidx'
+
+## magic, indexed file size, inode, number of offsets, CRC-32 of the
+## first and of the last CHECKSUM_SPAN indexed bytes
+INDEX_MAGIC = b'DWBLIDX1'
+INDEX_HEADER = struct.Struct('<8sQQQII')
+
+CHECKSUM_SPAN = 4096
+
+## The number of bytes read at a time when scanning for newlines
+SCAN_BLOCK_SIZE = 1024 * 1024
+
+## The index as it is used in memory.  line_starts  is a sequence of
+## ints: a  memoryview  of the mmap'ed sidecar (or an  array('Q') , for
+## an index that couldn't be saved, or on a big-endian machine).
+LineIndex = namedtuple('LineIndex', ['filename', 'file_size', 'line_starts'])
+
+
+def main(filename):
+  '''
+  Allows an entrance for running as a command-line script
+  
+  Builds (or brings up to date) the sidecar index, then prints the
+  number of lines, the same as `wc -l` would
+  '''
+  
+  the_index = run(filename)
+  print(count_lines(the_index))
+  
+  return the_index
+  
+##endof:  main(filename)
+
+
+def run(filename):
+  '''
+  Easy-to-remember entrance
+  
+  Defaults to the `get_line_index` method
+  '''
+  
+  return get_line_index(filename)
+  
+##endof:  run(filename)
+
+
+def sidecar_filename(filename):
+  '''
+  The filename of the sidecar index that goes with  filename
+  '''
+  
+  return filename + SIDECAR_EXTENSION
+  
+##endof:  sidecar_filename(filename)
+
+
+def get_line_index(filename, index_filename=None, do_save=True):
+  '''
+  Loads the line index for  filename , bringing it up to date first
+  
+  @param filename        A string representing the filename to be indexed
+  @param index_filename  Where the sidecar index is kept (by default,
+                         filename  plus  '.lineidx' )
+  @param do_save         If True, a new or updated index is written back
+                         to  index_filename . If that can't be done (e.g.
+                         a read-only directory), the index is still
+                         returned.
+  @return                A  LineIndex
+  '''
+  
+  if index_filename is None:
+    index_filename = sidecar_filename(filename)
+  ##endof:  if index_filename is None
+  
+  with open(filename, 'rb') as f:
+    file_stat = os.fstat(f.fileno())
+    file_size = file_stat.st_size
+    
+    header, saved_starts = _read_sidecar(index_filename)
+    
+    is_rebuilt = header is None or \
+                 not _sidecar_agrees(f, header, file_stat.st_ino, file_size)
+    
+    if is_rebuilt:
+      saved_starts = []
+      new_starts = array('Q', [0])
+      indexed_size = 0
+    else:
+      new_starts = array('Q')
+      indexed_size = header[1]
+    ##endof:  if/else is_rebuilt
+    
+    ## Only as far as the size in the header, even if the file is still
+    ## growing (the rest is for the next time)
+    if indexed_size < file_size:
+      f.seek(indexed_size)
+      _scan_line_starts(f, indexed_size, file_size, new_starts)
+    ##endof:  if indexed_size < file_size
+    
+    if not new_starts:
+      return LineIndex(filename, file_size, saved_starts)
+    ##endof:  if not new_starts
+    
+    if do_save:
+      new_header = (INDEX_MAGIC, file_size, file_stat.st_ino,
+                    len(saved_starts) + len(new_starts),
+                    _checksum_head(f, file_size),
+                    _checksum_tail(f, file_size))
+      try:
+        _write_sidecar(index_filename, new_header, new_starts,
+                       len(saved_starts))
+        header, line_starts = _read_sidecar(index_filename)
+        if header == new_header:
+          return LineIndex(filename, file_size, line_starts)
+        ##endof:  if header == new_header
+      except OSError:
+        pass  # no sidecar this time; the index itself is still good
+      ##endof:  try/except OSError
+    ##endof:  if do_save
+  ##endof:  with open ... f
+  
+  line_starts = array('Q', saved_starts)
+  line_starts.extend(new_starts)
+  
+  return LineIndex(filename, file_size, line_starts)
+  
+##endof:  get_line_index(filename, index_filename, do_save)
+
+
+def count_lines(line_index):
+  '''
+  The number of newlines in the file, the same as `wc -l`
+  '''
+  
+  return len(line_index.line_starts) - 1
+  
+##endof:  count_lines(line_index)
+
+
+def line_number_of_offset(line_index, byte_offset):
+  '''
+  The 1-based number of the line that holds the byte at  byte_offset
+  '''
+  
+  return bisect_right(line_index.line_starts, byte_offset)
+  
+##endof:  line_number_of_offset(line_index, byte_offset)
+
+
+def offset_of_line(line_index, line_num):
+  '''
+  The byte offset at which the 1-based line  line_num  starts
+  
+  For a  line_num  past the last line, the file size is returned, so
+  offset_of_line(the_index, n + 1)  is where the first  n  lines end.
+  '''
+  
+  line_starts = line_index.line_starts
+  
+  if line_num < 1:
+    return 0
+  elif line_num > len(line_starts):
+    return line_index.file_size
+  ##endof:  if/elif line_num ...
+  
+  return min(line_starts[line_num - 1], line_index.file_size)
+  
+##endof:  offset_of_line(line_index, line_num)
+
+
+def tail_offset(line_index, n_lines):
+  '''
+  The byte offset at which the last  n_lines  lines start, as for `tail`
+  '''
+  
+  line_starts = line_index.line_starts
+  
+  ## A last line without a newline is still a line
+  n_total_lines = len(line_starts) - 1
+  if line_starts[-1] < line_index.file_size:
+    n_total_lines += 1
+  ##endof:  if line_starts[-1] < line_index.file_size
+  
+  if n_lines <= 0:
+    return line_index.file_size
+  ##endof:  if n_lines <= 0
+  
+  return offset_of_line(line_index, max(1, n_total_lines - n_lines + 1))
+  
+##endof:  tail_offset(line_index, n_lines)
+
+
+def _scan_line_starts(binary_fh, start_offset, end_offset, line_starts):
+  '''
+  Appends the offset just after each b'\\n' from the current position
+  ( start_offset ) up to  end_offset
+  
+  The work per line is done by  bytes.split ,  map  and  accumulate ,
+  which all run in C.
+  '''
+  
+  block_offset = start_offset
+  
+  while block_offset < end_offset:
+    block = binary_fh.read(min(SCAN_BLOCK_SIZE, end_offset - block_offset))
+    if not block:
+      break
+    ##endof:  if not block
+    
+    ## Every piece but the last one ended in a b'\n'
+    newline_ended = block.split(b'\n')[:-1]
+    
+    line_starts.extend(map(block_offset.__add__,
+                           accumulate(map((1).__add__,
+                                          map(len, newline_ended)))))
+    
+    block_offset += len(block)
+  ##endof:  while block_offset < end_offset
+  
+##endof:  _scan_line_starts(binary_fh, start_offset, end_offset, line_starts)
+
+
+def _checksum_head(binary_fh, indexed_size):
+  '''
+  CRC-32 of the first (up to) CHECKSUM_SPAN indexed bytes
+  '''
+  
+  binary_fh.seek(0)
+  
+  return zlib.crc32(binary_fh.read(min(CHECKSUM_SPAN, indexed_size)))
+  
+##endof:  _checksum_head(binary_fh, indexed_size)
+
+
+def _checksum_tail(binary_fh, indexed_size):
+  '''
+  CRC-32 of the last (up to) CHECKSUM_SPAN indexed bytes
+  '''
+  
+  tail_start = max(0, indexed_size - CHECKSUM_SPAN)
+  binary_fh.seek(tail_start)
+  
+  return zlib.crc32(binary_fh.read(indexed_size - tail_start))
+  
+##endof:  _checksum_tail(binary_fh, indexed_size)
+
+
+def _sidecar_agrees(binary_fh, header, inode, file_size):
+  '''
+  Tells whether the saved index still describes (the start of) the file
+  '''
+  
+  magic, indexed_size, indexed_inode, n_starts, head_crc, tail_crc = header
+  
+  if indexed_inode != inode or indexed_size > file_size:
+    return False
+  ##endof:  if indexed_inode != inode or indexed_size > file_size
+  
+  return _checksum_head(binary_fh, indexed_size) == head_crc and \
+         _checksum_tail(binary_fh, indexed_size) == tail_crc
+  
+##endof:  _sidecar_agrees(binary_fh, header, inode, file_size)
+
+
+def _read_sidecar(index_filename):
+  '''
+  Maps a sidecar index into memory
+  
+  Only the header is read; the offsets are a  memoryview  of the mmap
+  (read-only), so each one is only read from the disk when it's looked
+  at. On a big-endian machine, they are read into an  array('Q')  and
+  byte-swapped instead.
+  
+  @return  (header, line_starts) , or  (None, None)  if there's no usable
+           sidecar
+  '''
+  
+  try:
+    with open(index_filename, 'rb') as ifh:
+      header = INDEX_HEADER.unpack(ifh.read(INDEX_HEADER.size))
+      if header[0] != INDEX_MAGIC:
+        return None, None
+      ##endof:  if header[0] != INDEX_MAGIC
+      
+      starts_end = INDEX_HEADER.size + header[3] * array('Q').itemsize
+      if os.fstat(ifh.fileno()).st_size < starts_end:
+        return None, None
+      ##endof:  if os.fstat(ifh.fileno()).st_size < starts_end
+      
+      if sys.byteorder != 'little':
+        line_starts = array('Q')
+        line_starts.fromfile(ifh, header[3])
+        line_starts.byteswap()
+        return header, line_starts
+      ##endof:  if sys.byteorder != 'little'
+      
+      ## (the mapping stays open as long as the  memoryview  is around)
+      sidecar_map = mmap.mmap(ifh.fileno(), 0, access=mmap.ACCESS_READ)
+    ##endof:  with open ... ifh
+  except (OSError, ValueError, EOFError, struct.error):
+    return None, None
+  ##endof:  try/except
+  
+  line_starts = \
+    memoryview(sidecar_map)[INDEX_HEADER.size:starts_end].cast('Q')
+  
+  return header, line_starts
+  
+##endof:  _read_sidecar(index_filename)
+
+
+def _write_sidecar(index_filename, header, new_starts, n_saved_starts):
+  '''
+  Writes the sidecar index: appending to it when it is being extended,
+  and otherwise writing a new one next to it and renaming that into
+  place, since the old one may still be mapped (see  _read_sidecar ),
+  and shrinking it under a mapping would break that
+  
+  The offsets go out before the header, so an interrupted update leaves
+  the old (still correct) header in place.
+  
+  @param new_starts      An  array('Q')  of the offsets after the first
+                         n_saved_starts  (which are already in the
+                         sidecar)
+  '''
+  
+  if sys.byteorder != 'little':
+    new_starts = array('Q', new_starts)
+    new_starts.byteswap()
+  ##endof:  if sys.byteorder != 'little'
+  
+  if n_saved_starts > 0:
+    with open(index_filename, 'r+b') as ofh:
+      ofh.seek(INDEX_HEADER.size + n_saved_starts * new_starts.itemsize)
+      new_starts.tofile(ofh)
+      ofh.truncate()  # (anything left from an interrupted update)
+      ofh.flush()
+      
+      ofh.seek(0)
+      ofh.write(INDEX_HEADER.pack(*header))
+    ##endof:  with open ... ofh
+    return
+  ##endof:  if n_saved_starts > 0
+  
+  index_dir = os.path.dirname(os.path.abspath(index_filename))
+  temp_fd, temp_filename = \
+    tempfile.mkstemp(prefix=os.path.basename(index_filename) + '.',
+                     suffix='.tmp',
+                     dir=index_dir)
+  
+  try:
+    with os.fdopen(temp_fd, 'wb') as ofh:
+      ofh.write(INDEX_HEADER.pack(*header))
+      new_starts.tofile(ofh)
+    ##endof:  with os.fdopen(temp_fd, 'wb') as ofh
+    
+    os.replace(temp_filename, index_filename)
+  except BaseException:
+    os.unlink(temp_filename)
+    raise
+  ##endof:  try/except BaseException
+  
+##endof:  _write_sidecar(index_filename, header, new_starts, n_saved_starts)
+
+
+if __name__ == "__main__":
+  '''
+  Gets executed if the file is run as a script
+  '''
+  
+  main(sys.argv[1])
+  
+##endof:  if __name__ == "__main__"
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+##############################################################################
+'''
+@file dwb_multi_pattern.py
+@author David BLACK  @bballdave025
+@since 2026-10-18
+
+Matches many patterns against a line at once. The literal keywords are
+compiled into one Aho-Corasick automaton, and the regexes are compiled
+into one alternation, so that a scan is roughly O(bytes) instead of
+O(patterns x lines).
+
+If the  pyahocorasick  package (`pip install pyahocorasick`) can be
+imported, its C automaton is used; otherwise a pure-Python automaton is
+built. Either way, each line is first run through a single compiled
+regex (the literals laid out as a trie, plus the regex alternation),
+so lines without any match never touch the Python-level code. A regex
+with groups (and so, maybe back-references) is left out of the
+alternation, where its group numbers and names would change, and is
+searched for on its own.
+
+An example use from the interactive console
+
+ >>> import dwb_multi_pattern
+ >>> matcher = dwb_multi_pattern.compile_patterns(['error', 'fatal'],
+ ...                                              regexes=['code=5[0-9][0-9]'])
+ >>> matcher.match_line("fatal error, code=503")
+ ('error', 'fatal', 'code=5[0-9][0-9]')
+ >>> matcher.match_line("all is well")
+ ()
+
+'''
+##############################################################################
+
+##-------------------
+## IMPORT STATEMENTS
+##-------------------
+import sys
+import re
+from collections import deque
+
+can_do_pyahocorasick = True # innocent until proven guilty
+
+try:
+  import ahocorasick  # needs `pip install pyahocorasick`
+except Exception as e_ahocorasick:
+  can_do_pyahocorasick = False
+finally:
+  pass
+##endof:  try/except/finally ahocorasick
+
+# Intra-Package
+## For Python2
+# from __future__ import absolute_import
+
+## A leading global-flag group such as  (?i) , which isn't allowed once the
+## regex is put inside the combined alternation
+LEADING_GLOBAL_FLAGS_RE = re.compile(r"^\(\?([aiLmsux]+)\)")
+
+
+def main(keywords_filename, *filenames):
+  '''
+  Allows an entrance for running as a command-line script
+  
+  Reads the literal keywords (one per line) from  keywords_filename  and
+  prints each line of the other files that contains any of them, along
+  with the keywords that it contains.
+  '''
+  
+  with open(keywords_filename, 'r', encoding='utf-8') as kfh:
+    literals = [line.rstrip("\n") for line in kfh if line.rstrip("\n")]
+  ##endof:  with open ... kfh
+  
+  matcher = compile_patterns(literals)
+  
+  for filename in filenames:
+    with open(filename, 'r', encoding='utf-8', errors='replace') as f:
+      for line in f:
+        matched = matcher.match_line(line)
+        if matched:
+          sys.stdout.write(filename + ":" + ",".join(matched) + ":" + line)
+        ##endof:  if matched
+      ##endof:  for line in f
+    ##endof:  with open ... f
+  ##endof:  for filename in filenames
+  
+##endof:  main(keywords_filename, *filenames)
+
+
+def run(literals, regexes=(), ignore_case=False):
+  '''
+  Easy-to-remember entrance
+  
+  Defaults to the `compile_patterns` method
+  '''
+  
+  return compile_patterns(literals, regexes, ignore_case)
+  
+##endof:  run(literals, regexes, ignore_case)
+
+
+def compile_patterns(literals=(), regexes=(), ignore_case=False):
+  '''
+  Compiles the patterns once, giving back the matcher to use on each line
+  
+  @param literals     An iterable of plain strings (keywords) to be found
+                      anywhere in a line
+  @param regexes      An iterable of regex strings to be searched for
+                      anywhere in a line
+  @param ignore_case  If True, both kinds of patterns ignore case
+  @return             A  MultiPatternMatcher
+  '''
+  
+  return MultiPatternMatcher(literals, regexes, ignore_case)
+  
+##endof:  compile_patterns(literals, regexes, ignore_case)
+
+
+class MultiPatternMatcher(object):
+  '''
+  Many literals and regexes, compiled once, to be checked against lines
+  
+  The patterns are searched for anywhere in the line (like `bash`'s
+  `grep`), not only at its start.
+  
+  @param literals     An iterable of plain strings
+  @param regexes      An iterable of regex strings
+  @param ignore_case  If True, both kinds of patterns ignore case
+  '''
+  
+  def __init__(self, literals=(), regexes=(), ignore_case=False):
+    self.literals = list(literals)
+    self.regexes = list(regexes)
+    self.ignore_case = ignore_case
+    
+    ## Everything, in the order in which matches are reported
+    self.patterns = self.literals + self.regexes
+    
+    re_flags = re.IGNORECASE if ignore_case else 0
+    
+    keys = [self._fold(literal) for literal in self.literals]
+    self._literal_automaton = _build_literal_automaton(keys)
+    
+    self._compiled_regexes = [re.compile(regex, re_flags)
+                              for regex in self.regexes]
+    
+    ## One regex to answer "does anything match at all?" in C. A regex
+    ## with groups can't go in it (its  \1  or  (?P<x>...)  would then
+    ## mean something else, or clash), so it's searched for on its own.
+    prefilter_branches = []
+    if self.literals:
+      prefilter_branches.append(_build_trie_regex_source(keys))
+    ##endof:  if self.literals
+    
+    self._uncombined_regexes = []
+    for regex, compiled in zip(self.regexes, self._compiled_regexes):
+      if compiled.groups > 0:
+        self._uncombined_regexes.append(compiled)
+      else:
+        prefilter_branches.append("(?:" + _scope_leading_flags(regex) + ")")
+      ##endof:  if/else compiled.groups > 0
+    ##endof:  for regex, compiled in zip(...)
+    
+    self._prefilter = None
+    if prefilter_branches:
+      try:
+        self._prefilter = re.compile("|".join(prefilter_branches), re_flags)
+      except re.error:
+        ## (e.g. a  (?x)  regex ending in a comment, which swallows the
+        ## closing parenthesis) Then every regex is searched for on its
+        ## own, and only the literals are left in the prefilter.
+        self._uncombined_regexes = list(self._compiled_regexes)
+        if self.literals:
+          self._prefilter = re.compile(prefilter_branches[0], re_flags)
+        ##endof:  if self.literals
+      ##endof:  try/except re.error
+    ##endof:  if prefilter_branches
+    
+  ##endof:  __init__(self, literals, regexes, ignore_case)
+  
+  
+  def _fold(self, text):
+    '''
+    The case folding used for the literals (none unless ignoring case)
+    '''
+    
+    if self.ignore_case:
+      return text.lower()
+    ##endof:  if self.ignore_case
+    
+    return text
+    
+  ##endof:  _fold(self, text)
+  
+  
+  def matches(self, line):
+    '''
+    Tells whether any of the patterns is in  line  (the cheap check)
+    
+    @param line  The string to be checked
+    @return      True if at least one pattern is found
+    '''
+    
+    if self._prefilter is not None and \
+       self._prefilter.search(line) is not None:
+      return True
+    ##endof:  if self._prefilter is not None and ...
+    
+    return any(compiled.search(line) is not None
+               for compiled in self._uncombined_regexes)
+    
+  ##endof:  matches(self, line)
+  
+  
+  def match_line(self, line):
+    '''
+    Reports which of the patterns are in  line
+    
+    @param line  The string to be checked
+    @return      A tuple of the patterns (as they were given) which were
+                 found, literals first, each in the order given. The tuple
+                 is empty (so, false-y) when nothing matched.
+    '''
+    
+    if not self.matches(line):
+      return ()
+    ##endof:  if not self.matches(line)
+    
+    found_literal_idxs = ()
+    if self.literals:
+      found_literal_idxs = _find_literals(self._literal_automaton,
+                                          self._fold(line))
+    ##endof:  if self.literals
+    
+    matched = [self.literals[idx] for idx in sorted(found_literal_idxs)]
+    
+    for regex, compiled in zip(self.regexes, self._compiled_regexes):
+      if compiled.search(line):
+        matched.append(regex)
+      ##endof:  if compiled.search(line)
+    ##endof:  for regex, compiled in zip(...)
+    
+    return tuple(matched)
+    
+  ##endof:  match_line(self, line)
+  
+##endof:  class MultiPatternMatcher(object)
+
+
+def _scope_leading_flags(regex):
+  '''
+  Turns a leading  (?i)abc  into  (?i:abc) , so it can go in an alternation
+  '''
+  
+  flags_match = LEADING_GLOBAL_FLAGS_RE.match(regex)
+  if flags_match is None:
+    return regex
+  ##endof:  if flags_match is None
+  
+  return "(?" + flags_match.group(1) + ":" + \
+         regex[flags_match.end():] + ")"
+  
+##endof:  _scope_leading_flags(regex)
+
+
+def _build_trie_regex_source(literals):
+  '''
+  Lays the literals out as a trie inside a regex, e.g.  err(?:no|or)|warn
+  
+  This is only used to find out whether any literal is in a line, so the
+  part of the trie below the end of a literal is dropped (if 'err' is
+  there, 'error' adds nothing).
+  '''
+  
+  end_marker = ''
+  trie = {}
+  
+  for literal in literals:
+    node = trie
+    for ch in literal:
+      if end_marker in node:
+        break
+      ##endof:  if end_marker in node
+      node = node.setdefault(ch, {})
+    else:
+      node.clear()
+      node[end_marker] = True
+    ##endof:  for/else ch in literal
+  ##endof:  for literal in literals
+  
+  ## Iterative, so long keywords don't hit the recursion limit
+  return _trie_node_to_regex(trie, end_marker)
+  
+##endof:  _build_trie_regex_source(literals)
+
+
+def _trie_node_to_regex(root, end_marker):
+  '''
+  Writes out the regex source for one trie (see _build_trie_regex_source)
+  '''
+  
+  sources = {}
+  post_order = []
+  to_visit = [root]
+  
+  while to_visit:
+    node = to_visit.pop()
+    post_order.append(node)
+    to_visit.extend(child for ch, child in node.items() if ch != end_marker)
+  ##endof:  while to_visit
+  
+  for node in reversed(post_order):
+    if end_marker in node:
+      sources[id(node)] = ''
+      continue
+    ##endof:  if end_marker in node
+    
+    branches = [re.escape(ch) + sources[id(node[ch])] for ch in sorted(node)]
+    
+    if len(branches) == 1:
+      sources[id(node)] = branches[0]
+    else:
+      sources[id(node)] = "(?:" + "|".join(branches) + ")"
+    ##endof:  if/else len(branches) == 1
+  ##endof:  for node in reversed(post_order)
+  
+  return sources[id(root)]
+  
+##endof:  _trie_node_to_regex(root, end_marker)
+
+
+def _build_literal_automaton(literals):
+  '''
+  Builds the Aho-Corasick automaton for the (already case-folded) literals
+  
+  @return  Either a  pyahocorasick  Automaton or the tuple
+           (goto, fail, out)  of the pure-Python one. The values stored
+           are the indices into  literals .
+  '''
+  
+  if can_do_pyahocorasick:
+    automaton = ahocorasick.Automaton()
+    idxs_of_word = {}
+    for literal_idx, literal in enumerate(literals):
+      idxs_of_word.setdefault(literal, []).append(literal_idx)
+    ##endof:  for literal_idx, literal in enumerate(literals)
+    
+    ## pyahocorasick won't take an empty word; it matches everything
+    always_found = tuple(idxs_of_word.pop('', ()))
+    
+    for word, word_idxs in idxs_of_word.items():
+      automaton.add_word(word, tuple(word_idxs))
+    ##endof:  for word, word_idxs in idxs_of_word.items()
+    
+    if idxs_of_word:
+      automaton.make_automaton()
+    else:
+      automaton = None
+    ##endof:  if/else idxs_of_word
+    
+    return automaton, always_found
+  ##endof:  if can_do_pyahocorasick
+  
+  goto = [{}]
+  fail = [0]
+  out = [()]
+  
+  for literal_idx, literal in enumerate(literals):
+    state = 0
+    for ch in literal:
+      next_state = goto[state].get(ch)
+      if next_state is None:
+        goto.append({})
+        fail.append(0)
+        out.append(())
+        next_state = len(goto) - 1
+        goto[state][ch] = next_state
+      ##endof:  if next_state is None
+      state = next_state
+    ##endof:  for ch in literal
+    out[state] = out[state] + (literal_idx,)
+  ##endof:  for literal_idx, literal in enumerate(literals)
+  
+  ## Breadth-first, so each failure link points at a shallower state
+  queue = deque(goto[0].values())
+  while queue:
+    state = queue.popleft()
+    for ch, next_state in goto[state].items():
+      queue.append(next_state)
+      
+      fallback = fail[state]
+      while fallback and ch not in goto[fallback]:
+        fallback = fail[fallback]
+      ##endof:  while fallback and ch not in goto[fallback]
+      
+      fail[next_state] = goto[fallback].get(ch, 0)
+      out[next_state] = out[next_state] + out[fail[next_state]]
+    ##endof:  for ch, next_state in goto[state].items()
+  ##endof:  while queue
+  
+  return goto, fail, out
+  
+##endof:  _build_literal_automaton(literals)
+
+
+def _find_literals(automaton, text):
+  '''
+  Runs the automaton from _build_literal_automaton over  text
+  
+  @return  The set of indices of the literals found in  text
+  '''
+  
+  if can_do_pyahocorasick:
+    c_automaton, always_found = automaton
+    found = set(always_found)
+    if c_automaton is not None:
+      for end_idx, word_idxs in c_automaton.iter(text):
+        found.update(word_idxs)
+      ##endof:  for end_idx, word_idxs in c_automaton.iter(text)
+    ##endof:  if c_automaton is not None
+    return found
+  ##endof:  if can_do_pyahocorasick
+  
+  goto, fail, out = automaton
+  found = set(out[0])
+  state = 0
+  
+  for ch in text:
+    while state and ch not in goto[state]:
+      state = fail[state]
+    ##endof:  while state and ch not in goto[state]
+    state = goto[state].get(ch, 0)
+    if out[state]:
+      found.update(out[state])
+    ##endof:  if out[state]
+  ##endof:  for ch in text
+  
+  return found
+  
+##endof:  _find_literals(automaton, text)
+
+
+if __name__ == "__main__":
+  '''
+  Gets executed if the file is run as a script
+  '''
+  
+  main(*sys.argv[1:])
+  
+##endof:  if __name__ == "__main__"
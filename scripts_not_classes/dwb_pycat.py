@@ -11,18 +11,66 @@
 ##-------------------
 ## IMPORT STATEMENTS
 ##-------------------
+import io
 import os
 import sys
+import re
+import stat
+import errno
 import shutil
+import contextlib
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Intra-Package
 ## For Python2
 # from __future__ import absolute_import
 import check_is_a_file
+import dwb_walk
 
 DEBUG_PYCAT = False
 LET_THE_PYCAT_OUT = False
 
+## The number of bytes read at a time by  iter_cat_blocks , and by
+## copy_fd  when the kernel can't do the copying
+CAT_BLOCK_SIZE = 1024 * 1024
+
+## The number of lines  lines_to_stdout  joins up into one write
+LINES_BATCH_SIZE = 4096
+
+## What  iter_word_wrap  can do with a word longer than a whole line:
+## break it, or let it overflow the line
+LONG_WORD_POLICIES = ('break', 'overflow')
+
+## Where  iter_word_wrap  may break a line (after one of these)
+WRAP_WHITESPACE_RE = re.compile(r'[ \t]')
+
+## The number of bytes  copy_fd  asks the kernel to copy at a time
+KERNEL_COPY_SIZE = 64 * 1024 * 1024
+
+## What a kernel copy fails with when it just can't be done between
+## those two files (so the next way is tried)
+COPY_FALLBACK_ERRNOS = frozenset(
+    [errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EBADF, errno.ESPIPE,
+     errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTSOCK, errno.EPERM])
+
+## The number of files  cat_output  gets ready (stats, and has the
+## kernel start reading) while it writes out the one before them
+READ_AHEAD_FILES = 8
+
+## The number of bytes read from each file that's got ready, to have
+## its first block on its way in (even where  posix_fadvise  isn't)
+READ_AHEAD_BLOCK_SIZE = 64 * 1024
+
+## When a file being written (see  _atomic_outfile ) is flushed to the
+## disk with  os.fsync : never, once at the end, or also every
+## fsync_every_mb  megabytes along the way
+FSYNC_POLICIES = ('none', 'end', 'every')
+
+## The megabytes between  os.fsync s for the  'every'  policy
+FSYNC_EVERY_MB = 64
+
 length_of_pre_text = 10
 
 def main(*filenames):
@@ -65,7 +113,8 @@ def run(*filenames):
 
 def cat(*filenames,
         create_new_file_with_concatenations = False,
-        new_filename = None):
+        new_filename = None,
+        recursive = False):
   '''
   Mimics the behavior of the `bash` command, `cat`.
   
@@ -74,19 +123,48 @@ def cat(*filenames,
   in this module, there is no extra newline between files -
   the new file gets added wherever the previous file ended.
   
+  The bytes go from the files to stdout as they are, copied by the
+  kernel where it can (see  copy_fd ), so nothing is decoded, and a
+  multi-GB file costs next to no CPU.
+  
   @param filenames A variable-length tuple of strings representing filenames
                    which will be concatenated and outputted to stdout.
+  @param create_new_file_with_concatenations
+                   If True, the concatenation goes to the file  new_filename
+                   instead of stdout. It's written next to it under a
+                   temporary name and renamed into place at the end (see
+                   _atomic_outfile ), so  new_filename  is never half
+                   written, and may even be one of the  filenames .
+  @param new_filename A string representing the filename written to
+  @param recursive If True, each filename that is a directory is replaced
+                   by the (non-binary) files under it, in sorted order
+                   (see  dwb_walk )
   @RESULT The text resulting from the concatenation of the files will be
-          output to stdout.
-  
-  @TODO  incorporate the new creation of a new file
+          output to stdout (or  new_filename ).
   
   '''
   
+  if create_new_file_with_concatenations:
+    _check_new_filename(new_filename)
+  ##endof:  if create_new_file_with_concatenations
+  
+  if recursive:
+    filenames = dwb_walk.walk_files(filenames, skip_binary=True)
+  ##endof:  if recursive
+  
+  if create_new_file_with_concatenations:
+    with _atomic_outfile(new_filename) as ofh:
+      for filename in filenames:
+        with open(filename, 'rb', buffering=0) as ifh:
+          copy_fd(ifh.fileno(), ofh.fileno())
+        ##endof:  with open(filename, 'rb', buffering=0) as ifh
+      ##endof:  for filename in filenames
+    ##endof:  with _atomic_outfile(new_filename) as ofh
+    return
+  ##endof:  if create_new_file_with_concatenations
+  
   for filename in filenames:
-    with open(filename, 'r') as f:
-      shutil.copyfileobj(f, sys.stdout)
-    ##endof:  with open
+    _copy_file_to_stdout(filename)
     
     ##sys.stdout.write("\n")
     
@@ -95,11 +173,40 @@ def cat(*filenames,
 ##endof:  cat_standard(*filenames)
 
 
+def iter_cat_blocks(filenames, block_size=CAT_BLOCK_SIZE, recursive=False):
+  '''
+  The bytes  cat  would write, a block at a time, for a caller that
+  sends them on somewhere itself
+  
+  @param filenames   An iterable of strings representing filenames
+  @param block_size  The (maximum) number of bytes per block
+  @param recursive   The same as for  cat
+  @return            A generator of non-empty  bytes  objects, the files'
+                     contents as they are, one after the other
+  '''
+  
+  if recursive:
+    filenames = dwb_walk.walk_files(filenames, skip_binary=True)
+  ##endof:  if recursive
+  
+  for filename in filenames:
+    with open(filename, 'rb') as f:
+      for block in iter(lambda: f.read(block_size), b''):
+        yield block
+      ##endof:  for block in iter(...)
+    ##endof:  with open
+  ##endof:  for filename in filenames
+  
+##endof:  iter_cat_blocks(filenames, block_size, recursive)
+
+
 def cat_output(*filenames, 
                line_length_max = None, 
                prefix = None,
                create_new_file_with_concatenations = False,
-               new_filename = None):
+               new_filename = None,
+               recursive = False,
+               read_ahead = READ_AHEAD_FILES):
   '''
   Output the contents of a file (or files) to stdout with formatting options
   
@@ -152,6 +259,8 @@ def cat_output(*filenames,
   
   @todo The situation in which a word is longer than the `line_length_max`
         is not handled. I'll need to decide how to handle it and implement it
+        - done: it's broken at `line_length_max` (see  iter_word_wrap ,
+        which can also let it overflow)
   
   The prefix will be handled as follows. If the prefix string is (==) "HYP" 
   and
@@ -161,63 +270,406 @@ def cat_output(*filenames,
   
   @param filenames A tuple of strings representing filenames whose associated
                    files will be concatenated.
+  @param create_new_file_with_concatenations
+                   If True, what would go to stdout goes to the file
+                   new_filename  instead, which is only put in place
+                   (atomically, see  _atomic_outfile ) once it's all
+                   written. If a file can't be shown (the failure
+                   strings below), new_filename  is left as it was.
+                   Only the files' contents are written to it; the
+                   warnings go where they otherwise would.
+  @param new_filename A string representing the filename written to
+  @param recursive If True, each filename that is a directory is replaced
+                   by the (non-binary) files under it, in sorted order
+                   (see  dwb_walk ). Otherwise, a directory stops the
+                   output, as before.
+  @param read_ahead The number of files after the one being written out
+                   that are got ready at the same time, by a few
+                   threads (see  _iter_read_ahead ), so that with many
+                   small files (e.g. on a network filesystem) the waiting
+                   on each is overlapped. 0 does one file at a time.
+                   Either way, the files come out in order.
   @RESULT The word-wrapped version of the filename # WORD WRAP ABANDONED
                                                    # FOR A BIT
+  '''
+  
+  if create_new_file_with_concatenations:
+    _check_new_filename(new_filename)
+    
+    try:
+      with _atomic_outfile(new_filename) as ofh, \
+           open(ofh.fileno(), 'w', closefd=False) as text_ofh:
+        cat_result = _cat_output_to(text_ofh, filenames, line_length_max,
+                                    prefix, recursive, read_ahead)
+        if cat_result is not None:
+          raise _ConcatenationFailed(cat_result)
+        ##endof:  if cat_result is not None
+      ##endof:  with _atomic_outfile(new_filename) as ofh, ...
+    except _ConcatenationFailed as e_failed:
+      ## (and  new_filename  is left as it was)
+      return e_failed.args[0]
+    ##endof:  try/except _ConcatenationFailed
+    
+    return None
+  ##endof:  if create_new_file_with_concatenations
+  
+  return _cat_output_to(sys.stdout, filenames, line_length_max, prefix,
+                        recursive, read_ahead)
   
-  @TODO  incorporate the new creation of a new file
+##endof:  cat_output(filename)
+
+
+def _cat_output_to(text_out, filenames, line_length_max, prefix,
+                   recursive, read_ahead):
   '''
+  What  cat_output  does, with the files' contents written to  text_out
+  (a text file object, e.g.  sys.stdout ) instead of always to stdout;
+  the warnings go where they always do
   
-  for filename in filenames:
-    if not check_is_a_file.run(filename):
+  @return  None, or one of  cat_output 's failure strings
+  '''
+  
+  if recursive:
+    filenames = dwb_walk.walk_files(filenames, skip_binary=True)
+  ##endof:  if recursive
+  
+  for filename, file_stat in _iter_read_ahead(filenames, read_ahead):
+    ## Only a file that couldn't be stat'ed, or is empty, needs another
+    ## look (and its warning) from  check_is_a_file
+    is_a_file = (file_stat is not None and file_stat.st_size > 0) or \
+                check_is_a_file.run(filename)
+    
+    if file_stat is not None:
+      is_a_directory = stat.S_ISDIR(file_stat.st_mode)
+    else:
+      is_a_directory = os.path.isdir(filename)
+    ##endof:  if/else file_stat is not None
+    
+    if not is_a_file:
       sys.stderr.write("\n" + str(filename))
       sys.stderr.write("\ndoes not represent a file, therefore its")
       sys.stderr.write("\ntext content will not be shown.")
       sys.stderr.write("\nHowever, the program should be able to")
       sys.stderr.write("\ncontinue without problem.\n")
       return "__DWB_PYCAT_FAILURE_NOT_A_FILE_DWB__"
-    ##endof:  if not check_is_a_file.run(filename)
+    ##endof:  if not is_a_file
     
-    if os.path.isdir(filename):
+    if is_a_directory:
       sys.stderr.write("\n" + str(filename))
       sys.stderr.write("\nrepresents a directory, therefore its")
       sys.stderr.write("\ntext content will not be shown.")
       sys.stderr.write("\nHowever, the program should be able to")
       sys.stderr.write("\ncontinue without problem.\n")
       return "__DWB_PYCAT_FAILURE_IS_A_DIRECTORY_DWB__"
-    ##endof:  if os.path.isdir(filename)
+    ##endof:  if is_a_directory
     
     if line_length_max == None and prefix == None:
-      with open(filename, 'r') as f:
-        shutil.copyfileobj(f, sys.stdout)
-      ##endof:  with open
-      sys.stdout.write("\n")
+      _copy_file_to_stdout(filename, text_out)
+      text_out.write("\n")
     elif line_length_max == None and (not prefix == None):
-      output_file_with_prefix(filename, prefix)
+      output_file_with_prefix(filename, prefix, text_out)
     elif not line_length_max == None:
       lines = output_file_with_word_wrap(filename, line_length_max, prefix)
-      lines_to_stdout(lines, prefix)
+      lines_to_stdout(lines, prefix, text_out)
     else:
       sys.stderr.write("Shouldn't get here in dwb_pycat.py")
     ##endof:  if/else
-  ##endof:  for filename in filenames
+  ##endof:  for filename, file_stat in _iter_read_ahead(...)
+  
+  return None
+  
+##endof:  _cat_output_to(text_out, filenames, line_length_max, ...)
 
-##endof:  cat_output(filename)
 
+def _iter_read_ahead(filenames, read_ahead=READ_AHEAD_FILES):
+  '''
+  Gets the next  read_ahead  files ready in a thread pool (see
+  _read_ahead_file ) while the caller works on the one before them
+  
+  @param filenames   An iterable of filenames
+  @param read_ahead  The number of files kept in the works; 0 (or less)
+                     means none are, and every stat is None
+  @return            A generator of (filename, its  os.stat_result , or
+                     None if it couldn't be stat'ed) , in the order of
+                     filenames
+  '''
+  
+  the_filenames = iter(filenames)
+  
+  if read_ahead <= 0:
+    for filename in the_filenames:
+      yield filename, None
+    ##endof:  for filename in the_filenames
+    return
+  ##endof:  if read_ahead <= 0
+  
+  ## Most of the time is waiting on the filesystem, so the threads
+  ## needn't be limited to the cores
+  executor = ThreadPoolExecutor(max_workers=min(read_ahead, 32))
+  
+  try:
+    in_the_works = deque()
+    for filename in islice(the_filenames, read_ahead):
+      in_the_works.append(
+          (filename, executor.submit(_read_ahead_file, filename)))
+    ##endof:  for filename in islice(the_filenames, read_ahead)
+    
+    while in_the_works:
+      filename, future = in_the_works.popleft()
+      
+      for next_filename in islice(the_filenames, 1):
+        in_the_works.append(
+            (next_filename, executor.submit(_read_ahead_file, next_filename)))
+      ##endof:  for next_filename in islice(the_filenames, 1)
+      
+      yield filename, future.result()
+    ##endof:  while in_the_works
+  finally:
+    ## Also reached when the caller stops early (e.g. at a directory)
+    executor.shutdown(wait=True, cancel_futures=True)
+  ##endof:  try/finally
+  
+##endof:  _iter_read_ahead(filenames, read_ahead)
+
+
+def _read_ahead_file(filename):
+  '''
+  Stats a file and, if it's a regular one, tells the kernel it's about
+  to be read ( posix_fadvise  with  POSIX_FADV_WILLNEED ) and reads its
+  first block, so it's (at least partly) in the page cache by the time
+  it's copied
+  
+  Nothing is kept from the read; a pipe or a device is only stat'ed,
+  since reading from it would take its bytes away.
+  
+  @param filename  A string representing the filename
+  @return          Its  os.stat_result , or None if it couldn't be
+                   stat'ed
+  '''
+  
+  try:
+    file_stat = os.stat(filename)
+  except (OSError, ValueError):
+    return None
+  ##endof:  try/except
+  
+  if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size == 0:
+    return file_stat
+  ##endof:  if not stat.S_ISREG(file_stat.st_mode) or ...
+  
+  try:
+    fd = os.open(filename, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+    try:
+      if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+      ##endof:  if hasattr(os, 'posix_fadvise')
+      os.read(fd, READ_AHEAD_BLOCK_SIZE)
+    finally:
+      os.close(fd)
+    ##endof:  try/finally
+  except OSError:
+    ## It'll be opened for real later, and any trouble reported then
+    pass
+  ##endof:  try/except OSError
+  
+  return file_stat
+  
+##endof:  _read_ahead_file(filename)
 
-def output_file_with_prefix(filename, prefix):
+
+def copy_fd(in_fd, out_fd, block_size=CAT_BLOCK_SIZE, max_bytes=None):
+  '''
+  Copies everything (or up to  max_bytes ) from  in_fd  (from where it
+  is) to  out_fd , having the kernel move the bytes where it can, so they
+  never come up into Python
+  
+  The ways are tried in turn, each where it can work, and each going on
+  from wherever the one before stopped:
+  
+    os.copy_file_range  file to file (which can even share the blocks,
+                        or copy on the server, for a network filesystem)
+    os.sendfile         file to anything (a pipe, a terminal, a socket)
+    os.splice           from (or to) a pipe
+    os.readv            through one reused buffer, when nothing else can
+  
+  A file that says it's empty (e.g. in  /proc ) is read, to be sure.
+  
+  @param in_fd       The file descriptor read from
+  @param out_fd      The file descriptor written to
+  @param block_size  The size of the buffer, if one is needed
+  @param max_bytes   If not None, the most bytes that are copied; fewer
+                     being copied means the end of  in_fd  was reached
+  @return            The number of bytes copied
+  '''
+  
+  in_stat = os.fstat(in_fd)
+  in_mode = in_stat.st_mode
+  out_mode = os.fstat(out_fd).st_mode
+  
+  n_copied = 0
+  
+  if stat.S_ISREG(in_mode) and in_stat.st_size > 0:
+    if stat.S_ISREG(out_mode) and hasattr(os, 'copy_file_range'):
+      n_kernel_copied, is_done = _kernel_copy(
+          lambda count: os.copy_file_range(in_fd, out_fd, count),
+          _bytes_left(max_bytes, n_copied))
+      n_copied += n_kernel_copied
+      if is_done:
+        return n_copied
+      ##endof:  if is_done
+    ##endof:  if stat.S_ISREG(out_mode) and hasattr(...)
+    
+    if hasattr(os, 'sendfile'):
+      n_kernel_copied, is_done = _kernel_copy(
+          lambda count: os.sendfile(out_fd, in_fd, None, count),
+          _bytes_left(max_bytes, n_copied))
+      n_copied += n_kernel_copied
+      if is_done:
+        return n_copied
+      ##endof:  if is_done
+    ##endof:  if hasattr(os, 'sendfile')
+  ##endof:  if stat.S_ISREG(in_mode) and in_stat.st_size > 0
+  
+  if hasattr(os, 'splice') and \
+     (stat.S_ISFIFO(in_mode) or stat.S_ISFIFO(out_mode)):
+    n_kernel_copied, is_done = _kernel_copy(
+        lambda count: os.splice(in_fd, out_fd, count),
+        _bytes_left(max_bytes, n_copied))
+    n_copied += n_kernel_copied
+    if is_done:
+      return n_copied
+    ##endof:  if is_done
+  ##endof:  if hasattr(os, 'splice') and ...
+  
+  the_buffer = bytearray(block_size)
+  buffer_view = memoryview(the_buffer)
+  
+  while max_bytes is None or n_copied < max_bytes:
+    n_to_read = block_size
+    if max_bytes is not None:
+      n_to_read = min(block_size, max_bytes - n_copied)
+    ##endof:  if max_bytes is not None
+    
+    n_read = os.readv(in_fd, [buffer_view[:n_to_read]])
+    if not n_read:
+      break
+    ##endof:  if not n_read
+    
+    n_written = 0
+    while n_written < n_read:
+      n_written += os.write(out_fd, buffer_view[n_written:n_read])
+    ##endof:  while n_written < n_read
+    n_copied += n_read
+  ##endof:  while max_bytes is None or n_copied < max_bytes
+  
+  return n_copied
+  
+##endof:  copy_fd(in_fd, out_fd, block_size, max_bytes)
+
+
+def _bytes_left(max_bytes, n_copied):
+  '''
+  What's left of  max_bytes  (None, for no limit) after  n_copied
+  '''
+  
+  return None if max_bytes is None else max_bytes - n_copied
+  
+##endof:  _bytes_left(max_bytes, n_copied)
+
+
+def _kernel_copy(copy_some, max_bytes=None):
+  '''
+  Calls one of the kernel's copying functions until it reports the end
+  of the input (or  max_bytes  have been copied)
+  
+  @param copy_some  Copies up to the count of bytes it's called with,
+                    returning how many it did
+  @param max_bytes  If not None, the most bytes that are copied
+  @return           (the number of bytes copied, whether that's all of
+                    them) ; it isn't, if the kernel wouldn't do this kind
+                    of copy (see  COPY_FALLBACK_ERRNOS )
+  '''
+  
+  n_copied = 0
+  
+  try:
+    while max_bytes is None or n_copied < max_bytes:
+      count = KERNEL_COPY_SIZE
+      if max_bytes is not None:
+        count = min(KERNEL_COPY_SIZE, max_bytes - n_copied)
+      ##endof:  if max_bytes is not None
+      
+      n_sent = copy_some(count)
+      if n_sent == 0:
+        return n_copied, True
+      ##endof:  if n_sent == 0
+      n_copied += n_sent
+    ##endof:  while max_bytes is None or n_copied < max_bytes
+    
+    return n_copied, True
+  except OSError as e_copy:
+    if e_copy.errno not in COPY_FALLBACK_ERRNOS:
+      raise
+    ##endof:  if e_copy.errno not in COPY_FALLBACK_ERRNOS
+  ##endof:  try/except OSError
+  
+  return n_copied, False
+  
+##endof:  _kernel_copy(copy_some, max_bytes)
+
+
+def _copy_file_to_stdout(filename, text_out=None):
+  '''
+  Copies a file's bytes to stdout (or  text_out , a text file object), as
+  they are (see  copy_fd ); or, if that isn't a real file (e.g. an
+  io.StringIO ), its text
+  '''
+  
+  if text_out is None:
+    text_out = sys.stdout
+  ##endof:  if text_out is None
+  
+  try:
+    ## What's been written to  text_out  so far goes out first
+    text_out.flush()
+    out_fd = text_out.fileno()
+  except (AttributeError, ValueError, io.UnsupportedOperation):
+    out_fd = None
+  ##endof:  try/except
+  
+  if out_fd is None:
+    with open(filename, 'r') as f:
+      shutil.copyfileobj(f, text_out)
+    ##endof:  with open
+    return
+  ##endof:  if out_fd is None
+  
+  with open(filename, 'rb', buffering=0) as f:
+    copy_fd(f.fileno(), out_fd)
+  ##endof:  with open
+  
+##endof:  _copy_file_to_stdout(filename, text_out)
+
+
+def output_file_with_prefix(filename, prefix, text_out=None):
   '''
   Has standard, `bash` `cat` behavior, but with one prefix and an ending '\n'
   
   @param filename The filename whose contents will be output
   @param prefix A string representing a prefix.
+  @param text_out A text file object to write to (None for  sys.stdout )
   @RESULT the contents of the file with the prefix before and an extra
           newline after.
   '''
   
-  sys.stdout.write(prefix + ":  ")
+  if text_out is None:
+    text_out = sys.stdout
+  ##endof:  if text_out is None
+  
+  text_out.write(prefix + ":  ")
   
   with open(filename, 'r') as f:
-    shutil.copyfileobj(f, sys.stdout)
+    shutil.copyfileobj(f, text_out)
   ##endof:  with
   
   # if LET_THE_PYCAT_OUT:
@@ -227,72 +679,108 @@ def output_file_with_prefix(filename, prefix):
 ##endof:  output_file_with_prefix()
 
 
-def output_file_with_word_wrap(filename, line_max, prefix = None):
+def output_file_with_word_wrap(filename, line_max, prefix = None,
+                               long_word_policy = 'break'):
   '''
   Takes a file and outputs it with specified word wrap and optional prefix
   
-  The word-wrapped lines are put one at a time int an array of strings. There
-  is also an optional prefix  
+  The word-wrapped lines are handed back one at a time, as the file is
+  read a line at a time (see  iter_word_wrap ), so a file of any size
+  takes about as much memory as its longest line. There is also an
+  optional prefix (for  lines_to_stdout ).
   
-  This has been abandoned for a bit.
+  @return  A generator of the wrapped lines, without line terminators
   '''
   
-  lines = None
-  
   with open(filename, 'r') as f:
-    total_str = f.read()
-    lines = output_str_with_word_wrap(total_str, line_max, prefix)
+    yield from iter_word_wrap(f, line_max, long_word_policy)
   ##endof:  with open(filename, 'r') as f
   
-  return lines
-  
 ##endof:  output_file_with_word_wrap()
 
 
-def lines_to_stdout(lines, prefix = None):
+def lines_to_stdout(lines, prefix = None, text_out = None):
   '''
-  Send an array of text lines to stdout
+  Send text lines to stdout
+  
+  With a prefix, the first line comes after the prefix padded out with
+  '_'s, and every other line after  '>> '  and a shorter padded prefix,
+  so all the lines start in the same column:
+  
+    HYP______:  first line
+    >> HYP___:  second line
+  
+  The two prefixes are made once. The lines are joined up
+  LINES_BATCH_SIZE  at a time, and each batch goes to stdout's binary
+  buffered writer in one write, so millions of lines cost a few
+  thousand writes.
+  
+  @param lines     An iterable (e.g. a generator) of strings, without line
+                   terminators; each is written with a  "\n"  after it
+  @param prefix    A string, or None for no prefix
+  @param text_out  A text file object to write to (None for  sys.stdout )
   '''
   
-  line_counter = 0
-  for line in lines:
-    line_counter += 1
-    if not prefix == None:
-      if line_counter == 1:
-        # make a uniformly-long prefix before file contents come
-        prefix_to_use = prefix
-        length_colon = 1
-        while (len(prefix_to_use) < length_of_pre_text - length_colon):
-          prefix_to_use += "_"
-        ##endof:  while
-        sys.stdout.write(prefix_to_use + ":  " + line + "\n")
-      else:
-        # make a uniformly-long prefix before file contents come
-        prefix_to_use = prefix
-        length_colon = 1
-        length_gt_intro = 3 # ">> "
-        while (len(prefix_to_use) < length_of_pre_text - 
-                                     length_colon - length_gt_intro): 
-          sys.stdout.write(">> " + prefix_to_use + ":  " + line + "\n")
-      ##endof:  if/else line_counter == 1
-    ##endof:  if not prefix == None
+  first_prefix = ""
+  other_prefix = ""
+  
+  if not prefix == None:
+    # make a uniformly-long prefix before file contents come
+    length_colon = 1
+    length_gt_intro = 3 # ">> "
+    first_prefix = prefix.ljust(length_of_pre_text - length_colon, "_") + \
+                   ":  "
+    other_prefix = ">> " + \
+                   prefix.ljust(length_of_pre_text - length_colon - \
+                                length_gt_intro, "_") + \
+                   ":  "
+  ##endof:  if not prefix == None
+  
+  if text_out is None:
+    text_out = sys.stdout
+  ##endof:  if text_out is None
+  
+  ## Anything already in  text_out  goes out before the batches do
+  text_out.flush()
+  out = getattr(text_out, 'buffer', None)
+  encoding = getattr(text_out, 'encoding', None) or 'utf-8'
+  errors = getattr(text_out, 'errors', None) or 'strict'
+  
+  the_lines = iter(lines)
+  line_prefix = first_prefix
+  
+  while True:
+    batch = list(islice(the_lines, LINES_BATCH_SIZE))
+    if not batch:
+      break
+    ##endof:  if not batch
+    
+    chunk = line_prefix + ("\n" + other_prefix).join(batch) + "\n"
+    line_prefix = other_prefix
+    
+    if out is None:
+      text_out.write(chunk)  # (e.g. an  io.StringIO )
     else:
-      sys.stdout.write(line)
-    ##endof:  if/else not prefix == None
-  ##endof:  for line in lines
+      out.write(chunk.encode(encoding, errors))
+    ##endof:  if/else out is None
+  ##endof:  while True
+  
+  if out is not None:
+    out.flush()
+  ##endof:  if out is not None
   
 ##endof:  lines_to_stdout
 
 
-def output_str_with_word_wrap(total_string, line_max, prefix = None):
+def output_str_with_word_wrap(total_string, line_max, prefix = None,
+                               long_word_policy = 'break'):
   '''
   Output the string with word wrapping.
   
-  Set aside for a while. Too many problems that I didn't have time to solve
-  '''
+  The string is wrapped a line at a time (see  iter_word_wrap ).
   
-  ##it had better be on one line ## Never mind, I think I fixed that
-  #current_working_str = ' '.join(total_string.split())
+  @return  A generator of the wrapped lines, without line terminators
+  '''
   
   if DEBUG_PYCAT:
     sys.stdout.write("\n")
@@ -301,106 +789,260 @@ def output_str_with_word_wrap(total_string, line_max, prefix = None):
     sys.stdout.write("\n")
   ##endof:  if DEBUG_PYCAT
   
-  lines = []
-  current_index = 0
-  current_working_str = total_string
+  return iter_word_wrap(io.StringIO(total_string), line_max,
+                        long_word_policy)
   
-  while ( len(current_working_str) > line_max ):
-    current_index *= 0
-    
-    str_with_line_max_chars = current_working_str[:line_max]
-    
-    if DEBUG_PYCAT:
-      sys.stdout.write("\n")
-      sys.stdout.write("before trimming:\n" + \
-                       str_with_line_max_chars)
-      sys.stdout.write("\n")
-    ##endof:  if DEBUG_PYCAT
-    
-    #chars_not_used = []
-    
-    added_line = str_with_line_max_chars
-    
-    if '\n' in added_line:
-      added_line = added_line.split('\n')[0] + "\n"
-    else:
-      while not added_line[-1].isspace():
-        #chars_not_used.append(added_line[-1])
-        added_line = added_line[:-1]
-      ##endof:  while not
-    ##endof:  if/else
-    
-    lines.append(added_line)
-    
-    #current_index = line_max - len(chars_not_used)
-    current_index = len(added_line)
-    current_working_str = current_working_str[current_index:]
+##endof:  output_with_word_wrap(total_string, line_max)
+
+
+def iter_word_wrap(lines, line_max, long_word_policy='break'):
+  '''
+  Word-wraps text a line at a time, handing back each wrapped line as
+  soon as it is found
+  
+  A line is broken after the last space (or tab) that leaves it no more
+  than  line_max  characters long, the space staying at the end of the
+  line (see  cat_output  for an example). The work on each line is only
+  index arithmetic,  str.rfind  over at most  line_max  characters per
+  wrapped line; what's left of the line is never copied, so the time is
+  linear in the length of the text.
+  
+  @param lines             An iterable of strings (e.g. an open text
+                           file); the line terminator at the end of each,
+                           if any, is dropped
+  @param line_max          The longest a wrapped line may be
+  @param long_word_policy  What happens to a word longer than  line_max
+                           ( LONG_WORD_POLICIES ):  'break'  breaks it
+                           after  line_max  characters, and  'overflow'
+                           gives it a line of its own, as long as it is
+  @return                  A generator of strings, without line
+                           terminators (an empty line stays an empty line)
+  '''
+  
+  if long_word_policy not in LONG_WORD_POLICIES:
+    raise ValueError("long_word_policy should be one of " + \
+                     str(LONG_WORD_POLICIES) + ", not " + \
+                     repr(long_word_policy))
+  ##endof:  if long_word_policy not in LONG_WORD_POLICIES
+  
+  if line_max < 1:
+    raise ValueError("line_max should be at least 1, not " + str(line_max))
+  ##endof:  if line_max < 1
+  
+  for line in lines:
+    line = line.rstrip('\r\n')
+    line_end = len(line)
+    start = 0
     
-    if DEBUG_PYCAT:
-      sys.stdout.write("\n")
-      sys.stdout.write("after trimming...\n" + \
-                       "lines: \n" + str(lines) + "\n" + \
-                       "remaining string:\n" + \
-                       current_working_str)
-      sys.stdout.write("\n")
-      
-      #input("Press [Enter] to continue.")
-    ##endof:  if DEBUG_PYCAT
+    while line_end - start > line_max:
+      window_end = start + line_max
+      break_idx = max(line.rfind(' ', start, window_end),
+                      line.rfind('\t', start, window_end)) + 1
       
-  ##endof:  while len(current_working_str) > line_max
-  
-  while '\n' in current_working_str[:-1]:
-    added_line = current_working_str.split('\n')[0] + "\n"
-    lines.append(added_line)
-    current_working_str = current_working_str[len(added_line):]
-    if DEBUG_PYCAT:
-      sys.stdout.write("\n")
-      sys.stdout.write("after trimming...\n" + \
-                       "lines: \n" + str(lines) + "\n" + \
-                       "remaining string:\n" + \
-                       current_working_str)
-      sys.stdout.write("\n")
+      if break_idx > start:
+        pass  # after the last space that fits
+      elif line[window_end] in ' \t':
+        break_idx = window_end + 1  # the word just fits; its space hangs
+      elif long_word_policy == 'break':
+        break_idx = window_end
+      else:
+        next_space = WRAP_WHITESPACE_RE.search(line, window_end)
+        break_idx = line_end if next_space is None else next_space.end()
+      ##endof:  if/elif/else ...
       
-      #input("Press [Enter] to continue.")
-    ##endof:  if DEBUG_PYCAT
-  ##endof:  while '\n' in current_working_str[:-1]
-  
-  if not current_working_str == '':  
-    lines.append(current_working_str + "\n")
-  
-  return lines
+      yield line[start:break_idx]
+      start = break_idx
+    ##endof:  while line_end - start > line_max
+    
+    if start < line_end or start == 0:
+      yield line[start:]
+    ##endof:  if start < line_end or start == 0
+  ##endof:  for line in lines
   
-##endof:  output_with_word_wrap(total_string, line_max)
+##endof:  iter_word_wrap(lines, line_max, long_word_policy)
 
 
-def cat_and_outfile(out_filename, *in_filenames):
+def cat_and_outfile(out_filename, *in_filenames,
+                    fsync_policy = 'end',
+                    fsync_every_mb = FSYNC_EVERY_MB):
   '''
   Takes all of the infilenames in order and joins them together.
   The output is written to outfilename
   Adds an extra newline between files and at the end.
+  
+  The bytes are copied as they are, file to file, by the kernel where it
+  can (see  copy_fd ). They go to a temporary file next to  out_filename ,
+  which is renamed to it at the end (see  _atomic_outfile ), so a crash
+  leaves either the old  out_filename  or the whole new one.
+  
+  @param out_filename    A string representing the filename written to
+  @param in_filenames    Strings representing the filenames joined
+  @param fsync_policy    One of  FSYNC_POLICIES :  'none'  leaves the
+                         flushing to the system,  'end'  has the file on
+                         the disk before it's renamed, and  'every'  also
+                         flushes every  fsync_every_mb  megabytes, so
+                         there's never much waiting to be written
+  @param fsync_every_mb  The megabytes between flushes, for  'every'
   '''
   
-  with open(out_filename, 'w') as ofh:
+  fsync_every = None
+  if fsync_policy == 'every':
+    fsync_every = int(fsync_every_mb * 1024 * 1024)
+    if fsync_every < 1:
+      raise ValueError("fsync_every_mb should be more than 0, not " + \
+                       str(fsync_every_mb))
+    ##endof:  if fsync_every < 1
+  ##endof:  if fsync_policy == 'every'
+  
+  with _atomic_outfile(out_filename, fsync_policy) as ofh:
+    out_fd = ofh.fileno()
+    n_unsynced = 0
+    
     for filename in in_filenames:
-      with open(filename) as ifh:
-        for line in ifh:
-          ofh.write(line)
-        ##endof:  for line in ifh
-      ##endof with open(filename) as ifh
+      with open(filename, 'rb', buffering=0) as ifh:
+        if fsync_every is None:
+          copy_fd(ifh.fileno(), out_fd)
+        else:
+          while True:
+            n_to_copy = fsync_every - n_unsynced
+            n_copied = copy_fd(ifh.fileno(), out_fd, max_bytes=n_to_copy)
+            n_unsynced += n_copied
+            
+            if n_unsynced >= fsync_every:
+              os.fsync(out_fd)
+              n_unsynced = 0
+            ##endof:  if n_unsynced >= fsync_every
+            
+            if n_copied < n_to_copy:
+              break
+            ##endof:  if n_copied < n_to_copy
+          ##endof:  while True
+        ##endof:  if/else fsync_every is None
+      ##endof:  with open(filename, 'rb', buffering=0) as ifh
       
-      ofh.write("\n")
+      ofh.write(b"\n")
+      n_unsynced += 1
       
     ##endof:  for filename in in_filenames
-  ##endof:  with open(out_filename, 'w') as ofh
-
+  ##endof:  with _atomic_outfile(out_filename, fsync_policy) as ofh
+  
 ##endof:  cat_concatenate_and_outfile(out_filename, *in_filenames)
 
 
+def _check_new_filename(new_filename):
+  '''
+  Makes sure there's a  new_filename  to create, before anything is
+  read or written
+  '''
+  
+  if new_filename is None:
+    raise ValueError("new_filename is needed when " + \
+                     "create_new_file_with_concatenations is True")
+  ##endof:  if new_filename is None
+  
+##endof:  _check_new_filename(new_filename)
+
+
+class _ConcatenationFailed(Exception):
+  '''
+  Raised in  _atomic_outfile 's  with  block when  cat_output  stops at
+  a file it can't show, so  new_filename  is left be; its  args[0]  is
+  the failure string  cat_output  returned
+  '''
+  
+##endof:  class _ConcatenationFailed(Exception)
+
+
+@contextlib.contextmanager
+def _atomic_outfile(out_filename, fsync_policy='end'):
+  '''
+  Opens a temporary file in the same directory as  out_filename  for
+  writing, and renames it to  out_filename  (with  os.replace ) once the
+  with  block is done, so a reader never sees half of it
+  
+  The new file gets the permissions  out_filename  had, if it was there,
+  and otherwise the ones  open  would have given it. If the  with  block
+  raises, the temporary file is removed and  out_filename  is left be.
+  
+  @param out_filename  A string representing the filename
+  @param fsync_policy  One of  FSYNC_POLICIES ; with any but  'none' , the
+                       file (and then its directory, for the rename) is
+                       flushed to the disk at the end
+  @return              (through  with ) the temporary file, opened
+                       'wb'  with no buffering
+  '''
+  
+  if fsync_policy not in FSYNC_POLICIES:
+    raise ValueError("fsync_policy should be one of " + \
+                     str(FSYNC_POLICIES) + ", not " + \
+                     repr(fsync_policy))
+  ##endof:  if fsync_policy not in FSYNC_POLICIES
+  
+  out_dir = os.path.dirname(os.path.abspath(out_filename))
+  temp_filename = os.path.join(out_dir,
+                               "." + os.path.basename(out_filename) + \
+                               "." + os.urandom(6).hex() + ".tmp")
+  
+  ## Made with  O_EXCL  and 0o666, so it's new, and the umask applies
+  temp_fd = os.open(temp_filename,
+                    os.O_WRONLY | os.O_CREAT | os.O_EXCL | \
+                    getattr(os, 'O_CLOEXEC', 0),
+                    0o666)
+  
+  try:
+    with open(temp_fd, 'wb', buffering=0) as ofh:
+      yield ofh
+      
+      if not fsync_policy == 'none':
+        os.fsync(ofh.fileno())
+      ##endof:  if not fsync_policy == 'none'
+    ##endof:  with open(temp_fd, 'wb', buffering=0) as ofh
+    
+    if os.path.exists(out_filename):
+      shutil.copymode(out_filename, temp_filename)
+    ##endof:  if os.path.exists(out_filename)
+    
+    os.replace(temp_filename, out_filename)
+  except BaseException:
+    os.unlink(temp_filename)
+    raise
+  ##endof:  try/except BaseException
+  
+  if not fsync_policy == 'none':
+    _fsync_directory(out_dir)
+  ##endof:  if not fsync_policy == 'none'
+  
+##endof:  _atomic_outfile(out_filename, fsync_policy)
+
+
+def _fsync_directory(dirname):
+  '''
+  Flushes a directory (e.g. a rename in it) to the disk, where the
+  system lets a directory be opened and flushed
+  '''
+  
+  try:
+    dir_fd = os.open(dirname, os.O_RDONLY)
+  except OSError:
+    return
+  ##endof:  try/except OSError
+  
+  try:
+    os.fsync(dir_fd)
+  except OSError:
+    pass
+  finally:
+    os.close(dir_fd)
+  ##endof:  try/except/finally
+  
+##endof:  _fsync_directory(dirname)
+
+
 if __name__ == "__main__":
   '''
   Gets executed if the file is run as a script
   '''
   
   main(sys.argv[1:])
-
+  
 ##endof:  if __name__ == "__main__"
@@ -20,6 +20,9 @@ import re
 # Intra-Package
 ## For Python2
 # from __future__ import absolute_import
+import dwb_multi_pattern
+import dwb_trigram_index
+import dwb_walk
 
 def main(string_to_find, filename):
   '''
@@ -57,18 +60,22 @@ def run(string_to_find, filename):
 ##endof:  main(filename)
 
 
-def grep(string_to_find, filename):
+def grep(string_to_find, filename, recursive=False):
   '''
   Mimics part of the behavior of the `bash` command, `grep`.
   
-  This only allows one to search for one string in one file. It might
-  be nice at a later time to extend this to search using the re module
-  (regex)
+  This only allows one to search for one string in one file (or, with
+  recursive , in the files under one directory). It might be nice at a
+  later time to extend this to search using the re module (regex)
   
   @param string_to_find  A string for which the file will be searched,
                          the searching being done line-by-line
   @param filename        A string representing the filename whose contents
                          will be searched
+  @param recursive       If True and  filename  is a directory, every
+                         (non-binary) file under it is searched, in sorted
+                         order (see  dwb_walk ), and each line is given
+                         after its filename and a  ':' , like `grep -r`
   @return                A string representing the line (or sequence of
                          lines) in the file which contain `string_to_find`
   '''
@@ -81,21 +88,113 @@ def grep(string_to_find, filename):
   
   the_result_str = ''
   
-  with open(filename, 'r') as f:
-    lines = f.readlines()
-    for line in lines:
-      #if string_to_find in line:
-      if re.match(string_to_find, line):
-        the_result_str += line + "\n"
-      ##endof:  if string_to_find in line
-    ##endof:  for line in lines
-  ##endof:  with open
+  for line in grep_lines(string_to_find, filename, recursive):
+    the_result_str += line + "\n"
+  ##endof:  for line in grep_lines(string_to_find, filename, recursive)
   
   return the_result_str
   
 ##endof:  grep(string_to_find, filename)
 
 
+def grep_lines(string_to_find, filename, recursive=False):
+  '''
+  The lines  grep  finds, one at a time, as they are found (neither the
+  file nor the result is held in memory whole)
+  
+  @param string_to_find  The same as for  grep
+  @param filename        The same as for  grep
+  @param recursive       The same as for  grep
+  @return                A generator of strings: each matching line,
+                         with its line terminator (and, with
+                         recursive , after its filename and a  ':' )
+  '''
+  
+  ## Compiled once, rather than looked up in  re 's cache for every line
+  pattern = re.compile(string_to_find)
+  
+  if recursive and os.path.isdir(filename):
+    filenames = dwb_walk.walk_files([filename], skip_binary=True)
+  else:
+    filenames = [filename]
+    recursive = False  # no filenames before the lines of one file
+  ##endof:  if/else recursive and os.path.isdir(filename)
+  
+  for each_filename in filenames:
+    line_prefix = each_filename + ":" if recursive else ""
+    
+    with open(each_filename, 'r') as f:
+      for line in f:
+        #if string_to_find in line:
+        if pattern.match(line):
+          yield line_prefix + line
+        ##endof:  if string_to_find in line
+      ##endof:  for line in f
+    ##endof:  with open
+  ##endof:  for each_filename in filenames
+  
+##endof:  grep_lines(string_to_find, filename, recursive)
+
+
+def grep_patterns(literals, filename, regexes=(), ignore_case=False):
+  '''
+  Searches a file for many patterns at once, reporting which ones matched
+  
+  The literal keywords and the regexes are compiled once, together (see
+  dwb_multi_pattern ), and are found anywhere in the line.
+  
+  @param literals        An iterable of plain strings (keywords), or an
+                         already-compiled  MultiPatternMatcher
+  @param filename        A string representing the filename whose contents
+                         will be searched
+  @param regexes         An iterable of regex strings
+  @param ignore_case     If True, all the patterns ignore case
+  @return                A generator of  (line_num, line, patterns)
+                         tuples, one per matching line, where  patterns
+                         is the tuple of the patterns found in the line
+  '''
+  
+  if isinstance(literals, dwb_multi_pattern.MultiPatternMatcher):
+    matcher = literals
+  else:
+    matcher = dwb_multi_pattern.compile_patterns(literals, regexes,
+                                                 ignore_case)
+  ##endof:  if/else isinstance(literals, ...MultiPatternMatcher)
+  
+  with open(filename, 'r') as f:
+    for line_num, line in enumerate(f, 1):
+      matched = matcher.match_line(line)
+      if matched:
+        yield line_num, line, matched
+      ##endof:  if matched
+    ##endof:  for line_num, line in enumerate(f, 1)
+  ##endof:  with open
+  
+##endof:  grep_patterns(literals, filename, regexes, ignore_case)
+
+
+def grep_indexed(string_to_find, index_filename):
+  '''
+  Like  grep , but over a whole corpus of files that have been put into a
+  trigram index (see  dwb_trigram_index.update_index )
+  
+  Only the blocks of the files which hold every trigram of the literal
+  parts of  string_to_find  are read and matched, line-by-line, the same
+  way as in  grep . Files that have changed since they were indexed are
+  searched whole, so the results stay right even with a stale index.
+  
+  @param string_to_find  A regex string for which the files will be
+                         searched
+  @param index_filename  The trigram index (an SQLite database file)
+  @return                A generator of  (filename, line_num, line)
+                         tuples, in file and line order
+  '''
+  
+  return dwb_trigram_index.grep_indexed(string_to_find, index_filename)
+  
+##endof:  grep_indexed(string_to_find, index_filename)
+
+
 if __name__ == "__main__":
   '''
   Gets executed if the file is run as a script
@@ -109,5 +208,5 @@ if __name__ == "__main__":
   
   #main(sys.argv[1])
   main(sys.argv[1:3])
-
+  
 ##endof:  if __name__ == "__main__"
@@ -5,27 +5,198 @@
 @file dwb_pyhead.py
 @author David BLACK  @bballdave025
 @since 2024-05-20
+
+The first or the last lines (or bytes) of files, like `head` and `tail`,
+reading only what is needed: the head with buffered reads forward from
+the start, until enough newlines have gone by, and the tail with reads
+backward, a block at a time, from the end. Getting the last 100 lines
+of a 40 GB log touches a few KB of it.
+
+The lines are given byte for byte as they are in the file, line
+terminators, trailing whitespace and all, whatever the encoding.
+
+The tail can also be followed, like `tail -F`: new lines are handed back
+as they are appended, for any number of files at once. On Linux, the
+wait for them is on inotify (see  dwb_inotify ), so an idle follow uses
+next to no CPU; elsewhere, the files are checked every so often. A file
+that is rotated (replaced by a new one with the same name) or truncated
+is picked up again from its start.
+
+An example use from the interactive console
+
+ >>> import dwb_pyhead
+ >>> dwb_pyhead.head(5, 'some.log')              # like `head -n 5`
+ >>> dwb_pyhead.tail(100, 'some.log')            # like `tail -n 100`
+ >>> dwb_pyhead.tail(0, 'some.log', n_bytes=512) # like `tail -c 512`
+ >>> for filename, lines in dwb_pyhead.follow(['a.log', 'b.log']):
+ ...   print(filename, lines)                   # like `tail -F`
+
 '''
 ##############################################################################
 
 ##-------------------
 ## IMPORT STATEMENTS
 ##-------------------
+import os
+import sys
+import time
+import argparse
+import selectors
+import codecs
+from collections import namedtuple
 
 # Intra-Package
 ## For Python2
 # from __future__ import absolute_import
+import dwb_line_index
+import dwb_inotify
+
+##-------------------
+## MODULE CONSTANTS
+##-------------------
+## The number of bytes read at a time, forward for the head and backward
+## for the tail
+HEAD_BLOCK_SIZE = 64 * 1024
+TAIL_BLOCK_SIZE = 64 * 1024
+
+DEFAULT_N_LINES = 10
+
+## How often (in seconds)  follow  checks on the files when it has to
+## poll, and how long it waits on inotify at a time (so a  stop_event
+## is noticed)
+FOLLOW_POLL_INTERVAL = 1.0
+
+## With inotify, every file is still checked this often (in seconds), in
+## case a change went unreported (e.g. on a network filesystem)
+FOLLOW_RECHECK_INTERVAL = 30.0
 
-def main(n_lines, filename):
+## The new lines from one file, as a list of  bytes  (each with its
+## b'\\n' ); one batch is at most about  TAIL_BLOCK_SIZE  bytes
+FollowedLines = namedtuple('FollowedLines', ['filename', 'lines'])
+
+
+def main(argv=None):
   '''
   Allows an entrance for running as a command-line script
   
-  Defaults to the `head` method
+  A `head`-like command line (run it with  --help  for the options);
+  with  --tail , it is `tail`-like instead
+  
+  @param argv  The command-line arguments, without the program name
+               (None for  sys.argv[1:] )
+  @return      The exit status: 0, or 1 if a file couldn't be read
   '''
   
-  return grep(n_lines, filename)
+  arg_parser = argparse.ArgumentParser(
+      prog='dwb_pyhead',
+      description="Writes the first (or, with --tail, the last) " + \
+                  str(DEFAULT_N_LINES) + " lines of each FILE.")
+  arg_parser.add_argument('paths', metavar='FILE', nargs='+')
+  arg_parser.add_argument('-n', '--lines', dest='n_lines',
+                          type=_cli_count,
+                          default=DEFAULT_N_LINES,
+                          help="give this many lines " + \
+                               "(default: %(default)s)")
+  arg_parser.add_argument('-c', '--bytes', dest='n_bytes',
+                          type=_cli_count,
+                          default=None,
+                          help="give this many bytes instead of lines")
+  arg_parser.add_argument('-t', '--tail', action='store_true',
+                          help="give the last lines, like `tail`")
+  arg_parser.add_argument('-f', '--follow', action='store_true',
+                          help="give the last lines, then the new " + \
+                               "ones as they are appended, following " + \
+                               "each file through rotation, like " + \
+                               "`tail -F` (until interrupted)")
+  arg_parser.add_argument('-q', '--quiet', action='store_true',
+                          help="never give the  ==> FILE <==  headers")
+  arg_parser.add_argument('-v', '--verbose', action='store_true',
+                          help="always give the  ==> FILE <==  headers")
+  
+  try:
+    args = arg_parser.parse_args(argv)
+  except SystemExit as e_exit:
+    return e_exit.code  # after  --help , or a usage error
+  ##endof:  try/except SystemExit
+  
+  do_headers = args.verbose or (len(args.paths) > 1 and not args.quiet)
+  
+  if args.follow:
+    return _follow_cli(args, do_headers)
+  ##endof:  if args.follow
+  
+  if args.tail:
+    iter_blocks = iter_tail
+  else:
+    iter_blocks = iter_head
+  ##endof:  if/else args.tail
+  
+  out = _stdout_bytes_writer()
+  
+  exit_status = 0
+  is_first_file = True
+  
+  try:
+    for filename in args.paths:
+      try:
+        the_blocks = iter_blocks(filename, args.n_lines, args.n_bytes)
+        first_block = next(the_blocks, b'')
+      except BrokenPipeError:
+        raise  # that's stdout's trouble, not the file's
+      except OSError as e_os:
+        sys.stderr.write("dwb_pyhead: " + str(filename) + ": " + \
+                         (e_os.strerror or str(e_os)) + "\n")
+        exit_status = 1
+        continue
+      ##endof:  try/except OSError
+      
+      if do_headers:
+        header = "==> " + str(filename) + " <==\n"
+        if not is_first_file:
+          header = "\n" + header
+        ##endof:  if not is_first_file
+        out.write(header.encode('utf-8', 'surrogateescape'))
+      ##endof:  if do_headers
+      is_first_file = False
+      
+      out.write(first_block)
+      for block in the_blocks:
+        out.write(block)
+      ##endof:  for block in the_blocks
+    ##endof:  for filename in args.paths
+    
+    out.flush()
+  except BrokenPipeError:
+    ## Whoever was reading went away (e.g. `| head`). What's left in the
+    ## buffer goes to /dev/null, so nothing complains on the way out.
+    devnull_fd = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull_fd, sys.stdout.fileno())
+    os.close(devnull_fd)
+  ##endof:  try/except BrokenPipeError
   
-##endof:  main(n_lines, filename)
+  return exit_status
+  
+##endof:  main(argv)
+
+
+def _cli_count(count_str):
+  '''
+  The  argparse  type for  -n  and  -c : a plain count, 0 or more
+  
+  `head -n -K` (all but the last K) and `tail -n +K` (from the K-th on)
+  aren't done here, so a sign is an error instead of being taken as
+  something else.
+  '''
+  
+  if not count_str.isdigit():
+    raise argparse.ArgumentTypeError(
+        "not a count of 0 or more (the -N and +N forms aren't " + \
+        "supported): " + repr(count_str))
+  ##endof:  if not count_str.isdigit()
+  
+  return int(count_str)
+  
+##endof:  _cli_count(count_str)
 
 
 def run(n_lines, filename):
@@ -37,32 +208,652 @@ def run(n_lines, filename):
   
   return head(n_lines, filename)
   
-##endof:  main(n_lines, filename)
+##endof:  run(n_lines, filename)
 
 
-def head(n_lines, filename):
+def head(n_lines, filename, use_index=False, n_bytes=None):
   '''
   Mimics part of the behavior of the `bash` command, `head`.
   
+  A file with fewer than  n_lines  lines is given whole.
+  
   @param n_lines         The number of lines. It will be the  n_lines
                          first lines.
   @param filename        A string representing the filename whose first lines
                          will be found.
-  @result                A string representing the first  n_lines  lines of
-                         the file represented by  filename  will print out.
-  '''
-  
-  # @todo  For all  with open , allow 'utf-8' encoding, and use UnicodeDammit
-  with open(filename, 'r') as ifh:
-    for i in range(n_lines):
-      #  getting rid of the linefeed character at the end.
-      #+ it also gets rid of any trailing whitespace, which
-      #+ is probably not what I want to do
-      # @todo  Only take off the trailing linefeed
-      this_line = next(ifh).rstrip()
-      print(this_line)
+  @param use_index       If True, the end of the first  n_lines  lines is
+                         looked up in the sidecar line index (see
+                         dwb_line_index ) and just those bytes are read
+  @param n_bytes         If not None, the first  n_bytes  bytes are given
+                         instead of lines (`head -c`)
+  @result                The first  n_lines  lines of the file represented
+                         by  filename  are written to stdout, exactly as
+                         they are in the file.
+  '''
+  
+  _write_blocks(iter_head(filename, n_lines, n_bytes, use_index=use_index))
+  
+##endof:  head(n_lines, filename, use_index, n_bytes)
+
+
+def tail(n_lines, filename, use_index=False, n_bytes=None):
+  '''
+  Mimics part of the behavior of the `bash` command, `tail`.
+  
+  @param n_lines         The number of lines. It will be the  n_lines
+                         last lines (a last line without a newline
+                         counts as a line, as with `tail`).
+  @param filename        A string representing the filename whose last
+                         lines will be found.
+  @param use_index       If True, the start of the last  n_lines  lines is
+                         looked up in the sidecar line index (see
+                         dwb_line_index ) instead of read backward for
+  @param n_bytes         If not None, the last  n_bytes  bytes are given
+                         instead of lines (`tail -c`)
+  @result                The last  n_lines  lines of the file represented
+                         by  filename  are written to stdout, exactly as
+                         they are in the file.
+  '''
+  
+  _write_blocks(iter_tail(filename, n_lines, n_bytes, use_index=use_index))
+  
+##endof:  tail(n_lines, filename, use_index, n_bytes)
+
+
+def iter_head(filename, n_lines=DEFAULT_N_LINES, n_bytes=None,
+              block_size=HEAD_BLOCK_SIZE, use_index=False):
+  '''
+  Yields the first  n_lines  lines (or  n_bytes  bytes) of a file, in
+  blocks of bytes
+  
+  The file is read forward a block at a time, and only as far as the
+  n_lines -th newline; the newlines in a block are counted (in C) before
+  any of them are looked for one by one.
+  
+  @param filename    A string representing the filename
+  @param n_lines     The number of lines
+  @param n_bytes     If not None, the number of bytes instead
+  @param block_size  The number of bytes read at a time
+  @param use_index   If True, where the lines end is looked up in the
+                     sidecar line index (see  dwb_line_index )
+  @return            A generator of non-empty  bytes  objects
+  '''
+  
+  if n_bytes is None and use_index:
+    the_index = dwb_line_index.get_line_index(filename)
+    n_bytes = dwb_line_index.offset_of_line(the_index, n_lines + 1)
+  ##endof:  if n_bytes is None and use_index
+  
+  with open(filename, 'rb') as ifh:
+    if n_bytes is not None:
+      n_left = n_bytes
+      while n_left > 0:
+        block = ifh.read(min(block_size, n_left))
+        if not block:
+          break
+        ##endof:  if not block
+        n_left -= len(block)
+        yield block
+      ##endof:  while n_left > 0
+      return
+    ##endof:  if n_bytes is not None
+    
+    n_left = n_lines
+    while n_left > 0:
+      block = ifh.read(block_size)
+      if not block:
+        break
+      ##endof:  if not block
+      
+      n_newlines = block.count(b'\n')
+      if n_newlines < n_left:
+        n_left -= n_newlines
+        yield block
+        continue
+      ##endof:  if n_newlines < n_left
+      
+      ## The last newline wanted is in this block
+      line_end = 0
+      for newline_idx in range(n_left):
+        line_end = block.index(b'\n', line_end) + 1
+      ##endof:  for newline_idx in range(n_left)
+      
+      yield block[:line_end]
+      n_left = 0
+    ##endof:  while n_left > 0
+  ##endof:  with open ... ifh # Input File Handle
+  
+##endof:  iter_head(filename, n_lines, n_bytes, block_size, use_index)
+
+
+def iter_tail(filename, n_lines=DEFAULT_N_LINES, n_bytes=None,
+              block_size=TAIL_BLOCK_SIZE, use_index=False):
+  '''
+  Yields the last  n_lines  lines (or  n_bytes  bytes) of a file, in
+  blocks of bytes
+  
+  Where the lines start is found by  find_tail_offset , reading backward
+  from the end; then the file is read forward from there.
+  
+  @param filename    A string representing the filename
+  @param n_lines     The number of lines
+  @param n_bytes     If not None, the number of bytes instead
+  @param block_size  The number of bytes read at a time
+  @param use_index   If True, where the lines start is looked up in the
+                     sidecar line index (see  dwb_line_index )
+  @return            A generator of non-empty  bytes  objects
+  '''
+  
+  if n_bytes is None and use_index:
+    the_index = dwb_line_index.get_line_index(filename)
+    tail_start = dwb_line_index.tail_offset(the_index, n_lines)
+  else:
+    tail_start = None
+  ##endof:  if/else n_bytes is None and use_index
+  
+  with open(filename, 'rb') as ifh:
+    if n_bytes is not None:
+      file_size = ifh.seek(0, os.SEEK_END)
+      tail_start = max(0, file_size - n_bytes)
+    elif tail_start is None:
+      tail_start = find_tail_offset(ifh, n_lines, block_size)
+    ##endof:  if/elif ...
+    
+    ifh.seek(tail_start)
+    for block in iter(lambda: ifh.read(block_size), b''):
+      yield block
+    ##endof:  for block in iter(...)
   ##endof:  with open ... ifh # Input File Handle
-##endof:  head(n_lines, filename)
+  
+##endof:  iter_tail(filename, n_lines, n_bytes, block_size, use_index)
+
+
+def find_tail_offset(binary_fh, n_lines, block_size=TAIL_BLOCK_SIZE):
+  '''
+  Finds where the last  n_lines  lines of a file start, reading it
+  backward from the end, one block at a time
+  
+  The last lines start just after the  n_lines -th newline from the end,
+  not counting a newline that is the file's last byte (a last line
+  without one is still a line, as with `tail`).
+  
+  @param binary_fh   A file object opened with 'rb' (it is left
+                     wherever the reading stopped)
+  @param n_lines     The number of lines
+  @param block_size  The number of bytes read at a time
+  @return            The byte offset (0 for a file with no more than
+                     n_lines  lines)
+  '''
+  
+  block_end = binary_fh.seek(0, os.SEEK_END)
+  
+  if n_lines <= 0 or block_end == 0:
+    return block_end
+  ##endof:  if n_lines <= 0 or block_end == 0
+  
+  ## The newline that ends the last line doesn't separate it from another
+  binary_fh.seek(block_end - 1)
+  if binary_fh.read(1) == b'\n':
+    block_end -= 1
+  ##endof:  if binary_fh.read(1) == b'\n'
+  
+  n_left = n_lines
+  
+  while block_end > 0:
+    block_start = max(0, block_end - block_size)
+    binary_fh.seek(block_start)
+    block = binary_fh.read(block_end - block_start)
+    
+    n_newlines = block.count(b'\n')
+    if n_newlines < n_left:
+      n_left -= n_newlines
+      block_end = block_start
+      continue
+    ##endof:  if n_newlines < n_left
+    
+    ## The newline wanted is in this block
+    newline_idx = len(block)
+    for back_idx in range(n_left):
+      newline_idx = block.rindex(b'\n', 0, newline_idx)
+    ##endof:  for back_idx in range(n_left)
+    
+    return block_start + newline_idx + 1
+  ##endof:  while block_end > 0
+  
+  return 0
+  
+##endof:  find_tail_offset(binary_fh, n_lines, block_size)
+
+
+def follow(filenames,
+           n_lines=DEFAULT_N_LINES,
+           n_bytes=None,
+           poll_interval=FOLLOW_POLL_INTERVAL,
+           stop_event=None,
+           use_inotify=True,
+           on_notice=None):
+  '''
+  Follows files, like `tail -F`: yields their last lines, then their new
+  lines as they are appended, until  stop_event  is set (or the
+  generator is closed)
+  
+  All the files are followed from one loop. With inotify, it waits on
+  one inotify instance watching the files' directories (rather than the
+  files themselves, so a file that gets replaced is still seen), and
+  only the files named in the events are looked at. Without it, every
+  file is checked each  poll_interval .
+  
+  A line is handed back once its  b'\\n'  has been written. When a file
+  is rotated, the rest of the old file is read first, then the new one
+  is followed from its start; a file that gets shorter (truncated) is
+  read again from its start. A file that isn't there (yet) is waited
+  for.
+  
+  @param filenames      An iterable of strings representing filenames
+  @param n_lines        The number of last lines to start with
+  @param n_bytes        If not None, start with this many last bytes
+                        instead
+  @param poll_interval  How often (in seconds) the files are checked
+                        without inotify; with it, how often
+                        stop_event  is checked
+  @param stop_event     A  threading.Event  (or anything with  is_set
+                        and  wait ) that stops the following when set
+  @param use_inotify    If False, the files are polled even on Linux
+  @param on_notice      Called with  (filename, message)  when a file
+                        can't be opened, appears, is truncated, or is
+                        replaced (by default, nothing is said)
+  @return               A generator of  FollowedLines
+  '''
+  
+  filenames = list(dict.fromkeys(filenames))  # (each one once, in order)
+  followed = {filename: {'filename': filename,
+                         'fh': None,
+                         'file_id': None,
+                         'pending': bytearray()}
+              for filename in filenames}
+  
+  for filename in filenames:
+    try:
+      _open_followed(followed[filename], n_lines, n_bytes)
+    except OSError as e_os:
+      _notice(on_notice, filename,
+              "can't be opened (" + (e_os.strerror or str(e_os)) + \
+              "); waiting for it")
+    ##endof:  try/except OSError
+  ##endof:  for filename in filenames
+  
+  inotify_fd = None
+  if use_inotify and dwb_inotify.can_do_inotify:
+    try:
+      inotify_fd = dwb_inotify.inotify_init()
+    except OSError:
+      pass  # (polling, then)
+    ##endof:  try/except OSError
+  ##endof:  if use_inotify and dwb_inotify.can_do_inotify
+  
+  the_selector = None
+  watched_dirs = {}  # watch descriptor -> directory
+  followed_names = {_followed_name(filename): filename
+                    for filename in filenames}
+  
+  try:
+    ## (watched before anything is read, so no change goes unnoticed)
+    if inotify_fd is not None:
+      for directory in sorted(set(directory for directory, name
+                                  in followed_names)):
+        try:
+          watched_dirs[dwb_inotify.add_watch(
+              inotify_fd, directory, dwb_inotify.IN_FILE_CHANGES)] = \
+            directory
+        except OSError:
+          pass  # (its files are still checked now and then)
+        ##endof:  try/except OSError
+      ##endof:  for directory in sorted(...)
+      
+      the_selector = selectors.DefaultSelector()
+      the_selector.register(inotify_fd, selectors.EVENT_READ)
+    ##endof:  if inotify_fd is not None
+    
+    for filename in filenames:
+      for lines in _iter_followed_batches(followed[filename]):
+        yield FollowedLines(filename, lines)
+      ##endof:  for lines in _iter_followed_batches(...)
+    ##endof:  for filename in filenames
+    
+    last_full_check = time.monotonic()
+    
+    while stop_event is None or not stop_event.is_set():
+      if the_selector is None:
+        if stop_event is None:
+          time.sleep(poll_interval)
+        else:
+          stop_event.wait(poll_interval)
+        ##endof:  if/else stop_event is None
+        changed_filenames = set(filenames)
+      else:
+        changed_filenames = set()
+        if the_selector.select(poll_interval):
+          changed_filenames = \
+            _changed_filenames(dwb_inotify.read_events(inotify_fd),
+                               watched_dirs, followed_names, filenames)
+        ##endof:  if the_selector.select(poll_interval)
+        
+        if time.monotonic() - last_full_check >= FOLLOW_RECHECK_INTERVAL:
+          changed_filenames = set(filenames)
+        ##endof:  if time.monotonic() - last_full_check >= ...
+      ##endof:  if/else the_selector is None
+      
+      if len(changed_filenames) == len(filenames):
+        last_full_check = time.monotonic()
+      ##endof:  if len(changed_filenames) == len(filenames)
+      
+      for filename in filenames:
+        if filename not in changed_filenames:
+          continue
+        ##endof:  if filename not in changed_filenames
+        
+        for lines in _check_followed(followed[filename], on_notice):
+          yield FollowedLines(filename, lines)
+        ##endof:  for lines in _check_followed(...)
+      ##endof:  for filename in filenames
+    ##endof:  while stop_event is None or not stop_event.is_set()
+  finally:
+    if the_selector is not None:
+      the_selector.close()
+    ##endof:  if the_selector is not None
+    if inotify_fd is not None:
+      os.close(inotify_fd)
+    ##endof:  if inotify_fd is not None
+    for state in followed.values():
+      if state['fh'] is not None:
+        state['fh'].close()
+      ##endof:  if state['fh'] is not None
+    ##endof:  for state in followed.values()
+  ##endof:  try/finally
+  
+##endof:  follow(filenames, n_lines, n_bytes, poll_interval, ...)
+
+
+def _follow_cli(args, do_headers):
+  '''
+  The command line's  --follow : writes each batch of lines as it comes,
+  with a  ==> FILE <==  header whenever the file changes
+  '''
+  
+  out = _stdout_bytes_writer()
+  
+  last_filename = None
+  
+  def report_notice(filename, message):
+    sys.stderr.write("dwb_pyhead: " + str(filename) + " " + message + "\n")
+  ##endof:  report_notice(filename, message)
+  
+  try:
+    for filename, lines in follow(args.paths, args.n_lines, args.n_bytes,
+                                  on_notice=report_notice):
+      if do_headers and filename != last_filename:
+        header = "==> " + str(filename) + " <==\n"
+        if last_filename is not None:
+          header = "\n" + header
+        ##endof:  if last_filename is not None
+        out.write(header.encode('utf-8', 'surrogateescape'))
+      ##endof:  if do_headers and filename != last_filename
+      last_filename = filename
+      
+      out.writelines(lines)
+      out.flush()
+    ##endof:  for filename, lines in follow(...)
+  except KeyboardInterrupt:
+    pass
+  except BrokenPipeError:
+    ## (see  main )
+    devnull_fd = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull_fd, sys.stdout.fileno())
+    os.close(devnull_fd)
+  ##endof:  try/except
+  
+  return 0
+  
+##endof:  _follow_cli(args, do_headers)
+
+
+def _notice(on_notice, filename, message):
+  '''
+  Passes a message about a followed file along, if anyone wants it
+  '''
+  
+  if on_notice is not None:
+    on_notice(filename, message)
+  ##endof:  if on_notice is not None
+  
+##endof:  _notice(on_notice, filename, message)
+
+
+def _followed_name(filename):
+  '''
+  (the absolute directory, the name in it as bytes) , the way inotify
+  events for the directory name the file
+  '''
+  
+  abs_filename = os.path.abspath(filename)
+  
+  return (os.path.dirname(abs_filename),
+          os.fsencode(os.path.basename(abs_filename)))
+  
+##endof:  _followed_name(filename)
+
+
+def _changed_filenames(events, watched_dirs, followed_names, filenames):
+  '''
+  The followed files that some inotify events are about (all of them, if
+  the kernel's queue overflowed and events were lost)
+  '''
+  
+  changed_filenames = set()
+  
+  for event in events:
+    if event.mask & dwb_inotify.IN_Q_OVERFLOW:
+      return set(filenames)
+    ##endof:  if event.mask & dwb_inotify.IN_Q_OVERFLOW
+    
+    the_key = (watched_dirs.get(event.wd), event.name)
+    if the_key in followed_names:
+      changed_filenames.add(followed_names[the_key])
+    ##endof:  if the_key in followed_names
+  ##endof:  for event in events
+  
+  return changed_filenames
+  
+##endof:  _changed_filenames(events, watched_dirs, followed_names, ...)
+
+
+def _open_followed(state, n_lines=None, n_bytes=None):
+  '''
+  Opens a followed file, and remembers which file it is (device and
+  inode), to tell later whether it was replaced
+  
+  It is read from the start of its last  n_lines  lines (or  n_bytes
+  bytes) or, with neither, from its very start.
+  '''
+  
+  fh = open(state['filename'], 'rb')
+  file_stat = os.fstat(fh.fileno())
+  
+  if n_bytes is not None:
+    fh.seek(max(0, file_stat.st_size - n_bytes))
+  elif n_lines is not None:
+    fh.seek(find_tail_offset(fh, n_lines))
+  ##endof:  if/elif ...
+  
+  state['fh'] = fh
+  state['file_id'] = (file_stat.st_dev, file_stat.st_ino)
+  state['pending'].clear()
+  
+##endof:  _open_followed(state, n_lines, n_bytes)
+
+
+def _check_followed(state, on_notice):
+  '''
+  Looks at a followed file after something may have happened to it,
+  yielding batches of its new lines
+  '''
+  
+  filename = state['filename']
+  
+  try:
+    file_stat = os.stat(filename)
+    file_id = (file_stat.st_dev, file_stat.st_ino)
+  except OSError:
+    file_stat = None  # gone, for now; the old one may still be written
+    file_id = None
+  ##endof:  try/except OSError
+  
+  if state['fh'] is None:
+    if file_stat is None:
+      return
+    ##endof:  if file_stat is None
+    
+    try:
+      _open_followed(state)
+    except OSError:
+      return
+    ##endof:  try/except OSError
+    
+    _notice(on_notice, filename, "has appeared; following it")
+    yield from _iter_followed_batches(state)
+    return
+  ##endof:  if state['fh'] is None
+  
+  if file_id == state['file_id'] and file_stat.st_size < state['fh'].tell():
+    _notice(on_notice, filename, "was truncated")
+    state['fh'].seek(0)
+    state['pending'].clear()
+  ##endof:  if file_id == state['file_id'] and ...
+  
+  yield from _iter_followed_batches(state)
+  
+  if file_id is None or file_id == state['file_id']:
+    return
+  ##endof:  if file_id is None or file_id == state['file_id']
+  
+  ## Rotated. The rest of the old file was read just now, so an
+  ## unfinished last line in it won't be finished.
+  if state['pending']:
+    yield [bytes(state['pending'])]
+  ##endof:  if state['pending']
+  
+  state['fh'].close()
+  state['fh'] = None
+  _notice(on_notice, filename, "has been replaced; following the new file")
+  
+  try:
+    _open_followed(state)
+  except OSError:
+    return  # (it is tried again next time)
+  ##endof:  try/except OSError
+  
+  yield from _iter_followed_batches(state)
+  
+##endof:  _check_followed(state, on_notice)
+
+
+def _iter_followed_batches(state, block_size=TAIL_BLOCK_SIZE):
+  '''
+  Reads a followed file up to its end, yielding the whole lines of each
+  block as a list (an unfinished last line waits in  state['pending'] )
+  '''
+  
+  if state['fh'] is None:
+    return  # (not open yet)
+  ##endof:  if state['fh'] is None
+  
+  pending = state['pending']
+  
+  for block in iter(lambda: state['fh'].read(block_size), b''):
+    pending += block
+    
+    last_newline = pending.rfind(b'\n')
+    if last_newline < 0:
+      continue
+    ##endof:  if last_newline < 0
+    
+    whole_lines = bytes(pending[:last_newline + 1])
+    del pending[:last_newline + 1]
+    
+    yield [line + b'\n' for line in whole_lines.split(b'\n')[:-1]]
+  ##endof:  for block in iter(...)
+  
+##endof:  _iter_followed_batches(state, block_size)
+
+
+def _write_blocks(blocks):
+  '''
+  Writes blocks of bytes to stdout, as they are
+  '''
+  
+  out = _stdout_bytes_writer()
+  
+  for block in blocks:
+    out.write(block)
+  ##endof:  for block in blocks
+  
+  out.flush()
+  
+##endof:  _write_blocks(blocks)
+
+
+def _stdout_bytes_writer():
+  '''
+  Where the bytes for stdout are written:  sys.stdout.buffer , once
+  anything already in  sys.stdout  has gone out; or, if  sys.stdout  has
+  no buffer (e.g. an  io.StringIO ), a  _TextStdoutWriter  in front of it
+  '''
+  
+  sys.stdout.flush()
+  out = getattr(sys.stdout, 'buffer', None)
+  
+  if out is None:
+    return _TextStdoutWriter(sys.stdout)
+  ##endof:  if out is None
+  
+  return out
+  
+##endof:  _stdout_bytes_writer()
+
+
+class _TextStdoutWriter(object):
+  '''
+  Takes the bytes meant for a  sys.stdout  without a buffer, and writes
+  them to it as text, decoded as UTF-8 (anything that isn't is replaced
+  with U+FFFD). A character split between two writes comes out whole;
+  flush  writes out what's left of one cut off at the end.
+  '''
+  
+  def __init__(self, text_out):
+    self.text_out = text_out
+    self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    
+  ##endof:  __init__(self, text_out)
+  
+  def write(self, data):
+    self.text_out.write(self.decoder.decode(data))
+    
+  ##endof:  write(self, data)
+  
+  def writelines(self, the_data):
+    for data in the_data:
+      self.write(data)
+    ##endof:  for data in the_data
+    
+  ##endof:  writelines(self, the_data)
+  
+  def flush(self):
+    self.text_out.write(self.decoder.decode(b'', final=True))
+    self.text_out.flush()
+    
+  ##endof:  flush(self)
+  
+##endof:  class _TextStdoutWriter(object)
 
 
 if __name__ == "__main__":
@@ -70,6 +861,6 @@ if __name__ == "__main__":
   Gets executed if the file is run as a script
   '''
   
-  main(sys.argv[1:2])
+  sys.exit(main())
   
 ##endof:  if __name__ == "__main__"
@@ -6,29 +6,202 @@
 @author David BLACK  @bballdave025
 @since 2024-05-20
 
-@todo Give options for pure bash-like output
+@todo Give options for pure bash-like output - done (see  format_wc_bash )
 '''
 ##############################################################################
 
 ##-------------------
 ## IMPORT STATEMENTS
 ##-------------------
+import os
 import sys
+import io
+import re
+import csv
+import json
+import codecs
+import mmap
+import zlib
+import tempfile
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 # Intra-Package
 ## For Python2
 # from __future__ import absolute_import
+import dwb_line_index
+import dwb_walk
 
-def main(string_to_find, filename):
+can_do_encoding_detection = True # innocent until proven guilty
+try:
+  import handle_text_encoding_decoding  # needs bs4 (Beautiful Soup 4)
+except Exception as e_encdec:
+  can_do_encoding_detection = False
+finally:
+  pass
+##endof:  try/except/finally handle_text_encoding_decoding
+
+## The number of bytes read at a time when counting newlines
+COUNT_BLOCK_SIZE = 1024 * 1024
+
+## The size of the (reused) buffer  wc  reads each file into
+WC_BLOCK_SIZE = 4 * 1024 * 1024
+
+## The bytes that separate words, the same as for  bytes.split()
+WHITESPACE_BYTES = b' \t\n\r\x0b\x0c'
+
+## Turns every whitespace byte into  b' '  and every other byte into
+## b'x' , so the start of each word is a  b' x'  in the translated block
+WORD_TRANSLATION = bytes(ord(' ') if byte in WHITESPACE_BYTES else ord('x')
+                         for byte in range(256))
+
+## count_text_parallel  doesn't split a file into pieces smaller than
+## this; a smaller file is counted in this process
+MIN_PARALLEL_PIECE_SIZE = 16 * 1024 * 1024
+
+## The UTF-8 continuation bytes,  0b10xxxxxx , which can't start a piece
+UTF8_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+## Sorts the bytes, for finding where UTF-8 characters start:  a  for
+## ASCII,  c  for a continuation byte,  2 ,  3  and  4  for the first byte
+## of a 2-, 3- or 4-byte character, and  x  for bytes that are never in
+## UTF-8
+UTF8_CLASS_TRANSLATION = b'a' * 0x80 + b'c' * 0x40 + b'x' * 2 + \
+                         b'2' * 30 + b'3' * 16 + b'4' * 5 + b'x' * 11
+
+## The first bytes whose second byte has a narrower range than the other
+## continuation bytes', and the second bytes that are out of it (overlong
+## forms, surrogates, and code points past U+10FFFF)
+UTF8_NARROW_SECOND_BYTE_RES = (
+    (b'\xe0', re.compile(b'\xe0[\x80-\x9f]')),
+    (b'\xed', re.compile(b'\xed[\xa0-\xbf]')),
+    (b'\xf0', re.compile(b'\xf0[\x80-\x8f]')),
+    (b'\xf4', re.compile(b'\xf4[\x90-\xbf]')))
+
+## The checkpoint for  some.log  (see  count_file_incremental ) is kept
+## in  some.log.wcckpt
+CHECKPOINT_EXTENSION = '.wcckpt'
+CHECKPOINT_FORMAT = 'dwb_pywc checkpoint 1'
+
+## How many bytes, at the start and at the end of what was counted, a
+## checkpoint keeps a CRC-32 of (to tell when the file was rewritten)
+CHECKSUM_SPAN = 4096
+
+## The counts for one file (or the totals). The  chars  are characters
+## (of UTF-8, or of the encoding found for a file that isn't UTF-8),
+## and the  bytes  are bytes. The  max_line_length  is in characters,
+## not counting the newline, and is None unless it was asked
+## for. The  error  is the message for a file that couldn't be read (and
+## whose counts are all 0).
+WcResult = namedtuple('WcResult',
+                      ['filename', 'lines', 'words', 'chars', 'bytes',
+                       'max_line_length', 'error'],
+                      defaults=[None, None])
+
+## The counts in the order `wc` gives them
+WC_FIELDS = ('lines', 'words', 'chars', 'bytes', 'max_line_length')
+
+## What `wc` gives when it isn't told which counts to give
+BASH_WC_DEFAULT_FIELDS = ('lines', 'words', 'bytes')
+
+## The counts for a run of blocks (a file, or a byte range of one),
+## with what is needed to join them up with the neighboring ranges'.
+## is_utf8  is None when the blocks were decoded with another encoding.
+BlockCounts = namedtuple('BlockCounts',
+                         ['lines', 'words', 'chars', 'bytes',
+                          'max_line_length',
+                          'starts_in_word', 'ends_in_word',
+                          'first_line_length', 'last_line_length',
+                          'is_utf8'])
+
+
+def main(argv=None):
   '''
   Allows an entrance for running as a command-line script
   
-  Defaults to the `wc` method
+  A `wc`-like command line (run it with  --help  for the options), which
+  can also give its counts as JSON or CSV
+  
+  @param argv  The command-line arguments, without the program name
+               (None for  sys.argv[1:] )
+  @return      The exit status: 0, or 1 if a file couldn't be read
   '''
   
-  return wc(filename)
+  arg_parser = argparse.ArgumentParser(
+      prog='dwb_pywc',
+      description="Counts the lines, words, characters and bytes in " + \
+                  "each FILE, and the totals.")
+  arg_parser.add_argument('paths', metavar='FILE', nargs='+')
+  arg_parser.add_argument('-l', '--lines', dest='fields',
+                          action='append_const', const='lines',
+                          help="give the newline counts")
+  arg_parser.add_argument('-w', '--words', dest='fields',
+                          action='append_const', const='words',
+                          help="give the word counts")
+  arg_parser.add_argument('-m', '--chars', dest='fields',
+                          action='append_const', const='chars',
+                          help="give the character counts")
+  arg_parser.add_argument('-c', '--bytes', dest='fields',
+                          action='append_const', const='bytes',
+                          help="give the byte counts")
+  arg_parser.add_argument('-L', '--max-line-length', dest='fields',
+                          action='append_const', const='max_line_length',
+                          help="give the length of the longest line")
+  arg_parser.add_argument('-r', '--recursive', action='store_true',
+                          help="count the files under each directory")
+  arg_parser.add_argument('--format', choices=('bash', 'json', 'csv'),
+                          default='bash',
+                          help="how to give the counts " + \
+                               "(default: %(default)s)")
+  arg_parser.add_argument('-j', '--workers', type=int, default=None,
+                          help="the number of worker processes " + \
+                               "(default: the number of CPUs)")
+  arg_parser.add_argument('--incremental', action='store_true',
+                          help="keep a checkpoint in FILE" + \
+                               CHECKPOINT_EXTENSION + ", and only " + \
+                               "count what was appended since")
   
-##endof:  main(filename)
+  try:
+    args = arg_parser.parse_args(argv)
+  except SystemExit as e_exit:
+    return e_exit.code  # after  --help , or a usage error
+  ##endof:  try/except SystemExit
+  
+  ## In `wc`'s order, whatever order they were given in
+  fields = BASH_WC_DEFAULT_FIELDS
+  if args.fields:
+    fields = tuple(field for field in WC_FIELDS if field in args.fields)
+  ##endof:  if args.fields
+  
+  results = wc_many(args.paths,
+                    recursive=args.recursive,
+                    workers=args.workers,
+                    do_max_line_length='max_line_length' in fields,
+                    incremental=args.incremental)
+  
+  for result in results:
+    if result.error is not None:
+      sys.stderr.write("dwb_pywc: " + str(result.filename) + ": " + \
+                       result.error + "\n")
+    ##endof:  if result.error is not None
+  ##endof:  for result in results
+  
+  if args.format == 'json':
+    sys.stdout.write(format_wc_json(results) + "\n")
+  elif args.format == 'csv':
+    sys.stdout.write(format_wc_csv(results))
+  else:
+    sys.stdout.write(format_wc_bash(results, fields))
+  ##endof:  if/elif/else args.format ...
+  
+  if any(result.error is not None for result in results):
+    return 1
+  ##endof:  if any(result.error is not None ...)
+  
+  return 0
+  
+##endof:  main(argv)
 
 
 def run(filename):
@@ -37,44 +210,1110 @@ def run(filename):
   
   Defaults to the `wc` method
   '''
-    
+  
   return wc(filename)
   
 ##endof:  main(filename)
 
 
-def wc(filename):
+def wc(filename, recursive=False, workers=1, do_print=True):
   '''
   Mimics part of the behavior of the `bash` command, `wc`.
   
   @param filename        A string representing the filename whose length
                          in lines, words, and characters will be given
-  @return                A string with the lengths
+  @param recursive       If True and  filename  is a directory, the
+                         lengths are the totals over every (non-binary)
+                         file under it (see  dwb_walk )
+  @param workers         If more than 1, each (big) file is split into
+                         pieces counted by this many worker processes
+                         (see  count_text_parallel )
+  @param do_print        If True (the default), the lengths are printed,
+                         too, as  n_lines: ... ,  n_words: ... ,
+                         n_chars: ...
+  @return                A  WcResult  with the lengths (for a directory,
+                         the totals, under the directory's name)
+  '''
+  
+  if recursive and os.path.isdir(filename):
+    filenames = dwb_walk.walk_files([filename], skip_binary=True)
+  else:
+    filenames = [filename]
+  ##endof:  if/else recursive and os.path.isdir(filename)
+  
+  results = []
+  
+  for each_filename in filenames:
+    # @todo  use UnicodeDammit where 'utf-8' isn't the right guess
+    results.append(count_file(each_filename, workers))
+  ##endof:  for each_filename in filenames
+  
+  the_result = wc_total(results)._replace(filename=filename)
+  
+  if do_print:
+    print("n_lines: " + str(the_result.lines))
+    print("n_words: " + str(the_result.words))
+    print("n_chars: " + str(the_result.chars))
+  ##endof:  if do_print
+  
+  return the_result
+  
+##endof:  wc(filename, recursive, workers, do_print)
+
+
+def wc_many(filenames,
+            recursive=False,
+            workers=None,
+            do_max_line_length=False,
+            incremental=False):
+  '''
+  Counts many files at once, in a pool of worker processes
+  
+  The files are handed out to the workers a batch at a time, so
+  thousands of small files don't mean thousands of round trips. A single
+  (big) file is split into byte ranges instead (see
+  count_text_parallel ). A file that can't be read doesn't stop the
+  rest; its  WcResult  has the  error  instead.
+  
+  @param filenames           An iterable of filenames
+  @param recursive           If True, each directory is replaced by the
+                             (non-binary) files under it (see  dwb_walk )
+  @param workers             The number of worker processes (default: the
+                             number of CPUs; 1 counts everything in this
+                             process)
+  @param do_max_line_length  If True, the longest lines are found, too
+  @param incremental         If True, each file is counted with
+                             count_file_incremental , so only what was
+                             appended since the last time is read
+  @return                    A list of  WcResult s, in the order of the
+                             files (see  wc_total  for the totals row)
+  '''
+  
+  if workers is None:
+    workers = os.cpu_count() or 1
+  ##endof:  if workers is None
+  
+  if recursive:
+    filenames = dwb_walk.walk_files(filenames, skip_binary=True)
+  ##endof:  if recursive
+  
+  filenames = list(filenames)
+  n_files = len(filenames)
+  
+  if n_files == 1 or workers <= 1:
+    return [_count_file_or_error(filename, workers, do_max_line_length,
+                                 incremental)
+            for filename in filenames]
+  ##endof:  if n_files == 1 or workers <= 1
+  
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    results = list(executor.map(_count_file_or_error,
+                                filenames,
+                                [1] * n_files,
+                                [do_max_line_length] * n_files,
+                                [incremental] * n_files,
+                                chunksize=max(1, n_files // (4 * workers))))
+  ##endof:  with ProcessPoolExecutor(...) as executor
+  
+  return results
+  
+##endof:  wc_many(filenames, recursive, workers, do_max_line_length, ...)
+
+
+def count_file(filename, workers=1, do_max_line_length=False,
+               block_size=WC_BLOCK_SIZE):
+  '''
+  Counts one file
+  
+  @param filename            A string representing the filename
+  @param workers             If more than 1, the file is split into byte
+                             ranges counted in this many worker processes
+  @param do_max_line_length  If True, the longest line is found, too
+  @param block_size          The number of bytes read at a time
+  @return                    A  WcResult
+  '''
+  
+  if workers > 1:
+    the_counts = _count_file_parallel(filename, workers, block_size,
+                                      'replace', do_max_line_length)
+  else:
+    the_counts = _count_file(filename, block_size, 'utf-8', 'replace',
+                             do_max_line_length)
+  ##endof:  if/else workers > 1
+  
+  return WcResult(filename, the_counts.lines, the_counts.words,
+                  the_counts.chars, the_counts.bytes,
+                  the_counts.max_line_length)
+  
+##endof:  count_file(filename, workers, do_max_line_length, block_size)
+
+
+def count_file_incremental(filename,
+                           do_max_line_length=False,
+                           checkpoint_filename=None,
+                           do_save=True,
+                           block_size=WC_BLOCK_SIZE):
+  '''
+  Counts one (append-only) file, reading only what was appended since
+  the last time
+  
+  The counts so far are kept in a small JSON checkpoint, along with
+  where the counting stopped, whether it stopped inside a word, how long
+  the unfinished last line is, and the file's device and inode. The new
+  bytes are counted as one more byte range and joined up with the saved
+  counts (see  _join_block_counts ), so each call costs about as much as
+  what was appended, not as the whole file.
+  
+  The file is counted from scratch when it was replaced (rotated) or
+  rewritten: when the inode changed, the file is shorter than what was
+  counted, or a CRC-32 of the first or the last counted bytes doesn't
+  agree. A UTF-8 character still being written at the end is counted,
+  but not checkpointed, so the next call picks it up whole. A file that
+  isn't UTF-8 is counted in full each time (see  _count_file ), with no
+  checkpoint.
+  
+  @param filename             A string representing the filename
+  @param do_max_line_length   If True, the longest line is found, too (a
+                              checkpoint saved without it means counting
+                              from scratch once)
+  @param checkpoint_filename  Where the checkpoint is kept (by default,
+                              filename  plus  '.wcckpt' )
+  @param do_save              If True, the new checkpoint is written
+                              (atomically, with  os.replace ). If that
+                              can't be done (e.g. a read-only directory),
+                              the counts are still returned.
+  @param block_size           The number of bytes read at a time
+  @return                     A  WcResult
+  '''
+  
+  if checkpoint_filename is None:
+    checkpoint_filename = filename + CHECKPOINT_EXTENSION
+  ##endof:  if checkpoint_filename is None
+  
+  with open(filename, 'rb') as f:
+    file_stat = os.fstat(f.fileno())
+    file_size = file_stat.st_size
+    
+    checkpoint = _read_checkpoint(checkpoint_filename)
+    if checkpoint is not None and \
+       not _checkpoint_agrees(f, checkpoint, file_stat, do_max_line_length):
+      checkpoint = None
+    ##endof:  if checkpoint is not None and not _checkpoint_agrees(...)
+    
+    range_counts = []
+    counted_size = 0
+    is_tracking_lines = do_max_line_length
+    if checkpoint is not None:
+      range_counts.append(BlockCounts(**checkpoint['counts']))
+      counted_size = checkpoint['counted_size']
+      ## (one that keeps track of the lines' lengths goes on doing so)
+      is_tracking_lines = range_counts[0].max_line_length is not None
+    ##endof:  if checkpoint is not None
+    
+    whole_chars_size = _last_char_boundary(f, counted_size, file_size)
+    
+    ## (an empty range would lose track of whether the file ends in a word)
+    if whole_chars_size > counted_size:
+      range_counts.append(
+          _count_blocks(_iter_range_blocks(f, counted_size,
+                                           whole_chars_size, block_size),
+                        None, 'replace', is_tracking_lines))
+    ##endof:  if whole_chars_size > counted_size
+    
+    if range_counts:
+      checkpoint_counts = _join_block_counts(range_counts)
+    else:
+      checkpoint_counts = _count_blocks([], None, 'replace',
+                                        is_tracking_lines)
+    ##endof:  if/else range_counts
+    
+    if checkpoint_counts.is_utf8 is False:
+      the_counts = _count_file(filename, block_size, 'utf-8', 'replace',
+                               do_max_line_length)
+      return WcResult(filename, the_counts.lines, the_counts.words,
+                      the_counts.chars, the_counts.bytes,
+                      the_counts.max_line_length)
+    ##endof:  if checkpoint_counts.is_utf8 is False
+    
+    the_counts = checkpoint_counts
+    if file_size > whole_chars_size:
+      the_counts = _join_block_counts(
+          [checkpoint_counts,
+           _count_blocks(_iter_range_blocks(f, whole_chars_size,
+                                            file_size, block_size),
+                         None, 'replace', is_tracking_lines)])
+    ##endof:  if file_size > whole_chars_size
+    
+    if do_save and (checkpoint is None or whole_chars_size > counted_size):
+      new_checkpoint = {
+          'format': CHECKPOINT_FORMAT,
+          'filename': filename,
+          'device': file_stat.st_dev,
+          'inode': file_stat.st_ino,
+          'counted_size': whole_chars_size,
+          'head_crc': _checksum_range(f, 0,
+                                      min(CHECKSUM_SPAN, whole_chars_size)),
+          'tail_crc': _checksum_range(f,
+                                      max(0, whole_chars_size - CHECKSUM_SPAN),
+                                      whole_chars_size),
+          'counts': checkpoint_counts._asdict()}
+      try:
+        _write_checkpoint(checkpoint_filename, new_checkpoint)
+      except OSError:
+        pass  # no checkpoint this time; the counts themselves are good
+      ##endof:  try/except OSError
+    ##endof:  if do_save and (checkpoint is None or ...)
+  ##endof:  with open ... f
+  
+  max_line_length = None
+  if do_max_line_length:
+    max_line_length = the_counts.max_line_length
+  ##endof:  if do_max_line_length
+  
+  return WcResult(filename, the_counts.lines, the_counts.words,
+                  the_counts.chars, the_counts.bytes, max_line_length)
+  
+##endof:  count_file_incremental(filename, do_max_line_length, ...)
+
+
+def wc_total(results, filename='total'):
+  '''
+  The totals row for some  WcResult s (the longest line is the longest
+  of all)
+  '''
+  
+  max_line_lengths = [result.max_line_length for result in results
+                      if result.max_line_length is not None]
+  
+  return WcResult(filename,
+                  sum(result.lines for result in results),
+                  sum(result.words for result in results),
+                  sum(result.chars for result in results),
+                  sum(result.bytes for result in results),
+                  max(max_line_lengths) if max_line_lengths else None)
+  
+##endof:  wc_total(results, filename)
+
+
+def format_wc_bash(results, fields=BASH_WC_DEFAULT_FIELDS, with_total=None):
+  '''
+  Formats  WcResult s the way `wc` prints them
+  
+  The counts are right-aligned in columns as wide as the total number of
+  bytes (just one wide for one count of one file), each row ending in
+  the filename, with a  total  row when there's more than one file.
+  Files with an  error  are left out of the rows, as `wc` leaves them.
+  
+  @param results     A list of  WcResult s
+  @param fields      Which counts to give (see  WC_FIELDS ), in order
+  @param with_total  Whether to add the  total  row (None: only for more
+                     than one file)
+  @return            The text, with a newline after each row
+  '''
+  
+  the_total = wc_total(results)
+  if with_total is None:
+    with_total = len(results) > 1
+  ##endof:  if with_total is None
+  
+  rows = [result for result in results if result.error is None]
+  if with_total:
+    rows.append(the_total)
+  ##endof:  if with_total
+  
+  if len(fields) == 1 and len(rows) == 1:
+    width = 1
+  else:
+    width = len(str(the_total.bytes))
+  ##endof:  if/else len(fields) == 1 and len(rows) == 1
+  
+  lines = []
+  for row in rows:
+    counts = [str(getattr(row, field) or 0).rjust(width) for field in fields]
+    lines.append(' '.join(counts + [str(row.filename)]) + "\n")
+  ##endof:  for row in rows
+  
+  return ''.join(lines)
+  
+##endof:  format_wc_bash(results, fields, with_total)
+
+
+def format_wc_json(results, with_total=True):
+  '''
+  Formats  WcResult s as a JSON list of objects, one per file (and the
+  totals, with the  filename  None, at the end)
+  '''
+  
+  rows = [result._asdict() for result in results]
+  if with_total:
+    rows.append(wc_total(results, None)._asdict())
+  ##endof:  if with_total
+  
+  return json.dumps(rows, indent=2)
+  
+##endof:  format_wc_json(results, with_total)
+
+
+def format_wc_csv(results, with_total=True):
+  '''
+  Formats  WcResult s as CSV, with a header row (and the totals, with the
+  filename  total , at the end)
+  '''
+  
+  csv_text = io.StringIO()
+  csv_writer = csv.writer(csv_text, lineterminator="\n")
+  
+  csv_writer.writerow(WcResult._fields)
+  csv_writer.writerows(results)
+  if with_total:
+    csv_writer.writerow(wc_total(results))
+  ##endof:  if with_total
+  
+  return csv_text.getvalue()
+  
+##endof:  format_wc_csv(results, with_total)
+
+
+def _count_file_or_error(filename, workers, do_max_line_length,
+                         incremental=False):
+  '''
+  Runs in a  wc_many  worker:  count_file  (or  count_file_incremental ),
+  with the error (if any) in the  WcResult  instead of raised
+  '''
+  
+  try:
+    if incremental:
+      return count_file_incremental(filename, do_max_line_length)
+    ##endof:  if incremental
+    
+    return count_file(filename, workers, do_max_line_length)
+  except OSError as e_os:
+    return WcResult(filename, 0, 0, 0, 0, None,
+                    e_os.strerror or str(e_os))
+  ##endof:  try/except OSError
+  
+##endof:  _count_file_or_error(filename, workers, do_max_line_length, ...)
+
+
+def count_text(filename,
+               block_size=WC_BLOCK_SIZE,
+               encoding='utf-8',
+               errors='replace'):
+  '''
+  The counting engine behind  wc : newlines, words and characters, from
+  the file's bytes
+  
+  The file is read in big blocks into one reused  bytearray  (no new
+  buffer per read, and no  str  per line). The newlines are counted with
+  bytearray.count . For the words, the block is translated so that each
+  whitespace byte becomes  b' '  and every other byte  b'x' ; a word
+  starts at each  b' x' , and at the very start of the block if the
+  previous block ended in whitespace (or there was none). Whether the
+  last block ended inside a word is all that is carried over, so a word
+  split across two blocks is counted once.
+  
+  The newlines and words are counted the way `wc` counts them: only
+  b'\\n'  ends a line (a last line without one isn't counted), and the
+  words are separated by ASCII whitespace.
+  
+  For UTF-8, an all-ASCII block ( bytearray.isascii ) has as many
+  characters as bytes. Any other block is counted and checked on its
+  bytes, too, without being decoded (see  _count_utf8_chars ), with the
+  start of a character split across two blocks held back for the next;
+  at the first block that isn't UTF-8, the file is counted again,
+  decoding it with the encoding found by
+  handle_text_encoding_decoding.detect_encoding  (when Beautiful Soup is
+  there to do it). Any other  encoding  is decoded with an incremental
+  decoder, so a character split across two blocks is counted once.
+  
+  @param filename    A string representing the filename
+  @param block_size  The number of bytes read at a time
+  @param encoding    The encoding used for counting the characters
+  @param errors      The error handler used when decoding (not UTF-8
+                     counted on the bytes); with  'replace' , each
+                     undecodable byte counts as one character
+  @return            (n_lines, n_words, n_chars)
+  '''
+  
+  the_counts = _count_file(filename, block_size, encoding, errors)
+  
+  return the_counts.lines, the_counts.words, the_counts.chars
+  
+##endof:  count_text(filename, block_size, encoding, errors)
+
+
+def count_text_parallel(filename,
+                        workers=None,
+                        block_size=WC_BLOCK_SIZE,
+                        errors='replace'):
+  '''
+  Like  count_text  (for UTF-8), but with the file split into byte ranges
+  that are counted by a pool of worker processes
+  
+  Each worker memory-maps the file and counts its own range, block by
+  block, so none of the file's contents go through the pipes to the
+  workers - only the counts come back. The ranges are joined up
+  afterwards: a word that runs across the boundary between two ranges
+  (the first ends inside a word, and the next starts inside one) was
+  counted by both, so one is taken off. The boundaries are moved
+  forward off any UTF-8 continuation bytes, so no character is split.
+  
+  @param filename    A string representing the filename
+  @param workers     The number of worker processes (default: the number
+                     of CPUs)
+  @param block_size  The number of bytes each worker counts at a time
+  @param errors      The error handler used when decoding
+  @return            (n_lines, n_words, n_chars) , the same as from
+                     count_text
+  '''
+  
+  the_counts = _count_file_parallel(filename, workers, block_size, errors)
+  
+  return the_counts.lines, the_counts.words, the_counts.chars
+  
+##endof:  count_text_parallel(filename, workers, block_size, errors)
+
+
+def _count_file(filename, block_size, encoding, errors,
+                do_max_line_length=False):
+  '''
+  Counts one whole file in this process
+  
+  UTF-8 is counted on the raw bytes. A file that turns out not to be
+  UTF-8 is counted again, decoded with the encoding from
+  _fallback_encoding .
+  
+  @return  A  BlockCounts
+  '''
+  
+  if codecs.lookup(encoding).name != 'utf-8':
+    return _count_file_blocks(filename, block_size, encoding, errors,
+                              do_max_line_length)
+  ##endof:  if codecs.lookup(encoding).name != 'utf-8'
+  
+  the_counts = _count_file_blocks(filename, block_size, None, errors,
+                                  do_max_line_length)
+  
+  if the_counts.is_utf8 is False:
+    the_counts = _count_file_blocks(filename, block_size,
+                                    _fallback_encoding(filename), errors,
+                                    do_max_line_length)
+  ##endof:  if the_counts.is_utf8 is False
+  
+  return the_counts
+  
+##endof:  _count_file(filename, block_size, encoding, errors, ...)
+
+
+def _count_file_blocks(filename, block_size, encoding, errors,
+                       do_max_line_length):
+  '''
+  Reads one whole file through  _count_blocks
+  
+  @param encoding  None for UTF-8, counted on the raw bytes
+  @return          A  BlockCounts
+  '''
+  
+  with open(filename, 'rb') as f:
+    return _count_blocks(_iter_buffer_blocks(f, block_size),
+                         encoding, errors, do_max_line_length)
+  ##endof:  with open ... f
+  
+##endof:  _count_file_blocks(filename, block_size, encoding, errors, ...)
+
+
+def _fallback_encoding(filename):
+  '''
+  The encoding to count a file that isn't UTF-8 in: what UnicodeDammit
+  finds from the start of the file or, failing that (or without
+  Beautiful Soup), UTF-8 after all, each bad byte being a replacement
+  character
+  '''
+  
+  detected_encoding = None
+  if can_do_encoding_detection:
+    detected_encoding = \
+      handle_text_encoding_decoding.detect_encoding(filename)
+  ##endof:  if can_do_encoding_detection
+  
+  try:
+    codecs.lookup(detected_encoding)
+  except (LookupError, TypeError):
+    detected_encoding = 'utf-8'
+  ##endof:  try/except (LookupError, TypeError)
+  
+  return detected_encoding
+  
+##endof:  _fallback_encoding(filename)
+
+
+def _count_file_parallel(filename, workers, block_size, errors,
+                         do_max_line_length=False):
+  '''
+  Counts one file in byte ranges, in worker processes (see
+  count_text_parallel )
+  
+  @return  A  BlockCounts
+  '''
+  
+  if workers is None:
+    workers = os.cpu_count() or 1
+  ##endof:  if workers is None
+  
+  file_size = os.path.getsize(filename)
+  
+  ## A few pieces per worker, so one slow piece doesn't hold up the rest
+  n_pieces = min(4 * workers, file_size // MIN_PARALLEL_PIECE_SIZE)
+  
+  if workers <= 1 or n_pieces <= 1:
+    return _count_file(filename, block_size, 'utf-8', errors,
+                       do_max_line_length)
+  ##endof:  if workers <= 1 or n_pieces <= 1
+  
+  boundaries = _split_at_char_boundaries(filename, file_size, n_pieces)
+  n_ranges = len(boundaries) - 1
+  
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    range_counts = list(executor.map(_count_range,
+                                     [filename] * n_ranges,
+                                     boundaries[:-1],
+                                     boundaries[1:],
+                                     [block_size] * n_ranges,
+                                     [errors] * n_ranges,
+                                     [do_max_line_length] * n_ranges))
+  ##endof:  with ProcessPoolExecutor(...) as executor
+  
+  the_counts = _join_block_counts(range_counts)
+  
+  if the_counts.is_utf8 is False:
+    the_counts = _count_file_blocks(filename, block_size,
+                                    _fallback_encoding(filename), errors,
+                                    do_max_line_length)
+  ##endof:  if the_counts.is_utf8 is False
+  
+  return the_counts
+  
+##endof:  _count_file_parallel(filename, workers, block_size, errors, ...)
+
+
+def _join_block_counts(range_counts):
+  '''
+  Joins up the counts of neighboring byte ranges into those of the whole
+  
+  A word that runs across the boundary between two ranges (the first
+  ends inside a word, and the next starts inside one) was counted by
+  both, so one is taken off. The longest line is either the longest in
+  some range, or one that runs across boundaries: the last line of one
+  range, any ranges with no newline at all, and the first line of the
+  next.
+  
+  @param range_counts  A list of  BlockCounts , in order
+  @return              A  BlockCounts
+  '''
+  
+  n_words = sum(counts.words for counts in range_counts)
+  
+  for prev_counts, next_counts in zip(range_counts[:-1], range_counts[1:]):
+    ## One word, counted at the start of each of the two ranges
+    if prev_counts.ends_in_word and next_counts.starts_in_word:
+      n_words -= 1
+    ##endof:  if prev_counts.ends_in_word and next_counts.starts_in_word
+  ##endof:  for prev_counts, next_counts in zip(...)
+  
+  max_line_length = None
+  first_line_length = None
+  last_line_length = None
+  
+  if range_counts[0].max_line_length is not None:
+    max_line_length = max(counts.max_line_length for counts in range_counts)
+    open_line_length = 0  # the line still going at the end of a range
+    
+    for counts in range_counts:
+      if counts.lines == 0:
+        open_line_length += counts.last_line_length
+        continue
+      ##endof:  if counts.lines == 0
+      
+      if first_line_length is None:
+        first_line_length = open_line_length + counts.first_line_length
+      ##endof:  if first_line_length is None
+      
+      max_line_length = max(max_line_length,
+                            open_line_length + counts.first_line_length)
+      open_line_length = counts.last_line_length
+    ##endof:  for counts in range_counts
+    
+    max_line_length = max(max_line_length, open_line_length)
+    if first_line_length is None:
+      first_line_length = open_line_length
+    ##endof:  if first_line_length is None
+    last_line_length = open_line_length
+  ##endof:  if range_counts[0].max_line_length is not None
+  
+  return BlockCounts(lines=sum(counts.lines for counts in range_counts),
+                     words=n_words,
+                     chars=sum(counts.chars for counts in range_counts),
+                     bytes=sum(counts.bytes for counts in range_counts),
+                     max_line_length=max_line_length,
+                     starts_in_word=range_counts[0].starts_in_word,
+                     ends_in_word=range_counts[-1].ends_in_word,
+                     first_line_length=first_line_length,
+                     last_line_length=last_line_length,
+                     is_utf8=all(counts.is_utf8 for counts in range_counts))
+  
+##endof:  _join_block_counts(range_counts)
+
+
+def _split_at_char_boundaries(filename, file_size, n_pieces):
+  '''
+  Splits a file into  n_pieces  (about) equal byte ranges, none of which
+  starts in the middle of a UTF-8 character
+  
+  @return  The sorted boundaries, from 0 to  file_size
+  '''
+  
+  boundaries = [0]
+  
+  with open(filename, 'rb') as f:
+    for piece_idx in range(1, n_pieces):
+      boundary = piece_idx * file_size // n_pieces
+      
+      ## A character is at most 4 bytes long, so at most 3 of these
+      f.seek(boundary)
+      next_bytes = f.read(3)
+      n_continuation = len(next_bytes) - \
+                       len(next_bytes.lstrip(UTF8_CONTINUATION_BYTES))
+      boundary += n_continuation
+      
+      if boundaries[-1] < boundary < file_size:
+        boundaries.append(boundary)
+      ##endof:  if boundaries[-1] < boundary < file_size
+    ##endof:  for piece_idx in range(1, n_pieces)
+  ##endof:  with open ... f
+  
+  boundaries.append(file_size)
+  
+  return boundaries
+  
+##endof:  _split_at_char_boundaries(filename, file_size, n_pieces)
+
+
+def _count_range(filename, start, end, block_size, errors,
+                 do_max_line_length=False):
+  '''
+  Runs in a  count_text_parallel  worker: counts one byte range of the
+  memory-mapped file
+  
+  @return  A  BlockCounts
+  '''
+  
+  with open(filename, 'rb') as f:
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+      the_blocks = (mapped[block_start:min(block_start + block_size, end)]
+                    for block_start in range(start, end, block_size))
+      
+      return _count_blocks(the_blocks, None, errors, do_max_line_length)
+    ##endof:  with mmap.mmap(...) as mapped
+  ##endof:  with open ... f
+  
+##endof:  _count_range(filename, start, end, block_size, errors, ...)
+
+
+def _iter_range_blocks(binary_fh, start, end, block_size):
+  '''
+  Reads the bytes from  start  up to  end  in blocks of (at most)
+  block_size
+  '''
+  
+  binary_fh.seek(start)
+  n_left = end - start
+  
+  while n_left > 0:
+    block = binary_fh.read(min(block_size, n_left))
+    if not block:
+      break  # the file got shorter
+    ##endof:  if not block
+    
+    n_left -= len(block)
+    yield block
+  ##endof:  while n_left > 0
+  
+##endof:  _iter_range_blocks(binary_fh, start, end, block_size)
+
+
+def _last_char_boundary(binary_fh, start, end):
+  '''
+  Backs  end  up to the start of a UTF-8 character it would cut in two
+  (one still being written, at the end of a growing file), but not past
+  start
+  '''
+  
+  tail_start = max(start, end - 3)
+  binary_fh.seek(tail_start)
+  tail_bytes = binary_fh.read(end - tail_start)
+  
+  for n_back in range(1, len(tail_bytes) + 1):
+    byte_class = UTF8_CLASS_TRANSLATION[tail_bytes[-n_back]]
+    
+    if byte_class == ord('c'):
+      continue
+    elif byte_class in b'234' and int(chr(byte_class)) > n_back:
+      return end - n_back
+    ##endof:  if/elif byte_class ...
+    
+    break
+  ##endof:  for n_back in range(1, len(tail_bytes) + 1)
+  
+  return end
+  
+##endof:  _last_char_boundary(binary_fh, start, end)
+
+
+def _checksum_range(binary_fh, start, end):
+  '''
+  CRC-32 of the bytes from  start  up to  end
+  '''
+  
+  binary_fh.seek(start)
+  
+  return zlib.crc32(binary_fh.read(end - start))
+  
+##endof:  _checksum_range(binary_fh, start, end)
+
+
+def _checkpoint_agrees(binary_fh, checkpoint, file_stat, do_max_line_length):
+  '''
+  Tells whether a saved checkpoint still describes (the start of) the
+  file, and has what is asked for
+  '''
+  
+  counted_size = checkpoint['counted_size']
+  
+  if checkpoint['device'] != file_stat.st_dev or \
+     checkpoint['inode'] != file_stat.st_ino or \
+     counted_size > file_stat.st_size:
+    return False
+  ##endof:  if checkpoint['device'] != file_stat.st_dev or ...
+  
+  if do_max_line_length and checkpoint['counts']['max_line_length'] is None:
+    return False
+  ##endof:  if do_max_line_length and ...
+  
+  head_crc = _checksum_range(binary_fh, 0, min(CHECKSUM_SPAN, counted_size))
+  tail_crc = _checksum_range(binary_fh,
+                             max(0, counted_size - CHECKSUM_SPAN),
+                             counted_size)
+  
+  return head_crc == checkpoint['head_crc'] and \
+         tail_crc == checkpoint['tail_crc']
+  
+##endof:  _checkpoint_agrees(binary_fh, checkpoint, file_stat, ...)
+
+
+def _read_checkpoint(checkpoint_filename):
+  '''
+  Reads a checkpoint
+  
+  @return  The checkpoint, as a  dict , or None if there's no usable one
+  '''
+  
+  try:
+    with open(checkpoint_filename, 'r', encoding='utf-8') as cfh:
+      checkpoint = json.load(cfh)
+    ##endof:  with open ... cfh
+    
+    if checkpoint['format'] != CHECKPOINT_FORMAT:
+      return None
+    ##endof:  if checkpoint['format'] != CHECKPOINT_FORMAT
+    
+    BlockCounts(**checkpoint['counts'])  # (are the counts all there?)
+  except (OSError, ValueError, TypeError, KeyError):
+    return None
+  ##endof:  try/except
+  
+  return checkpoint
+  
+##endof:  _read_checkpoint(checkpoint_filename)
+
+
+def _write_checkpoint(checkpoint_filename, checkpoint):
+  '''
+  Writes a checkpoint to a temporary file next to it, then moves that
+  into place, so a reader never sees half of one
+  '''
+  
+  checkpoint_dir = os.path.dirname(os.path.abspath(checkpoint_filename))
+  temp_fd, temp_filename = \
+    tempfile.mkstemp(prefix=os.path.basename(checkpoint_filename) + '.',
+                     suffix='.tmp',
+                     dir=checkpoint_dir)
+  
+  try:
+    with os.fdopen(temp_fd, 'w', encoding='utf-8') as ofh:
+      json.dump(checkpoint, ofh)
+    ##endof:  with os.fdopen(...) as ofh
+    
+    os.replace(temp_filename, checkpoint_filename)
+  except BaseException:
+    os.unlink(temp_filename)
+    raise
+  ##endof:  try/except BaseException
+  
+##endof:  _write_checkpoint(checkpoint_filename, checkpoint)
+
+
+def _iter_buffer_blocks(binary_fh, block_size):
+  '''
+  Reads a file into one reused  bytearray , yielding it after each read
+  
+  Only the last, short block is a copy. Each block has to be used up
+  before the next one is asked for, since it gets overwritten.
+  '''
+  
+  the_buffer = bytearray(block_size)
+  
+  while True:
+    n_read = binary_fh.readinto(the_buffer)
+    if not n_read:
+      break
+    ##endof:  if not n_read
+    
+    yield the_buffer if n_read == block_size else the_buffer[:n_read]
+  ##endof:  while True
+  
+##endof:  _iter_buffer_blocks(binary_fh, block_size)
+
+
+def _count_blocks(blocks, encoding, errors, do_max_line_length=False):
+  '''
+  Counts the newlines, words, characters and bytes in a run of blocks
+  (see  count_text  for how)
+  
+  @param encoding            None for UTF-8, counted (and checked) on the
+                             raw bytes, without decoding them (see
+                             _count_utf8_chars ); otherwise, the encoding
+                             the blocks are decoded with to count the
+                             characters
+  @param do_max_line_length  If True, the longest line is found, too,
+                             which means splitting the decoded text into
+                             lines (otherwise, no per-line work is done)
+  @return                    A  BlockCounts , where  starts_in_word  and
+                             ends_in_word  tell whether the first byte
+                             and the last byte are parts of words, for
+                             joining up with the counts of neighboring
+                             byte ranges, and  is_utf8  whether the
+                             bytes were UTF-8 (None if  encoding  was
+                             given). A character still unfinished at the
+                             end counts as one, as the replacement
+                             character it would decode to, but the
+                             bytes aren't UTF-8, then.
   '''
   
   n_lines = 0
   n_words = 0
   n_chars = 0
+  n_bytes = 0
+  
+  starts_in_word = None
+  is_in_word = False
+  word_byte = ord('x')
+  
+  max_line_length = 0
+  first_line_length = None
+  curr_line_length = 0
+  
+  is_utf8 = True
+  ## The start of a UTF-8 character split across two blocks, held back
+  ## for the next
+  utf8_held_back = b''
   
-  # @todo  Get all with open ready to use 'utf-8' as encoding and
-  #        to use UnicodeDammit
-  with open(filename, 'r') as f:
-    for line in f:
-      words = line.split()
+  ## Only decoded if the characters are counted that way, or for the
+  ## lengths of the lines
+  decoder = None
+  if encoding is not None:
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+  elif do_max_line_length:
+    decoder = codecs.getincrementaldecoder('utf-8')(errors)
+  ##endof:  if/elif encoding is not None ...
+  
+  for block in blocks:
+    if not block:
+      continue
+    ##endof:  if not block
+    
+    n_bytes += len(block)
+    n_lines += block.count(b'\n')
+    
+    word_marks = block.translate(WORD_TRANSLATION)
+    n_words += word_marks.count(b' x')
+    if word_marks[0] == word_byte and not is_in_word:
+      n_words += 1
+    ##endof:  if word_marks[0] == word_byte and not is_in_word
+    
+    if starts_in_word is None:
+      starts_in_word = word_marks[0] == word_byte
+    ##endof:  if starts_in_word is None
+    is_in_word = word_marks[-1] == word_byte
+    
+    if encoding is None and is_utf8:
+      if not utf8_held_back and block.isascii():
+        n_chars += len(block)
+      else:
+        utf8_bytes = utf8_held_back + block
+        utf8_counts = _count_utf8_chars(utf8_bytes)
+        if utf8_counts is None:
+          is_utf8 = False  # (and the counts are counted again)
+        else:
+          n_block_chars, n_held_back = utf8_counts
+          n_chars += n_block_chars
+          utf8_held_back = utf8_bytes[len(utf8_bytes) - n_held_back:]
+        ##endof:  if/else utf8_counts is None
+      ##endof:  if/else not utf8_held_back and block.isascii()
+    ##endof:  if encoding is None and is_utf8
+    
+    if decoder is None:
+      continue
+    ##endof:  if decoder is None
+    
+    text = decoder.decode(block)
+    if encoding is not None:
+      n_chars += len(text)
+    ##endof:  if encoding is not None
+    
+    if do_max_line_length:
+      line_lengths = list(map(len, text.split('\n')))
+      curr_line_length += line_lengths[0]
       
-      n_lines += 1
-      n_words += len(words)
-      n_chars += len(line)
+      if len(line_lengths) > 1:
+        if first_line_length is None:
+          first_line_length = curr_line_length
+        ##endof:  if first_line_length is None
+        max_line_length = max(max_line_length, curr_line_length,
+                              *line_lengths[1:-1])
+        curr_line_length = line_lengths[-1]
+      ##endof:  if len(line_lengths) > 1
+    ##endof:  if do_max_line_length
+  ##endof:  for block in blocks
+  
+  if decoder is not None:
+    ## (whatever the decoder held back, as replacement characters)
+    tail_text = decoder.decode(b'', True)
+    if encoding is not None:
+      n_chars += len(tail_text)
+    ##endof:  if encoding is not None
+    curr_line_length += len(tail_text)
+  ##endof:  if decoder is not None
+  
+  if encoding is None:
+    if is_utf8 and utf8_held_back:
+      n_chars += 1
+      is_utf8 = False
+    ##endof:  if is_utf8 and utf8_held_back
+  else:
+    is_utf8 = None
+  ##endof:  if/else encoding is None
+  
+  if do_max_line_length:
+    ## A last line without a newline still counts, as with `wc -L`
+    max_line_length = max(max_line_length, curr_line_length)
+    if first_line_length is None:
+      first_line_length = curr_line_length
+    ##endof:  if first_line_length is None
+  else:
+    max_line_length = None
+  ##endof:  if/else do_max_line_length
+  
+  return BlockCounts(n_lines, n_words, n_chars, n_bytes,
+                     max_line_length, bool(starts_in_word), is_in_word,
+                     first_line_length, curr_line_length, is_utf8)
+  
+##endof:  _count_blocks(blocks, encoding, errors, do_max_line_length)
+
+
+def _count_utf8_chars(utf8_bytes):
+  '''
+  Counts the characters in a block of UTF-8, checking that it is UTF-8,
+  on the bytes themselves (nothing is decoded into a  str )
+  
+  Each byte is sorted into its class (see  UTF8_CLASS_TRANSLATION ), and
+  every whole character's classes,  2c ,  3cc  or  4ccc , are replaced
+  by one  a  (which can't then run into its neighbors), so the bytes
+  are UTF-8 if nothing but  a s is left - one for each character, so
+  for each byte that isn't a continuation byte. The few first bytes whose second byte has a narrower range are checked on
+  their own (see  UTF8_NARROW_SECOND_BYTE_RES ).
+  
+  @param utf8_bytes  A  bytes  object (a block, after the start of a
+                     character held back from the block before it)
+  @return            (n_chars, n_held_back) , where the last
+                     n_held_back  bytes are the start of a character cut
+                     off at the end (not counted, for the next block to
+                     finish); or None if the bytes aren't UTF-8
+  '''
+  
+  byte_classes = utf8_bytes.translate(UTF8_CLASS_TRANSLATION)
+  
+  n_held_back = 0
+  for n_back in range(1, min(3, len(byte_classes)) + 1):
+    byte_class = byte_classes[-n_back]
+    
+    if byte_class == ord('c'):
+      continue
+    elif byte_class in b'234' and int(chr(byte_class)) > n_back:
+      n_held_back = n_back
+    ##endof:  if/elif byte_class ...
+    
+    break
+  ##endof:  for n_back in range(1, ...)
+  
+  if n_held_back > 0:
+    byte_classes = byte_classes[:-n_held_back]
+  ##endof:  if n_held_back > 0
+  
+  char_classes = byte_classes.replace(b'4ccc', b'a') \
+                             .replace(b'3cc', b'a') \
+                             .replace(b'2c', b'a')
+  if char_classes.count(b'a') != len(char_classes):
+    return None
+  ##endof:  if char_classes.count(b'a') != len(char_classes)
   
-    ##endof:  for line in f
+  for first_byte, out_of_range_re in UTF8_NARROW_SECOND_BYTE_RES:
+    if first_byte in utf8_bytes and \
+       out_of_range_re.search(utf8_bytes) is not None:
+      return None
+    ##endof:  if first_byte in utf8_bytes and ...
+  ##endof:  for first_byte, out_of_range_re in ...
+  
+  return len(char_classes), n_held_back
+  
+##endof:  _count_utf8_chars(utf8_bytes)
+
+
+def count_lines(filename, use_index=False):
+  '''
+  Mimics `wc -l`: the number of newlines in the file
+  
+  @param filename        A string representing the filename
+  @param use_index       If True, the count comes from the sidecar line
+                         index (see  dwb_line_index ), so only what was
+                         appended since the last time gets read
+  @return                The number of lines, as an  int
+  '''
+  
+  if use_index:
+    return dwb_line_index.count_lines(dwb_line_index.get_line_index(filename))
+  ##endof:  if use_index
+  
+  n_lines = 0
   
-  ##endof for line in f
+  with open(filename, 'rb') as f:
+    for block in iter(lambda: f.read(COUNT_BLOCK_SIZE), b''):
+      n_lines += block.count(b'\n')
+    ##endof:  for block in iter(...)
+  ##endof:  with open ... f
   
-  print("n_lines: " + str(n_lines))
-  print("n_words: " + str(n_words))
-  print("n_chars: " + str(n_chars))
+  return n_lines
   
-##endof:  wc(filename)
+##endof:  count_lines(filename, use_index)
 
 
 if __name__ == "__main__":
@@ -82,6 +1321,6 @@ if __name__ == "__main__":
   Gets executed if the file is run as a script
   '''
   
-  main(sys.argv[1])
+  sys.exit(main())
   
 ##endof:  if __name__ == "__main__"
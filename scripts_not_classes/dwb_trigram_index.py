@@ -0,0 +1,691 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+##############################################################################
+'''
+@file dwb_trigram_index.py
+@author David BLACK  @bballdave025
+@since 2026-10-18
+
+An on-disk trigram index over a corpus of (log) files, so that a regex
+search only has to read the blocks of the files that could possibly
+match, instead of rescanning the whole corpus for every query.
+
+Each file is cut into blocks of about  DEFAULT_BLOCK_SIZE  bytes, at line
+boundaries. For every block, the set of its three-byte sequences
+(trigrams, taken after an ASCII lower-casing, so that case-insensitive
+queries can use the index too) is stored in an SQLite database. A query
+pulls out the literal strings that any match of the regex has to
+contain, and only the blocks holding all of their trigrams get read and
+searched with the regex.
+
+The index is brought up to date by running  update_index  again. Files
+whose size and mtime haven't changed are skipped; files that only grew
+(the checksum of their start still agrees) have just their last block
+and the new bytes indexed; anything else is indexed again from scratch.
+
+An example use from the interactive console
+
+ >>> import dwb_trigram_index
+ >>> dwb_trigram_index.update_index('logs.trigram.db', ['a.log', 'b.log'])
+ >>> for filename, line_num, line in \\
+ ...     dwb_trigram_index.grep_indexed(r'.*timeout after \\d+ ms',
+ ...                                    'logs.trigram.db'):
+ ...   print(filename, line_num, line, end='')
+
+'''
+##############################################################################
+
+##-------------------
+## IMPORT STATEMENTS
+##-------------------
+import os
+import sys
+import re
+import sqlite3
+import zlib
+
+# Intra-Package
+## For Python2
+# from __future__ import absolute_import
+
+##-------------------
+## MODULE CONSTANTS
+##-------------------
+## About how many bytes go in each indexed block
+DEFAULT_BLOCK_SIZE = 256 * 1024
+
+## How many bytes at the start of a file are checksummed, to tell whether
+## a file that got bigger was only appended to
+CHECKSUM_SPAN = 4096
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+  file_id   INTEGER PRIMARY KEY,
+  path      TEXT UNIQUE NOT NULL,
+  size      INTEGER NOT NULL,
+  mtime_ns  INTEGER NOT NULL,
+  head_crc  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+  block_id    INTEGER PRIMARY KEY,
+  file_id     INTEGER NOT NULL,
+  start       INTEGER NOT NULL,
+  end         INTEGER NOT NULL,
+  first_line  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_by_file ON blocks (file_id, start);
+CREATE TABLE IF NOT EXISTS postings (
+  trigram   INTEGER NOT NULL,
+  block_id  INTEGER NOT NULL,
+  PRIMARY KEY (trigram, block_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_block ON postings (block_id);
+'''
+
+## The characters which mean something in a regex (outside of a class)
+REGEX_SPECIAL_CHARS = set('.^$*+?{}[]\\|()')
+
+
+def main(index_filename, *paths):
+  '''
+  Allows an entrance for running as a command-line script
+  
+  Builds, or brings up to date, the index for the given files
+  '''
+  
+  the_counts = run(index_filename, *paths)
+  print(the_counts)
+  
+  return the_counts
+  
+##endof:  main(index_filename, *paths)
+
+
+def run(index_filename, *paths):
+  '''
+  Easy-to-remember entrance
+  
+  Defaults to the `update_index` method
+  '''
+  
+  return update_index(index_filename, paths)
+  
+##endof:  run(index_filename, *paths)
+
+
+def update_index(index_filename, paths,
+                 block_size=DEFAULT_BLOCK_SIZE,
+                 do_prune=False):
+  '''
+  Builds the index, or brings it up to date for new or changed files
+  
+  @param index_filename  The SQLite database file holding the index
+  @param paths           An iterable of filenames to be indexed
+  @param block_size      About how many bytes go in each block
+  @param do_prune        If True, files that are in the index but not in
+                         paths  (or no longer exist) are dropped from it
+  @return                A dict counting the files which were 'added',
+                         'appended', 'reindexed', 'unchanged' and 'pruned'
+  '''
+  
+  the_counts = {'added': 0, 'appended': 0, 'reindexed': 0,
+                'unchanged': 0, 'pruned': 0}
+  seen_paths = set()
+  
+  connection = _connect(index_filename)
+  
+  try:
+    for path in paths:
+      path = os.path.abspath(path)
+      seen_paths.add(path)
+      what_happened = _update_one_file(connection, path, block_size)
+      the_counts[what_happened] += 1
+      connection.commit()
+    ##endof:  for path in paths
+    
+    if do_prune:
+      for file_id, path in connection.execute(
+                             "SELECT file_id, path FROM files").fetchall():
+        if path not in seen_paths or not os.path.isfile(path):
+          _forget_file(connection, file_id)
+          the_counts['pruned'] += 1
+        ##endof:  if path not in seen_paths or ...
+      ##endof:  for file_id, path in ...
+      connection.commit()
+    ##endof:  if do_prune
+  finally:
+    connection.close()
+  ##endof:  try/finally
+  
+  return the_counts
+  
+##endof:  update_index(index_filename, paths, block_size, do_prune)
+
+
+def find_candidate_blocks(string_to_find, index_filename):
+  '''
+  Lists the blocks of the indexed files in which  string_to_find  (a
+  regex) could match, in file and line order
+  
+  @return  A list of  (filename, start, end, first_line_num, is_stale)
+           tuples.  is_stale  is True when the file has changed since it
+           was indexed, in which case it is listed once, as the whole file.
+  '''
+  
+  trigrams = required_trigrams(string_to_find)
+  
+  connection = _connect(index_filename)
+  
+  try:
+    if trigrams:
+      placeholders = ",".join("?" * len(trigrams))
+      block_filter = "WHERE b.block_id IN (" + \
+                     "  SELECT block_id FROM postings " + \
+                     "  WHERE trigram IN (" + placeholders + ") " + \
+                     "  GROUP BY block_id HAVING COUNT(*) = ?) "
+      query_params = list(trigrams) + [len(trigrams)]
+    else:
+      ## Nothing is known to be required, so every block is a candidate
+      block_filter = ""
+      query_params = []
+    ##endof:  if/else trigrams
+    
+    the_rows = connection.execute(
+                 "SELECT f.path, b.start, b.end, b.first_line, "
+                 "       f.size, f.mtime_ns "
+                 "FROM blocks b JOIN files f ON f.file_id = b.file_id " + \
+                 block_filter + \
+                 "ORDER BY f.path, b.start",
+                 query_params).fetchall()
+    file_rows = connection.execute(
+                  "SELECT path, size, mtime_ns FROM files").fetchall()
+  finally:
+    connection.close()
+  ##endof:  try/finally
+  
+  ## A changed file can't be trusted to the index, so it's searched whole
+  stale_paths = set()
+  for path, size, mtime_ns in file_rows:
+    if not _is_unchanged(path, size, mtime_ns):
+      stale_paths.add(path)
+    ##endof:  if not _is_unchanged(path, size, mtime_ns)
+  ##endof:  for path, size, mtime_ns in file_rows
+  
+  candidates = [(path, start, end, first_line, False)
+                for path, start, end, first_line, size, mtime_ns in the_rows
+                if path not in stale_paths]
+  
+  for path in stale_paths:
+    if os.path.isfile(path):
+      candidates.append((path, 0, None, 1, True))
+    ##endof:  if os.path.isfile(path)
+  ##endof:  for path in stale_paths
+  
+  candidates.sort(key=lambda candidate: (candidate[0], candidate[1]))
+  
+  return candidates
+  
+##endof:  find_candidate_blocks(string_to_find, index_filename)
+
+
+def grep_indexed(string_to_find, index_filename,
+                 encoding='utf-8',
+                 errors='replace'):
+  '''
+  Searches the indexed corpus, reading only the candidate blocks
+  
+  The matching is the same as in  dwb_pygrep.grep  ( re.match  against
+  each line).
+  
+  @param string_to_find  A regex string
+  @param index_filename  The SQLite database file holding the index
+  @param encoding        The encoding used to decode the blocks
+  @param errors          The error handler used when decoding
+  @return                A generator of  (filename, line_num, line)
+                         tuples, in file and line order
+  '''
+  
+  pattern = re.compile(string_to_find)
+  
+  curr_filename = None
+  f = None
+  
+  try:
+    for path, start, end, first_line, is_stale in \
+        find_candidate_blocks(string_to_find, index_filename):
+      if path != curr_filename:
+        if f is not None:
+          f.close()
+        ##endof:  if f is not None
+        f = open(path, 'rb')
+        curr_filename = path
+      ##endof:  if path != curr_filename
+      
+      f.seek(start)
+      if end is None:
+        ## A stale file (e.g. a live log) is read on to its end a line at
+        ## a time, rather than all at once
+        the_lines = (raw_line.decode(encoding, errors) for raw_line in f)
+      else:
+        block = f.read(end - start)
+        
+        ## Split on "\n" only, the same as reading the file line by line
+        the_lines = block.decode(encoding, errors).split("\n")
+        last_line = the_lines.pop()
+        the_lines = [line + "\n" for line in the_lines]
+        if last_line:
+          the_lines.append(last_line)
+        ##endof:  if last_line
+      ##endof:  if/else end is None
+      
+      for line_num, line in enumerate(the_lines, first_line):
+        if pattern.match(line):
+          yield path, line_num, line
+        ##endof:  if pattern.match(line)
+      ##endof:  for line_num, line in enumerate(the_lines, first_line)
+    ##endof:  for ... in find_candidate_blocks(...)
+  finally:
+    if f is not None:
+      f.close()
+    ##endof:  if f is not None
+  ##endof:  try/finally
+  
+##endof:  grep_indexed(string_to_find, index_filename, ...)
+
+
+def required_trigrams(string_to_find):
+  '''
+  The trigrams (as the integers stored in the index) that every match of
+  the regex has to contain
+  
+  @return  A set of integers; empty if nothing can be said
+  '''
+  
+  trigrams = set()
+  
+  for literal in required_literals(string_to_find):
+    trigrams.update(_trigrams_of(literal.encode('utf-8').lower()))
+  ##endof:  for literal in required_literals(string_to_find)
+  
+  return trigrams
+  
+##endof:  required_trigrams(string_to_find)
+
+
+def required_literals(string_to_find):
+  '''
+  Pulls out the runs of plain characters which any match of the regex has
+  to contain
+  
+  This is deliberately conservative: anything inside a group, a character
+  class, or followed by a quantifier that allows zero repeats is left out,
+  and a regex with an alternation ( | ) or the verbose flag gives nothing.
+  
+  @param string_to_find  A regex string
+  @return                A list of strings
+  '''
+  
+  if '|' in string_to_find or re.match(r"\(\?[aiLmsu]*x", string_to_find):
+    return []
+  ##endof:  if '|' in string_to_find or ...
+  
+  ## A case-insensitive regex can only use the (ASCII-lowered) index for
+  ## ASCII literals
+  is_ignore_case = re.match(r"\(\?[aLmsux]*i", string_to_find) is not None
+  
+  literals = []
+  current = []
+  group_depth = 0
+  idx = 0
+  n_chars = len(string_to_find)
+  
+  while idx < n_chars:
+    ch = string_to_find[idx]
+    literal_ch = None
+    
+    if ch == '\\':
+      next_ch = string_to_find[idx + 1:idx + 2]
+      if next_ch and not next_ch.isalnum():
+        literal_ch = next_ch  # escaped punctuation, e.g.  \.
+        idx += 2
+      else:
+        ## A class ( \d ), an anchor ( \b ), a backreference, or a
+        ## character by its code ( \x41 ,  \101 ,  \N{...} ), which is
+        ## all skipped, digits and all
+        current = _flush_literal(current, literals)
+        idx = _skip_escape(string_to_find, idx)
+      ##endof:  if/else next_ch and not next_ch.isalnum()
+    elif ch == '[':
+      current = _flush_literal(current, literals)
+      idx = _skip_char_class(string_to_find, idx)
+    elif ch == '(':
+      current = _flush_literal(current, literals)
+      group_depth += 1
+      idx += 1
+    elif ch == ')':
+      current = _flush_literal(current, literals)
+      group_depth -= 1
+      idx += 1
+    elif ch in '*?{':
+      ## The character before might not be there at all
+      if current:
+        current.pop()
+      ##endof:  if current
+      current = _flush_literal(current, literals)
+      idx = _skip_quantifier(string_to_find, idx)
+    elif ch == '+':
+      current = _flush_literal(current, literals)
+      idx = _skip_quantifier(string_to_find, idx)
+    elif ch in REGEX_SPECIAL_CHARS:
+      current = _flush_literal(current, literals)
+      idx += 1
+    else:
+      literal_ch = ch
+      idx += 1
+    ##endof:  if/elif/else ch ...
+    
+    if literal_ch is not None:
+      if group_depth == 0:
+        current.append(literal_ch)
+      ##endof:  if group_depth == 0
+    ##endof:  if literal_ch is not None
+  ##endof:  while idx < n_chars
+  
+  _flush_literal(current, literals)
+  
+  if is_ignore_case:
+    literals = [literal for literal in literals if literal.isascii()]
+  ##endof:  if is_ignore_case
+  
+  return literals
+  
+##endof:  required_literals(string_to_find)
+
+
+def _flush_literal(current, literals):
+  '''
+  Ends the current run of literal characters, keeping it if it's useful
+  '''
+  
+  if len(current) >= 3:
+    literals.append(''.join(current))
+  ##endof:  if len(current) >= 3
+  
+  return []
+  
+##endof:  _flush_literal(current, literals)
+
+
+def _skip_char_class(string_to_find, idx):
+  '''
+  The index just past the character class  [...]  that starts at  idx
+  '''
+  
+  idx += 1
+  if string_to_find[idx:idx + 1] == '^':
+    idx += 1
+  ##endof:  if string_to_find[idx:idx + 1] == '^'
+  if string_to_find[idx:idx + 1] == ']':
+    idx += 1  # a leading  ]  is a literal
+  ##endof:  if string_to_find[idx:idx + 1] == ']'
+  
+  while idx < len(string_to_find) and string_to_find[idx] != ']':
+    idx += 2 if string_to_find[idx] == '\\' else 1
+  ##endof:  while ... != ']'
+  
+  return idx + 1
+  
+##endof:  _skip_char_class(string_to_find, idx)
+
+
+def _skip_quantifier(string_to_find, idx):
+  '''
+  The index just past the quantifier (and a lazy/possessive mark) at  idx
+  '''
+  
+  if string_to_find[idx] == '{':
+    close_idx = string_to_find.find('}', idx)
+    idx = len(string_to_find) if close_idx == -1 else close_idx + 1
+  else:
+    idx += 1
+  ##endof:  if/else string_to_find[idx] == '{'
+  
+  if string_to_find[idx:idx + 1] in ('?', '+'):
+    idx += 1
+  ##endof:  if string_to_find[idx:idx + 1] in ('?', '+')
+  
+  return idx
+  
+##endof:  _skip_quantifier(string_to_find, idx)
+
+
+def _skip_escape(string_to_find, idx):
+  '''
+  The index just past the escape (a backslash and a letter or digit, and
+  whatever goes with them) at  idx
+  
+  Where it's not clear how far an escape goes (e.g.  \12  followed by a
+  digit), it's taken to go further, which only leaves out characters.
+  '''
+  
+  escape_ch = string_to_find[idx + 1:idx + 2]
+  idx += 2
+  
+  if escape_ch.isdigit():
+    ## A backreference ( \1 ,  \12 ) or an octal code ( \0 ,  \101 )
+    n_digits = 1
+    while n_digits < 3 and string_to_find[idx:idx + 1].isdigit():
+      idx += 1
+      n_digits += 1
+    ##endof:  while n_digits < 3 and ...
+  elif escape_ch in ('x', 'u', 'U'):
+    idx += {'x': 2, 'u': 4, 'U': 8}[escape_ch]
+  elif escape_ch == 'N' and string_to_find[idx:idx + 1] == '{':
+    close_idx = string_to_find.find('}', idx)
+    idx = len(string_to_find) if close_idx == -1 else close_idx + 1
+  ##endof:  if/elif escape_ch ...
+  
+  return min(idx, len(string_to_find))
+  
+##endof:  _skip_escape(string_to_find, idx)
+
+
+def _trigrams_of(lowered_bytes):
+  '''
+  The set of trigrams in some (already lower-cased) bytes, as integers
+  '''
+  
+  return {int.from_bytes(lowered_bytes[idx:idx + 3], 'big')
+          for idx in range(len(lowered_bytes) - 2)}
+  
+##endof:  _trigrams_of(lowered_bytes)
+
+
+def _connect(index_filename):
+  '''
+  Opens the index database, creating the tables if needed
+  '''
+  
+  connection = sqlite3.connect(index_filename)
+  connection.executescript(INDEX_SCHEMA)
+  
+  return connection
+  
+##endof:  _connect(index_filename)
+
+
+def _is_unchanged(path, size, mtime_ns):
+  '''
+  Tells whether the file still has the size and mtime that were indexed
+  '''
+  
+  try:
+    file_stat = os.stat(path)
+  except OSError:
+    return False
+  ##endof:  try/except OSError
+  
+  return file_stat.st_size == size and file_stat.st_mtime_ns == mtime_ns
+  
+##endof:  _is_unchanged(path, size, mtime_ns)
+
+
+def _update_one_file(connection, path, block_size):
+  '''
+  Brings the index up to date for one file
+  
+  @return  One of 'added', 'appended', 'reindexed' or 'unchanged'
+  '''
+  
+  file_row = connection.execute(
+               "SELECT file_id, size, mtime_ns, head_crc FROM files "
+               "WHERE path = ?", (path,)).fetchone()
+  
+  with open(path, 'rb') as f:
+    file_stat = os.fstat(f.fileno())
+    head_bytes = f.read(CHECKSUM_SPAN)
+    head_crc = zlib.crc32(head_bytes)
+    
+    if file_row is None:
+      what_happened = 'added'
+      file_id = connection.execute(
+                  "INSERT INTO files (path, size, mtime_ns, head_crc) "
+                  "VALUES (?, ?, ?, ?)",
+                  (path, file_stat.st_size, file_stat.st_mtime_ns,
+                   head_crc)).lastrowid
+      start, first_line = 0, 1
+    else:
+      file_id, old_size, old_mtime_ns, old_head_crc = file_row
+      
+      if old_size == file_stat.st_size and \
+         old_mtime_ns == file_stat.st_mtime_ns:
+        return 'unchanged'
+      ##endof:  if old_size == ... and old_mtime_ns == ...
+      
+      last_block = connection.execute(
+                     "SELECT block_id, start, first_line FROM blocks "
+                     "WHERE file_id = ? ORDER BY start DESC LIMIT 1",
+                     (file_id,)).fetchone()
+      
+      ## Only grown, with the same start: the last block (which might
+      ## have ended part-way through a line) is redone, along with the
+      ## new bytes
+      is_appended = file_stat.st_size > old_size and \
+                    last_block is not None and \
+                    zlib.crc32(head_bytes[:old_size]) == old_head_crc
+      
+      if is_appended:
+        what_happened = 'appended'
+        last_block_id, start, first_line = last_block
+        _forget_blocks(connection, [last_block_id])
+      else:
+        what_happened = 'reindexed'
+        _forget_blocks(connection,
+                       [row[0] for row in connection.execute(
+                          "SELECT block_id FROM blocks WHERE file_id = ?",
+                          (file_id,))])
+        start, first_line = 0, 1
+      ##endof:  if/else is_appended
+      
+      connection.execute(
+        "UPDATE files SET size = ?, mtime_ns = ?, head_crc = ? "
+        "WHERE file_id = ?",
+        (file_stat.st_size, file_stat.st_mtime_ns, head_crc, file_id))
+    ##endof:  if/else file_row is None
+    
+    f.seek(start)
+    
+    for block_start, block, block_first_line in \
+        _iter_blocks(f, start, first_line, block_size):
+      block_id = connection.execute(
+                   "INSERT INTO blocks (file_id, start, end, first_line) "
+                   "VALUES (?, ?, ?, ?)",
+                   (file_id, block_start, block_start + len(block),
+                    block_first_line)).lastrowid
+      connection.executemany(
+        "INSERT OR IGNORE INTO postings (trigram, block_id) VALUES (?, ?)",
+        ((trigram, block_id) for trigram in _trigrams_of(block.lower())))
+    ##endof:  for ... in _iter_blocks(...)
+  ##endof:  with open ... f
+  
+  return what_happened
+  
+##endof:  _update_one_file(connection, path, block_size)
+
+
+def _iter_blocks(binary_fh, start_offset, first_line, block_size):
+  '''
+  Cuts the rest of a file into blocks of about  block_size  bytes, each
+  ending at the end of a line (the last block might not)
+  
+  @return  A generator of  (byte_offset, block_bytes, first_line_num)
+  '''
+  
+  pending = b''
+  byte_offset = start_offset
+  line_num = first_line
+  
+  while True:
+    data = binary_fh.read(block_size)
+    buffered = pending + data if pending else data
+    
+    if not data:
+      if buffered:
+        yield byte_offset, buffered, line_num
+      ##endof:  if buffered
+      return
+    ##endof:  if not data
+    
+    cut_idx = buffered.rfind(b'\n') + 1
+    if cut_idx == 0:
+      pending = buffered  # one line longer than a block; keep reading
+      continue
+    ##endof:  if cut_idx == 0
+    
+    block = buffered[:cut_idx]
+    pending = buffered[cut_idx:]
+    
+    yield byte_offset, block, line_num
+    
+    byte_offset += len(block)
+    line_num += block.count(b'\n')
+  ##endof:  while True
+  
+##endof:  _iter_blocks(binary_fh, start_offset, first_line, block_size)
+
+
+def _forget_blocks(connection, block_ids):
+  '''
+  Takes some blocks, and their postings, out of the index
+  '''
+  
+  connection.executemany("DELETE FROM postings WHERE block_id = ?",
+                         [(block_id,) for block_id in block_ids])
+  connection.executemany("DELETE FROM blocks WHERE block_id = ?",
+                         [(block_id,) for block_id in block_ids])
+  
+##endof:  _forget_blocks(connection, block_ids)
+
+
+def _forget_file(connection, file_id):
+  '''
+  Takes a file, with all its blocks, out of the index
+  '''
+  
+  _forget_blocks(connection,
+                 [row[0] for row in connection.execute(
+                    "SELECT block_id FROM blocks WHERE file_id = ?",
+                    (file_id,))])
+  connection.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+  
+##endof:  _forget_file(connection, file_id)
+
+
+if __name__ == "__main__":
+  '''
+  Gets executed if the file is run as a script
+  '''
+  
+  main(*sys.argv[1:])
+  
+##endof:  if __name__ == "__main__"
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+##############################################################################
+'''
+@file dwb_walk.py
+@author David BLACK  @bballdave025
+@since 2026-10-18
+
+Finds the files under directories, for the text tools ( pygrep_dwb ,
+dwb_pygrep ,  dwb_pywc ,  dwb_pycat ) when they are run recursively.
+
+The directories are read with  os.scandir  by a pool of threads, a few
+directories ahead of the one whose files are being handed back, so the
+waiting on the disk (listing, stat'ing, sniffing for binary files)
+overlaps. The files still come out in the same order every time: the
+files of a directory (sorted by name), then each of its subdirectories
+in turn (sorted by name), the same as `grep -r` over a sorted tree.
+
+Files and directories can be left out with  .gitignore -style globs,
+e.g.
+
+   *.log        any file or directory named  *.log , at any depth
+   build/       any directory named  build  (and everything under it)
+   /docs/*.md   .md  files right in the  docs  directory at the top
+   **/tmp       tmp  at any depth (the same as  tmp )
+   !keep.log    ... but not  keep.log , even though  *.log  is left out
+
+as well as by size, by modification time, and by whether they look like
+binary files (a NUL byte in their first block, as `grep` decides).
+
+An example use from the interactive console
+
+ >>> import dwb_walk
+ >>> for filename in dwb_walk.walk_files(['.'], exclude=['.git/']):
+ ...   print(filename)
+
+'''
+##############################################################################
+
+##-------------------
+## IMPORT STATEMENTS
+##-------------------
+import os
+import sys
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Intra-Package
+## For Python2
+# from __future__ import absolute_import
+
+##-------------------
+## MODULE CONSTANTS
+##-------------------
+## The number of bytes looked at to decide whether a file is binary
+BINARY_SNIFF_SIZE = 8192
+
+## Listing directories is mostly waiting, so more threads than cores
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+## One compiled  .gitignore -style glob
+IgnoreRule = namedtuple('IgnoreRule', ['regex', 'is_negated', 'is_dir_only'])
+
+## What a found file has to pass. The times are in seconds since the
+## epoch, as from  os.stat ; None means no limit.
+FileFilter = namedtuple('FileFilter',
+                        ['min_size', 'max_size',
+                         'modified_after', 'modified_before',
+                         'skip_binary'])
+
+
+def main(*paths):
+  '''
+  Allows an entrance for running as a command-line script
+  
+  Prints the files under the paths, one per line, like `find -type f`
+  '''
+  
+  for filename in walk_files(paths):
+    print(filename)
+  ##endof:  for filename in walk_files(paths)
+  
+##endof:  main(*paths)
+
+
+def run(path):
+  '''
+  Easy-to-remember entrance
+  
+  Defaults to the `walk_files` method
+  '''
+  
+  return walk_files([path])
+  
+##endof:  run(path)
+
+
+def walk_files(paths,
+               exclude=(),
+               skip_binary=False,
+               min_size=None,
+               max_size=None,
+               modified_after=None,
+               modified_before=None,
+               follow_symlinks=False,
+               workers=DEFAULT_WORKERS,
+               on_error=None):
+  '''
+  Yields the files under the given paths, in a deterministic order
+  
+  A path that isn't a directory is yielded as it is (even if it doesn't
+  exist, so the caller can complain about it the way it usually does),
+  without being checked against the excludes or the filters, the same as
+  a file named on the command line. Everything found inside the
+  directories is checked.
+  
+  @param paths            An iterable of file and directory names
+  @param exclude          An iterable of  .gitignore -style globs (see
+                          the top of this file), matched against the
+                          path relative to the directory being walked;
+                          or already-compiled  IgnoreRule s
+  @param skip_binary      If True, files with a NUL byte in their first
+                          BINARY_SNIFF_SIZE  bytes are left out
+  @param min_size         Leave out files smaller than this many bytes
+  @param max_size         Leave out files bigger than this many bytes
+  @param modified_after   Leave out files last modified at or before this
+                          time (seconds since the epoch)
+  @param modified_before  Leave out files last modified at or after this
+                          time
+  @param follow_symlinks  If False (the default), symbolic links found in
+                          the directories are skipped, as with `grep -r`;
+                          if True, they are followed (each directory is
+                          still only walked once)
+  @param workers          The number of threads reading directories
+  @param on_error         Called with the  OSError  for a directory that
+                          can't be read, or a file that can't be stat'ed
+                          or sniffed (by default, these are skipped
+                          quietly, as with  os.walk )
+  @return                 A generator of filenames
+  '''
+  
+  ignore_rules = compile_ignore_rules(exclude)
+  file_filter = FileFilter(min_size, max_size,
+                           modified_after, modified_before,
+                           skip_binary)
+  
+  ## Enough directories read ahead to keep every thread busy
+  prefetch_depth = 2 * workers
+  
+  executor = ThreadPoolExecutor(max_workers=workers)
+  
+  try:
+    for path in paths:
+      if not os.path.isdir(path):
+        yield path
+        continue
+      ##endof:  if not os.path.isdir(path)
+      
+      yield from _walk_tree(executor, path, ignore_rules, file_filter,
+                            follow_symlinks, prefetch_depth, on_error)
+    ##endof:  for path in paths
+  finally:
+    ## Also reached when the caller stops iterating early
+    executor.shutdown(wait=True, cancel_futures=True)
+  ##endof:  try/finally
+  
+##endof:  walk_files(paths, ...)
+
+
+def compile_ignore_rules(patterns):
+  '''
+  Compiles  .gitignore -style globs into  IgnoreRule s
+  
+  Blank patterns and ones starting with  #  are skipped, so the lines of
+  an ignore file can be passed in as they are (see  read_ignore_file ).
+  
+  @param patterns  An iterable of glob strings (already-compiled
+                   IgnoreRule s are passed through)
+  @return          A list of  IgnoreRule s, in order (the last one that
+                   matches a path decides)
+  '''
+  
+  ignore_rules = []
+  
+  for pattern in patterns:
+    if isinstance(pattern, IgnoreRule):
+      ignore_rules.append(pattern)
+      continue
+    ##endof:  if isinstance(pattern, IgnoreRule)
+    
+    pattern = pattern.rstrip('\n').rstrip('\r')
+    if not pattern.strip() or pattern.startswith('#'):
+      continue
+    ##endof:  if not pattern.strip() or pattern.startswith('#')
+    
+    is_negated = pattern.startswith('!')
+    if is_negated:
+      pattern = pattern[1:]
+    ##endof:  if is_negated
+    
+    is_dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    
+    ## A slash anywhere but at the end ties the glob to the top directory
+    is_anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    
+    regex_source = _glob_to_regex_source(pattern)
+    if not is_anchored:
+      regex_source = '(?:.*/)?' + regex_source
+    ##endof:  if not is_anchored
+    
+    ignore_rules.append(IgnoreRule(re.compile(regex_source, re.DOTALL),
+                                   is_negated, is_dir_only))
+  ##endof:  for pattern in patterns
+  
+  return ignore_rules
+  
+##endof:  compile_ignore_rules(patterns)
+
+
+def read_ignore_file(filename):
+  '''
+  The globs in an ignore file (e.g. a  .gitignore ), one per line
+  '''
+  
+  with open(filename, 'r', encoding='utf-8', errors='replace') as f:
+    return compile_ignore_rules(f)
+  ##endof:  with open ... f
+  
+##endof:  read_ignore_file(filename)
+
+
+def is_ignored(ignore_rules, rel_path, is_dir):
+  '''
+  Tells whether a path is left out by the rules
+  
+  @param ignore_rules  From  compile_ignore_rules
+  @param rel_path      The path relative to the directory being walked,
+                       with  /  between its parts
+  @param is_dir        Whether the path is a directory
+  @return              True if the last rule that matches the path isn't
+                       a  !  rule
+  '''
+  
+  is_left_out = False
+  
+  for ignore_rule in ignore_rules:
+    if is_left_out == (not ignore_rule.is_negated):
+      continue  # this rule can't change the answer
+    elif ignore_rule.is_dir_only and not is_dir:
+      continue
+    ##endof:  if/elif ...
+    
+    if ignore_rule.regex.fullmatch(rel_path):
+      is_left_out = not ignore_rule.is_negated
+    ##endof:  if ignore_rule.regex.fullmatch(rel_path)
+  ##endof:  for ignore_rule in ignore_rules
+  
+  return is_left_out
+  
+##endof:  is_ignored(ignore_rules, rel_path, is_dir)
+
+
+def is_binary_file(filename, sniff_size=BINARY_SNIFF_SIZE):
+  '''
+  Tells whether a file looks binary: a NUL byte in its first block
+  
+  (Compressed files look binary, too, the same as they do to `grep`.)
+  '''
+  
+  with open(filename, 'rb') as f:
+    return b'\0' in f.read(sniff_size)
+  ##endof:  with open ... f
+  
+##endof:  is_binary_file(filename, sniff_size)
+
+
+def _glob_to_regex_source(pattern):
+  '''
+  Turns one  .gitignore -style glob (without its  ! , leading  /  or
+  trailing  / ) into regex source
+  
+  **/  is any number of directories (including none),  /**  is
+  everything under a directory,  *  and  ?  don't go past a  / , and
+  [...]  is a set of characters ( [!...]  for the ones not in it).
+  '''
+  
+  regex_pieces = []
+  idx = 0
+  n_chars = len(pattern)
+  
+  while idx < n_chars:
+    char = pattern[idx]
+    
+    if pattern.startswith('**/', idx):
+      regex_pieces.append('(?:.*/)?')
+      idx += 3
+    elif pattern.startswith('**', idx):
+      regex_pieces.append('.*')
+      idx += 2
+    elif char == '*':
+      regex_pieces.append('[^/]*')
+      idx += 1
+    elif char == '?':
+      regex_pieces.append('[^/]')
+      idx += 1
+    elif char == '[' and pattern.find(']', idx + 2) != -1:
+      close_idx = pattern.find(']', idx + 2)
+      char_set = pattern[idx + 1:close_idx]
+      if char_set.startswith('!'):
+        char_set = '^' + char_set[1:]
+      ##endof:  if char_set.startswith('!')
+      regex_pieces.append('[' + char_set.replace('\\', '\\\\') + ']')
+      idx = close_idx + 1
+    elif char == '\\' and idx + 1 < n_chars:
+      regex_pieces.append(re.escape(pattern[idx + 1]))
+      idx += 2
+    else:
+      regex_pieces.append(re.escape(char))
+      idx += 1
+    ##endof:  if/elif/else ...
+  ##endof:  while idx < n_chars
+  
+  return ''.join(regex_pieces)
+  
+##endof:  _glob_to_regex_source(pattern)
+
+
+def _walk_tree(executor, top_dir, ignore_rules, file_filter,
+               follow_symlinks, prefetch_depth, on_error):
+  '''
+  Yields the files under one directory, depth-first, while the next few
+  directories on the way are read by the thread pool
+  
+  The directories still to go are on a stack; the ones nearest its top
+  (the next to be walked) are always being read already, and only the
+  names of the others are held.
+  '''
+  
+  ## [relative path, future (None until it is handed to a thread)]
+  dirs_to_walk = [['', None]]
+  
+  visited_dirs = set()
+  if follow_symlinks:
+    top_stat = os.stat(top_dir)
+    visited_dirs.add((top_stat.st_dev, top_stat.st_ino))
+  ##endof:  if follow_symlinks
+  
+  while dirs_to_walk:
+    for dir_to_walk in dirs_to_walk[-prefetch_depth:]:
+      if dir_to_walk[1] is None:
+        dir_to_walk[1] = executor.submit(_scan_dir, top_dir, dir_to_walk[0],
+                                         ignore_rules, file_filter,
+                                         follow_symlinks)
+      ##endof:  if dir_to_walk[1] is None
+    ##endof:  for dir_to_walk in dirs_to_walk[-prefetch_depth:]
+    
+    rel_dir, scan_future = dirs_to_walk.pop()
+    filenames, subdirs, scan_errors = scan_future.result()
+    
+    if on_error is not None:
+      for e_os in scan_errors:
+        on_error(e_os)
+      ##endof:  for e_os in scan_errors
+    ##endof:  if on_error is not None
+    
+    yield from filenames
+    
+    new_subdirs = []
+    for rel_subdir, dir_key in subdirs:
+      if dir_key is not None:
+        if dir_key in visited_dirs:
+          continue  # a symbolic link back up the tree
+        ##endof:  if dir_key in visited_dirs
+        visited_dirs.add(dir_key)
+      ##endof:  if dir_key is not None
+      new_subdirs.append([rel_subdir, None])
+    ##endof:  for rel_subdir, dir_key in subdirs
+    
+    ## Reversed, so the first subdirectory is on top of the stack
+    dirs_to_walk.extend(reversed(new_subdirs))
+  ##endof:  while dirs_to_walk
+  
+##endof:  _walk_tree(executor, top_dir, ...)
+
+
+def _scan_dir(top_dir, rel_dir, ignore_rules, file_filter, follow_symlinks):
+  '''
+  Runs in a pool thread: reads one directory
+  
+  @return  (filenames, subdirs, errors) , where  filenames  are the
+           wanted files (sorted),  subdirs  are  (relative path, key)
+           for the subdirectories to walk (sorted), the  key  being
+           (st_dev, st_ino)  when symbolic links are followed (and None
+           otherwise), and  errors  are the  OSError s met
+  '''
+  
+  filenames = []
+  subdirs = []
+  errors = []
+  
+  dir_path = os.path.join(top_dir, rel_dir) if rel_dir else top_dir
+  
+  try:
+    with os.scandir(dir_path) as dir_entries:
+      dir_entries = sorted(dir_entries, key=lambda entry: entry.name)
+    ##endof:  with os.scandir(dir_path) as dir_entries
+  except OSError as e_os:
+    return filenames, subdirs, [e_os]
+  ##endof:  try/except OSError
+  
+  for entry in dir_entries:
+    rel_path = rel_dir + '/' + entry.name if rel_dir else entry.name
+    
+    try:
+      if not follow_symlinks and entry.is_symlink():
+        continue
+      ##endof:  if not follow_symlinks and entry.is_symlink()
+      
+      is_dir = entry.is_dir()
+      
+      if ignore_rules and is_ignored(ignore_rules, rel_path, is_dir):
+        continue
+      ##endof:  if ignore_rules and is_ignored(...)
+      
+      if is_dir:
+        dir_key = None
+        if follow_symlinks:
+          entry_stat = entry.stat()
+          dir_key = (entry_stat.st_dev, entry_stat.st_ino)
+        ##endof:  if follow_symlinks
+        subdirs.append((rel_path, dir_key))
+      elif entry.is_file() and _is_wanted_file(entry, file_filter):
+        filenames.append(entry.path)
+      ##endof:  if/elif is_dir ...
+    except OSError as e_os:
+      errors.append(e_os)
+    ##endof:  try/except OSError
+  ##endof:  for entry in dir_entries
+  
+  return filenames, subdirs, errors
+  
+##endof:  _scan_dir(top_dir, rel_dir, ...)
+
+
+def _is_wanted_file(entry, file_filter):
+  '''
+  Checks one file against the size, time and binary filters
+  
+  The file is only stat'ed (or opened) if a filter needs it.
+  '''
+  
+  min_size, max_size, modified_after, modified_before, skip_binary = \
+    file_filter
+  
+  if min_size is not None or max_size is not None or \
+     modified_after is not None or modified_before is not None:
+    entry_stat = entry.stat()
+    
+    if min_size is not None and entry_stat.st_size < min_size:
+      return False
+    elif max_size is not None and entry_stat.st_size > max_size:
+      return False
+    elif modified_after is not None and \
+         entry_stat.st_mtime <= modified_after:
+      return False
+    elif modified_before is not None and \
+         entry_stat.st_mtime >= modified_before:
+      return False
+    ##endof:  if/elif ...
+  ##endof:  if min_size is not None or ...
+  
+  if skip_binary and is_binary_file(entry.path):
+    return False
+  ##endof:  if skip_binary and is_binary_file(entry.path)
+  
+  return True
+  
+##endof:  _is_wanted_file(entry, file_filter)
+
+
+if __name__ == "__main__":
+  '''
+  Gets executed if the file is run as a script
+  '''
+  
+  main(*sys.argv[1:])
+  
+##endof:  if __name__ == "__main__"
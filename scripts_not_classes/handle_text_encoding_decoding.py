@@ -19,13 +19,76 @@
 ##-----------------
 import os
 import sys
+import re
+import codecs
 import traceback
+from functools import lru_cache
 
 from bs4 import UnicodeDammit
 
 import check_is_a_file
 
 
+##------------------------------
+## MODULE CONSTANTS
+##------------------------------
+## How much of the start of a file  detect_encoding  looks at
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+## How many bytes  iter_the_swear  reads and decodes at a time
+SWEAR_CHUNK_SIZE = 1024 * 1024
+
+## What the cp1252 fix-ups (see  fix_cp1252_leftovers ) look at: the
+## leftover characters and the spaces next to them. A run of these is
+## fixed up all together, so one isn't split between chunks.
+SWEAR_RUN_CHARS = "\x20" + "".join(chr(i) for i in range(0x80, 0xa0))
+
+## The error handler  iter_the_swear  decodes with (see
+## _decode_as_latin1 )
+SWEAR_ERRORS = 'dwb_swear_latin1'
+
+## The longest such run held back for the next chunk (a longer one, e.g.
+## megabytes of spaces, is fixed up in pieces, to keep memory bounded)
+SWEAR_MAX_RUN = 1024 * 1024
+
+## The cp1252 leftovers that become the same thing wherever they are,
+## all fixed up by one  str.translate  (see  _fix_cp1252_cluster )
+CP1252_TRANSLATION = str.maketrans({
+  "\x92": "'",     "\x91": "'",
+  "\x8a": "S",     "\x9a": "s",
+  "\x8c": "OE",    "\x9c": "oe",
+  "\x8e": "Z",     "\x9e": "z",
+  "\x9f": "Y",
+  "\x95": " . ",
+  "\x96": " - ",   "\x97": " - ",
+  "\x99": " TM ",
+})
+
+## The ones that take a space next to them into what they become, in the
+## order they're fixed up (which matters where they're next to each
+## other, e.g.  "\x85\x20\x93" )
+CP1252_CLUSTER_FIXUPS = [
+  (re.compile(r"\x85\x20"), " ... "),
+  (re.compile(r"\x85"), " ... "),
+  (re.compile(r"\x20\x93"), ' " '),
+  (re.compile(r"\x93"), ' " '),
+  (re.compile(r"\x94\x20"), ' " '),
+  (re.compile(r"\x94"), ' " '),
+  (re.compile(r"\x20\x80"), " EUR "),
+  (re.compile(r"\x80\x20"), " EUR "),
+  (re.compile(r"\x80"), " EUR "),
+  (re.compile(r"\x20\x8b"), " < "),
+  (re.compile(r"\x8b"), " < "),
+  (re.compile(r"\x9b\x20"), " > "),
+  (re.compile(r"\x9b"), " > "),
+]
+
+## A run of leftovers (anything from U+0080 to U+009F), each at most a
+## space from the next. Starting with a leftover, rather than a maybe-
+## space, lets the regex engine skip ahead to the next one quickly.
+CP1252_LEFTOVER_RUN_RE = re.compile(r"[\x80-\x9f](?:\x20?[\x80-\x9f])*")
+
+
 ##------------------------------
 ## FUNCTIONS
 ##------------------------------
@@ -62,7 +125,7 @@ def main(input_param, outfile_dir=None):
     #give_some_warning
     #parse_string(str(input_param))
   ##endof:  if/elif/else
-
+  
 ##endof:  main(input_param)
 
 
@@ -152,6 +215,29 @@ def do_the_encdec_swear(input_filename_or_string):
 ##endof:  do_the_encdec_swear(input_filename_or_string) #parse_file(filename_str)
 
 
+def detect_encoding(filename, sample_size=ENCODING_SAMPLE_SIZE):
+  '''
+  Guesses the encoding of a file with UnicodeDammit, from a sample at its
+  start, without reading (or decoding) the whole thing
+  
+  @param filename     The string representing the filename
+  @param sample_size  The number of bytes from the start of the file that
+                      are looked at
+  @return             The name of the encoding (e.g. 'windows-1252'), or
+                      None if UnicodeDammit couldn't tell
+  '''
+  
+  with open(filename, 'rb') as data_fh:
+    data = data_fh.read(sample_size)
+  ##endof:  with open ... data_fh
+  
+  swear_object = UnicodeDammit(data)
+  
+  return swear_object.original_encoding
+  
+##endof:  detect_encoding(filename, sample_size)
+
+
 def do_the_swear(filename_or_regular_str, do_parse_to_ascii=True):
   '''
   Run the UnicodeDammit stuff from Beautiful Soup 4 to get unicode
@@ -173,106 +259,183 @@ def do_the_swear(filename_or_regular_str, do_parse_to_ascii=True):
   swear_object = UnicodeDammit(data)
   swear_string = str(swear_object.unicode_markup)
   
+  return fix_cp1252_leftovers(swear_string)
+  
+##endof:  do_the_swear(filename_or_regular_str)
+
+
+def iter_the_swear(filename,
+                   chunk_size=SWEAR_CHUNK_SIZE,
+                   sample_size=ENCODING_SAMPLE_SIZE):
+  '''
+  Does what  do_the_swear  does for a file, a chunk at a time, so a
+  multi-GB export is fixed up in one pass with bounded memory
+  
+  The encoding is guessed from a sample at the start of the file (see
+  detect_encoding ), and the chunks are decoded with an incremental
+  decoder, so a character split between two reads comes out whole.
+  Bytes that aren't in the encoding are decoded as Latin-1 (see
+  SWEAR_ERRORS ), so a cp1252 byte comes out as one of the leftovers
+  U+0080 - U+009F that the fix-ups are for, rather than being lost.
+  
+  The result can differ from  do_the_swear 's, which guesses the
+  encoding from the whole file:
+  
+    - If the sample is all ASCII (or UTF-8) and cp1252 bytes come later,
+      the file is read as UTF-8 here, and the cp1252 bytes fixed up
+      ( \x92  becomes  "'" ), where UnicodeDammit may read the whole
+      file as windows-1252 ( \x92  becomes  U+2019 ).
+    - If the sample isn't representative the other way (e.g. UTF-8 that
+      looks like cp1252 in its first  sample_size  bytes), the rest of
+      the file is decoded with the wrong encoding.
+    - A run of leftovers and spaces longer than  SWEAR_MAX_RUN  is fixed
+      up in pieces.
+  
+  @param filename     The string representing the filename
+  @param chunk_size   The number of bytes read at a time
+  @param sample_size  The number of bytes the encoding is guessed from
+  @return             A generator of the fixed-up strings, which joined
+                      together are the whole fixed-up file
+  '''
+  
+  encoding = detect_encoding(filename, sample_size)
+  
+  if encoding in (None, 'ascii', 'utf-8'):
+    ## A sample that's all ASCII can be followed by anything, and UTF-8
+    ## is the likeliest; a byte-order mark is dropped, as UnicodeDammit
+    ## does
+    encoding = 'utf-8-sig'
+  ##endof:  if encoding in (None, 'ascii', 'utf-8')
+  
+  decoder = codecs.getincrementaldecoder(encoding)(errors=SWEAR_ERRORS)
+  held_back = ""
+  
+  with open(filename, 'rb') as data_fh:
+    while True:
+      data = data_fh.read(chunk_size)
+      is_last = not data
+      text = held_back + decoder.decode(data, final=is_last)
+      
+      if is_last:
+        if text:
+          yield fix_cp1252_leftovers(text)
+        ##endof:  if text
+        break
+      ##endof:  if is_last
+      
+      ## A run of fix-up characters at the end waits for the rest of it,
+      ## unless it's already too long
+      n_to_fix = len(text.rstrip(SWEAR_RUN_CHARS))
+      if len(text) - n_to_fix > SWEAR_MAX_RUN:
+        n_to_fix = len(text)
+      ##endof:  if len(text) - n_to_fix > SWEAR_MAX_RUN
+      
+      held_back = text[n_to_fix:]
+      if n_to_fix:
+        yield fix_cp1252_leftovers(text[:n_to_fix])
+      ##endof:  if n_to_fix
+    ##endof:  while True
+  ##endof:  with open ... data_fh
+  
+##endof:  iter_the_swear(filename, chunk_size, sample_size)
+
+
+def _decode_as_latin1(decode_error):
+  '''
+  The  SWEAR_ERRORS  error handler: decodes the bytes that couldn't be
+  decoded as Latin-1, one character per byte, and goes on after them
+  '''
+  
+  bad_bytes = decode_error.object[decode_error.start:decode_error.end]
+  
+  return bytes(bad_bytes).decode('latin-1'), decode_error.end
+  
+##endof:  _decode_as_latin1(decode_error)
+
+codecs.register_error(SWEAR_ERRORS, _decode_as_latin1)
+
+
+def swear_to_file(in_filename, out_filename, chunk_size=SWEAR_CHUNK_SIZE):
+  '''
+  Writes the fixed-up (see  iter_the_swear ) contents of  in_filename
+  to  out_filename , encoded in UTF-8
+  '''
+  
+  with open(out_filename, 'w', encoding='utf-8', newline='') as ofh:
+    for swear_piece in iter_the_swear(in_filename, chunk_size):
+      ofh.write(swear_piece)
+    ##endof:  for swear_piece in iter_the_swear(in_filename, chunk_size)
+  ##endof:  with open(out_filename, 'w', ...) as ofh
+  
+##endof:  swear_to_file(in_filename, out_filename, chunk_size)
+
+
+def fix_cp1252_leftovers(swear_string):
+  '''
+  Replaces the cp1252 characters left in a decoded string with plain
+  text, e.g.  \x85  (an ellipsis) with  " ... "  and  \x92  (a closing
+  single quote) with  "'"
+  
+  This used to be some 40  re.sub s, one after the other, each going
+  over the whole string. Now one regex goes over it once, finding the
+  runs of leftovers ( CP1252_LEFTOVER_RUN_RE ); each run, with the
+  spaces on either side of it, is fixed up on its own (see
+  _fix_cp1252_cluster ), and the rest of the string is left be. The
+  result is the same (see  benchmark_cp1252_fixups ).
+  
+  @param swear_string  The decoded string
+  @return              The fixed-up string
+  '''
+  
   ## For what seems to be input from Microsoft Office stuff,
   ## where real Unicode is mixed up with another encoding
   ## (often cp1252, aka the Windows abomination)
-  less_swear_str = re.sub(r"\x85\x20", " ... ",
-                          swear_string)
-  less_swear_str = re.sub(r"\x85", " ... ",
-                          less_swear_str)
-  
-  less_swear_str = re.sub(r"\x92\x20", "' ",
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x92", "'",
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x20\x91", " '",
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x91", "'",
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x20\x93", ' " ',
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x93", ' " ',
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x94\x20", ' " ',
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x94", ' " ',
-                          less_swear_str)
-  
-  less_swear_str = re.sub(r"\x20\x80", " EUR ",
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x80\x20", " EUR ",
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x80", " EUR ",
-                          less_swear_str)
-  
-  less_swear_str = re.sub(r"\x20\x8a", " S",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x8a", "S",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x9a", "s",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  
-  less_swear_str = re.sub(r"\x20\x8b", " < ",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x8b", " < ",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x9b\x20", " > ",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x9b", " > ",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  
-  less_swear_str = re.sub(r"\x20\x8c", " OE",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x8c", "OE",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x9c", "oe",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  
-  less_swear_str = re.sub(r"\x20\x8e", " Z",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x8e", "Z",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x9e", "z",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  
-  less_swear_str = re.sub(r"\x20\x9f", " Y",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  less_swear_str = re.sub(r"\x9f", "Y",
-                          less_swear_str,
-                          flags=re.IGNORECASE)
-  
-  less_swear_str = re.sub(r"\x95", " . ",
-                          less_swear_str)
-  
-  less_swear_str = re.sub(r"\x96", " - ",
-                          less_swear_str)
-  less_swear_str = re.sub(r"\x97", " - ",
-                          less_swear_str)
-  
-  less_swear_str = re.sub(r"\x99", " TM ",
-                          less_swear_str)
-  
-  # less_swear_str = re.sub(r"\x8c", "'",
-                          # less_swear_str,
-                          # flags=re.IGNORECASE)
-  # less_swear_str = re.sub(r"\x8c", "'",
-                          # less_swear_str,
-                          # flags=re.IGNORECASE)
-  
-  return less_swear_str
+  less_swear_pieces = []
+  i_done = 0
+  
+  for run_match in CP1252_LEFTOVER_RUN_RE.finditer(swear_string):
+    i_start, i_end = run_match.span()
+    
+    ## A space on either side can be taken in by a fix-up (but not one
+    ## already taken in by the run before)
+    if i_start > i_done and swear_string[i_start - 1] == "\x20":
+      i_start -= 1
+    ##endof:  if i_start > i_done and ...
+    if swear_string[i_end:i_end + 1] == "\x20":
+      i_end += 1
+    ##endof:  if swear_string[i_end:i_end + 1] == "\x20"
+    
+    less_swear_pieces.append(swear_string[i_done:i_start])
+    less_swear_pieces.append(
+        _fix_cp1252_cluster(swear_string[i_start:i_end]))
+    i_done = i_end
+  ##endof:  for run_match in CP1252_LEFTOVER_RUN_RE.finditer(swear_string)
+  
+  if not less_swear_pieces:
+    return swear_string
+  ##endof:  if not less_swear_pieces
+  
+  less_swear_pieces.append(swear_string[i_done:])
+  
+  return "".join(less_swear_pieces)
+  
+##endof:  fix_cp1252_leftovers(swear_string)
+
+
+@lru_cache(maxsize=4096)
+def _fix_cp1252_cluster(cluster):
+  '''
+  Fixes up one run of leftovers (and the spaces next to it): first the
+  ones that take in a space, the way the  re.sub s did, in their order,
+  and then the rest, with one  str.translate
   
-##endof:  do_the_swear(filename_or_regular_str)
+  There are only so many different runs, so they're remembered.
+  '''
+  
+  for fixup_re, replacement in CP1252_CLUSTER_FIXUPS:
+    cluster = fixup_re.sub(replacement, cluster)
+  ##endof:  for fixup_re, replacement in CP1252_CLUSTER_FIXUPS
+  
+  return cluster.translate(CP1252_TRANSLATION)
+  
+##endof:  _fix_cp1252_cluster(cluster)